@@ -0,0 +1,87 @@
+import os
+import re
+import time
+import pandas as pd
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+from get_3D_structure import generate_3d_mol_with_rdkit, search_conformers
+
+
+def mmff_energy(mol_block):
+    # MolBlock 中结构的 MMFF94s 能量(kcal/mol), 两种方法的结构都经过 MolBlock, 坐标精度相同
+    mol = Chem.MolFromMolBlock(mol_block, removeHs=False)
+    props = AllChem.MMFFGetMoleculeProperties(mol, mmffVariant="MMFF94s")
+    return AllChem.MMFFGetMoleculeForceField(mol, props).CalcEnergy()
+
+
+def count_opt_steps(log_path):
+    # Gaussian opt 每一步输出一行 "Step number   N out of a maximum of M"
+    if not os.path.exists(log_path):
+        return None
+    with open(log_path, 'r', errors='ignore') as f:
+        return len(re.findall(r'Step number\s+\d+\s+out of a maximum', f.read()))
+
+
+def benchmark_conformer_search(index_list, smiles_list, n_conformers=50, num_threads=0,
+                               single_log_dir=None, search_log_dir=None, seconds_per_opt_step=None):
+    """
+    对比单构象与多构象搜索得到的初始结构
+
+    直接比较的是MMFF94s能量和生成耗时; 如果给出两种初始结构分别跑完的Gaussian输出目录
+    (single_log_dir/{index}.log, search_log_dir/{index}.log), 同时统计DFT优化步数,
+    再给出 seconds_per_opt_step(单步DFT优化的平均耗时)即可估算净节省时间
+    """
+    records = []
+    for index, smiles in zip(index_list, smiles_list):
+        start = time.time()
+        single_mol = generate_3d_mol_with_rdkit(smiles)
+        single_seconds = time.time() - start
+        if single_mol is None:
+            continue
+        single_energy = mmff_energy(single_mol.write('mol'))
+
+        start = time.time()
+        mol, kept = search_conformers(smiles, n_conformers=n_conformers, num_threads=num_threads)
+        search_seconds = time.time() - start
+        search_energy = mmff_energy(Chem.MolToMolBlock(mol, confId=kept[0][0]))
+
+        record = {
+            'index': index,
+            'SMILES': smiles,
+            'single_energy_kcalmol': single_energy,
+            'search_energy_kcalmol': search_energy,
+            'energy_gain_kcalmol': single_energy - search_energy,
+            'n_unique_conformers': len(kept),
+            'single_seconds': single_seconds,
+            'search_seconds': search_seconds,
+        }
+        if single_log_dir is not None and search_log_dir is not None:
+            record['single_opt_steps'] = count_opt_steps(os.path.join(single_log_dir, f'{index}.log'))
+            record['search_opt_steps'] = count_opt_steps(os.path.join(search_log_dir, f'{index}.log'))
+        records.append(record)
+        print(record)
+
+    df = pd.DataFrame(records)
+    print('-' * 50)
+    print(f"分子数: {len(df)}")
+    print(f"MMFF能量平均降低: {df['energy_gain_kcalmol'].mean():.3f} kcal/mol, "
+          f"改进的分子比例: {(df['energy_gain_kcalmol'] > 1e-3).mean():.1%}")
+    print(f"构象搜索额外耗时: {(df['search_seconds'] - df['single_seconds']).sum():.1f} s")
+    if 'single_opt_steps' in df.columns:
+        saved_steps = (df['single_opt_steps'] - df['search_opt_steps']).sum()
+        print(f"DFT优化步数: 单构象 {df['single_opt_steps'].sum()}, 构象搜索 {df['search_opt_steps'].sum()}, "
+              f"节省 {saved_steps} 步")
+        if seconds_per_opt_step is not None:
+            net_saving = saved_steps * seconds_per_opt_step - (df['search_seconds'] - df['single_seconds']).sum()
+            print(f"估算净节省时间: {net_saving:.1f} s")
+    return df
+
+
+if __name__ == '__main__':
+
+    df = pd.read_excel('merged_critic_data_only_long_chain.xlsx')
+    result_df = benchmark_conformer_search(index_list=df['index'], smiles_list=df['SMILES'], n_conformers=50,
+                                           num_threads=0, single_log_dir=None, search_log_dir=None,
+                                           seconds_per_opt_step=None)
+    result_df.to_csv('benchmark_conformer_search.csv', index=False)
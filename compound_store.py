@@ -0,0 +1,250 @@
+import json
+import sqlite3
+import pandas as pd
+import numpy as np
+
+from merge_data import (MISSING_SMILES_KEY, NAME_COLUMNS, merge_combined_df, melt_properties, order_merged_columns,
+                        read_input_sources, uses_cross_compound_strategy)
+from smiles_index import canonicalize_smiles_column
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    n_rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    smiles TEXT NOT NULL,
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    name TEXT,
+    inchikey TEXT
+);
+CREATE TABLE IF NOT EXISTS observations (
+    smiles TEXT NOT NULL,
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    property TEXT NOT NULL,
+    value
+);
+CREATE TABLE IF NOT EXISTS merged (
+    smiles TEXT PRIMARY KEY,
+    first_seq INTEGER NOT NULL,
+    first_row INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS rows_smiles ON rows (smiles);
+CREATE INDEX IF NOT EXISTS rows_source ON rows (source);
+CREATE INDEX IF NOT EXISTS observations_smiles ON observations (smiles);
+CREATE INDEX IF NOT EXISTS observations_source ON observations (source);
+"""
+
+SETTING_KEYS = ['conflict_strategy', 'source_priority', 'source_uncertainty']
+SQL_VARIABLE_LIMIT = 900
+
+
+def open_compound_store(store_path='compound_store.sqlite'):
+    conn = sqlite3.connect(store_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def ingest_source(conn, df, source_name, smiles_index_path=None, **settings):
+    """
+    把一个数据源(一个工作表)写入化合物库, 只重新合并来源发生变化的化合物
+    已存在的同名数据源会被替换; 没有SMILES的行与全量合并一样归为一个条目, 库中以 MISSING_SMILES_KEY 为键
+
+    参数:
+    conn (sqlite3.Connection): open_compound_store 返回的连接
+    df (pd.DataFrame): 数据源; 没有 SMILES 列时(如 note 工作表)所有行都归入没有SMILES的条目
+    source_name (str): 数据源名称
+    smiles_index_path (str): 规范SMILES索引路径, 为None时直接使用原始SMILES
+    settings: conflict_strategy / source_priority / source_uncertainty, 给出时保存到库中供后续增量合并使用
+
+    返回:
+    int: 重新合并的化合物数
+    """
+    df = df.drop(columns=['Source'], errors='ignore').reset_index(drop=True)
+    if 'SMILES' not in df.columns:
+        df['SMILES'] = np.nan
+    if smiles_index_path is not None:
+        df = canonicalize_smiles_column(df, index_path=smiles_index_path)
+    df['SMILES'] = df['SMILES'].fillna(MISSING_SMILES_KEY)
+    df['Source'] = source_name
+
+    with conn:
+        _save_settings(conn, settings)
+
+        # 旧版本数据源涉及的化合物也需要重新合并
+        affected = {smiles for (smiles,) in conn.execute('SELECT DISTINCT smiles FROM rows WHERE source = ?',
+                                                          (source_name,))}
+        existing = conn.execute('SELECT seq FROM sources WHERE source = ?', (source_name,)).fetchone()
+        if existing is None:
+            seq = conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM sources').fetchone()[0]
+        else:
+            seq = existing[0]
+        conn.execute('DELETE FROM rows WHERE source = ?', (source_name,))
+        conn.execute('DELETE FROM observations WHERE source = ?', (source_name,))
+        conn.execute('INSERT OR REPLACE INTO sources (source, seq, n_rows) VALUES (?, ?, ?)',
+                     (source_name, int(seq), len(df)))
+
+        name_columns = [col for col in NAME_COLUMNS if col in df.columns]
+        names = df[name_columns].bfill(axis=1).iloc[:, 0] if name_columns else pd.Series(None, index=df.index)
+        inchikeys = df['InChIKey'] if 'InChIKey' in df.columns else pd.Series(None, index=df.index)
+        conn.executemany('INSERT INTO rows (smiles, source, row, name, inchikey) VALUES (?, ?, ?, ?, ?)',
+                         zip(df['SMILES'].astype(str), [source_name] * len(df), range(len(df)),
+                             [None if pd.isna(name) else str(name) for name in names],
+                             _to_sql_values(inchikeys)))
+
+        long_df = melt_properties(df)
+        conn.executemany('INSERT INTO observations (smiles, source, row, property, value) VALUES (?, ?, ?, ?, ?)',
+                         zip(long_df['SMILES'].astype(str), long_df['Source'], long_df['_row'].astype(int).tolist(),
+                             long_df['Property'].astype(str), _to_sql_values(long_df['Value'])))
+
+        affected.update(df['SMILES'].astype(str))
+        n_refreshed = _refresh_merged(conn, sorted(affected))
+
+    return n_refreshed
+
+
+def ingest_input_sources(input_sources, store_path='compound_store.sqlite', output_file=None,
+                         smiles_index_path=None, **settings):
+    # input_sources 格式与 merge_thermo_databases 相同, 每个工作表作为一个数据源增量写入
+    conn = open_compound_store(store_path)
+    try:
+        for df in read_input_sources(input_sources):
+            source_name = df['Source'].iloc[0]
+            n_affected = ingest_source(conn, df, source_name, smiles_index_path=smiles_index_path, **settings)
+            print(f"数据源 {source_name}: {len(df)} 行, 重新合并 {n_affected} 个化合物")
+        merged_df = load_merged_view(conn)
+    finally:
+        conn.close()
+
+    if output_file is not None:
+        merged_df.to_excel(output_file, index=False)
+        print(f"结果已保存至: {output_file}")
+    return merged_df
+
+
+def remove_source(conn, source_name):
+    with conn:
+        affected = [smiles for (smiles,) in conn.execute('SELECT DISTINCT smiles FROM rows WHERE source = ?',
+                                                          (source_name,))]
+        conn.execute('DELETE FROM rows WHERE source = ?', (source_name,))
+        conn.execute('DELETE FROM observations WHERE source = ?', (source_name,))
+        conn.execute('DELETE FROM sources WHERE source = ?', (source_name,))
+        n_refreshed = _refresh_merged(conn, affected)
+    return n_refreshed
+
+
+def rebuild_merged_view(conn, **settings):
+    # 修改冲突解决策略后需要重新合并所有化合物
+    with conn:
+        _save_settings(conn, settings)
+        conn.execute('DELETE FROM merged')
+        _refresh_merged(conn, [smiles for (smiles,) in conn.execute('SELECT DISTINCT smiles FROM rows')])
+
+
+def load_merged_view(conn):
+    records = [json.loads(data) for (data,) in
+               conn.execute('SELECT data FROM merged ORDER BY first_seq, first_row')]
+    if not records:
+        return pd.DataFrame()
+    return order_merged_columns(pd.DataFrame(records))
+
+
+def _refresh_merged(conn, smiles_list):
+    # 返回重新合并的化合物数
+    settings = _load_settings(conn)
+    if uses_cross_compound_strategy(settings.get('conflict_strategy')):
+        # inverse_variance 等策略的合并值依赖其他化合物, 只能全部一次重新合并
+        conn.execute('DELETE FROM merged')
+        return _merge_into_store(conn, _load_combined_df(conn), settings)
+
+    for start in range(0, len(smiles_list), SQL_VARIABLE_LIMIT):
+        chunk = smiles_list[start:start + SQL_VARIABLE_LIMIT]
+        placeholders = ','.join('?' * len(chunk))
+        conn.execute(f'DELETE FROM merged WHERE smiles IN ({placeholders})', chunk)
+        _merge_into_store(conn, _load_combined_df(conn, chunk), settings)
+    return len(smiles_list)
+
+
+def _merge_into_store(conn, combined_df, settings):
+    if combined_df.empty:
+        return 0
+    first_rows = combined_df.groupby('SMILES', sort=False)[['_seq', '_row']].first()
+    merged_df = merge_combined_df(combined_df.drop(columns=['_seq', '_row']), **settings)
+    # 合并结果中没有SMILES的条目为空值, 库中仍以 MISSING_SMILES_KEY 为键
+    keys = merged_df['SMILES'].fillna(MISSING_SMILES_KEY)
+
+    conn.executemany('INSERT INTO merged (smiles, first_seq, first_row, data) VALUES (?, ?, ?, ?)',
+                     [(smiles, int(first_rows.at[smiles, '_seq']), int(first_rows.at[smiles, '_row']),
+                       json.dumps(_clean_record(record), ensure_ascii=False))
+                      for smiles, record in zip(keys, merged_df.to_dict('records'))])
+    return len(merged_df)
+
+
+def _load_combined_df(conn, smiles_chunk=None):
+    # 从库中还原这些化合物(默认为全部化合物)在所有数据源中的原始行(宽表), 行顺序与全量合并时一致
+    if smiles_chunk is None:
+        row_filter = observation_filter = ''
+        params = None
+    else:
+        placeholders = ','.join('?' * len(smiles_chunk))
+        row_filter = f' WHERE r.smiles IN ({placeholders})'
+        observation_filter = f' WHERE smiles IN ({placeholders})'
+        params = smiles_chunk
+    rows_df = pd.read_sql_query(
+        f'SELECT r.smiles AS SMILES, r.source AS Source, s.seq AS _seq, r.row AS _row, '
+        f'r.name AS "Compound Name", r.inchikey AS InChIKey '
+        f'FROM rows r JOIN sources s ON r.source = s.source{row_filter}',
+        conn, params=params)
+    if rows_df.empty:
+        return rows_df
+    observations_df = pd.read_sql_query(
+        f'SELECT source AS Source, row AS _row, property, value FROM observations{observation_filter}', conn, params=params)
+
+    if not observations_df.empty:
+        properties = observations_df.pivot(index=['Source', '_row'], columns='property', values='value')
+        rows_df = rows_df.join(properties, on=['Source', '_row'])
+    if rows_df['InChIKey'].isna().all():
+        rows_df = rows_df.drop(columns='InChIKey')
+    return rows_df.sort_values(['_seq', '_row'], kind='stable').reset_index(drop=True)
+
+
+def _save_settings(conn, settings):
+    for key, value in settings.items():
+        if key not in SETTING_KEYS:
+            raise ValueError(f'未知的合并设置: {key}')
+        if value is not None:
+            conn.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+
+def _load_settings(conn):
+    return {key: json.loads(value) for key, value in conn.execute('SELECT key, value FROM settings')}
+
+
+def _to_sql_values(series):
+    # numpy 标量转为 python 内置类型, NaN 转为 NULL
+    return [None if pd.isna(v) else (v.item() if isinstance(v, np.generic) else v) for v in series]
+
+
+def _clean_record(record):
+    return {key: (None if pd.isna(value) else (value.item() if isinstance(value, np.generic) else value))
+            for key, value in record.items()}
+
+
+if __name__ == '__main__':
+
+    # 新增文献数据时只需把新工作表写入库, 已有化合物中只有受影响的会重新合并
+    input_source = [
+        ('critic_data.xlsx', ['Sheet1', 'Sheet2', 'Sheet3', 'Sheet4', 'Sheet5'])
+    ]
+    ingest_input_sources(input_sources=input_source, store_path='compound_store.sqlite',
+                         output_file='merged_thermo_database.xlsx', smiles_index_path='smiles_index.csv',
+                         conflict_strategy={'Tc/K': 'trimmed_mean', 'Pc/bar': 'trimmed_mean'})
@@ -0,0 +1,222 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import ElasticNet, Lasso
+from sklearn.model_selection import GroupKFold, KFold, LeaveOneGroupOut, StratifiedKFold
+
+from dataset_cache import read_table
+
+
+PREDICTION_COLUMNS = ['model', 'repeat', 'fold', 'idx', 'label', 'pre']
+METRIC_COLUMNS = ['model', 'repeat', 'fold', 'n_train', 'n_val', 'r2', 'rmse', 'mae']
+CV_MODEL_KINDS = ['ols', 'ridge', 'lasso', 'elasticnet']
+
+
+def make_splits(n_samples, n_splits=5, n_repeats=5, strata=None, groups=None, random_state=123):
+    """
+    生成重复k折划分
+
+    参数:
+    n_samples (int): 样本数
+    strata (array-like): 分层标签(如是否长链), 每折中各类的比例与全体相同
+    groups (array-like): 分组标签, 同组样本总在同一折(GroupKFold, 与顺序无关, 只划分一次);
+                         组数少于 n_splits 时(如 long_chain_strata 只有两组)改为留一组交叉验证, 每组各做一次验证集
+    random_state (int): 第r次重复使用 random_state + r
+
+    返回:
+    list[(int, int, np.ndarray, np.ndarray)]: (repeat, fold, 训练集下标, 验证集下标)
+    """
+    splits = []
+    placeholder = np.zeros(n_samples)
+    if groups is not None:
+        if len(np.unique(groups)) < n_splits:
+            splitter = LeaveOneGroupOut()
+        else:
+            splitter = GroupKFold(n_splits=n_splits)
+        for fold, (train, val) in enumerate(splitter.split(placeholder, groups=groups)):
+            splits.append((0, fold, train, val))
+        return splits
+    for repeat in range(n_repeats):
+        if strata is not None:
+            splitter = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state + repeat)
+            folds = splitter.split(placeholder, strata)
+        else:
+            folds = KFold(n_splits=n_splits, shuffle=True, random_state=random_state + repeat).split(placeholder)
+        for fold, (train, val) in enumerate(folds):
+            splits.append((repeat, fold, train, val))
+    return splits
+
+
+def fold_statistics(X, y, train, val):
+    """
+    一折的标准化参数和充分统计量, 同一折上的所有模型共用
+
+    返回:
+    dict: mean/scale(训练集特征的均值和标准差)、y_mean、x_train(标准化并中心化)、x_val(用训练集参数标准化)、
+          gram(x_trainᵀx_train)、xty(x_trainᵀ(y-y_mean))
+    """
+    x_train, x_val = X[train], X[val]
+    mean = x_train.mean(axis=0)
+    scale = x_train.std(axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+    x_train = (x_train - mean) / scale
+    y_mean = y[train].mean()
+    y_centered = y[train] - y_mean
+    return {
+        'mean': mean,
+        'scale': scale,
+        'y_mean': y_mean,
+        'x_train': x_train,
+        'x_val': (x_val - mean) / scale,
+        'y_train': y_centered,
+        'gram': x_train.T @ x_train,
+        'xty': x_train.T @ y_centered,
+    }
+
+
+def fit_from_statistics(stats, kind, alpha=0.0, l1_ratio=0.5, features=None, max_iter=100000):
+    """
+    用一折的统计量拟合线性模型, 返回标准化特征上的系数 (未选中的特征系数为0)
+
+    ols/ridge 直接解 (XᵀX + alpha·I) w = Xᵀy; lasso/elasticnet 把缓存的Gram矩阵作为 precompute 传给sklearn
+
+    参数:
+    kind (str): CV_MODEL_KINDS 中的模型
+    features (list[int]): 只使用这些特征(下标), 如 subset_regression 选出的子集
+    """
+    n_features = len(stats['xty'])
+    features = np.arange(n_features) if features is None else np.asarray(features)
+    gram = stats['gram'][np.ix_(features, features)]
+    xty = stats['xty'][features]
+    coef = np.zeros(n_features)
+    if kind in ('ols', 'ridge'):
+        coef[features] = np.linalg.lstsq(gram + alpha * np.eye(len(features)), xty, rcond=None)[0]
+    elif kind in ('lasso', 'elasticnet'):
+        # sklearn 的 alpha 对应 1/(2n) 倍的残差平方和
+        if kind == 'lasso':
+            model = Lasso(alpha=alpha, fit_intercept=False, precompute=gram, max_iter=max_iter)
+        else:
+            model = ElasticNet(alpha=alpha, l1_ratio=l1_ratio, fit_intercept=False, precompute=gram,
+                               max_iter=max_iter)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            model.fit(stats['x_train'][:, features], stats['y_train'])
+        coef[features] = model.coef_
+    else:
+        raise ValueError(f'未知的模型: {kind}')
+    return coef
+
+
+def cross_validate(X, y, models, n_splits=5, n_repeats=5, strata=None, groups=None, random_state=123, idx=None,
+                   max_workers=None):
+    """
+    重复k折(可分层或分组)交叉验证, 各折在进程池中并行
+
+    每折的标准化和 XᵀX/Xᵀy 只计算一次, 该折上的所有模型都由它们拟合
+
+    参数:
+    X (pd.DataFrame | np.ndarray): 特征
+    y (array-like): 目标值
+    models (dict): 模型名 -> fit_from_statistics 的参数, 如 {'ridge_1': {'kind': 'ridge', 'alpha': 1.0}}
+    n_splits, n_repeats, strata, groups, random_state: 见 make_splits
+    idx (array-like): 样本编号, 默认为 0 ~ n-1
+    max_workers (int): 进程数
+
+    返回:
+    (pd.DataFrame, pd.DataFrame): 各折验证集的预测(列为 PREDICTION_COLUMNS, 按 model 和 repeat 筛选后可直接传给 plot_r2)
+                                  和各折的指标(列为 METRIC_COLUMNS)
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    idx = np.arange(len(y)) if idx is None else np.asarray(idx)
+    splits = make_splits(len(y), n_splits=n_splits, n_repeats=n_repeats, strata=strata, groups=groups,
+                         random_state=random_state)
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                             initargs=(X, y, idx, models)) as executor:
+        results = list(executor.map(_evaluate_fold_worker, splits))
+
+    predictions = pd.concat([prediction for prediction, _ in results], ignore_index=True)
+    metrics = pd.DataFrame([record for _, records in results for record in records], columns=METRIC_COLUMNS)
+    return predictions[PREDICTION_COLUMNS], metrics
+
+
+def summarize_metrics(metrics):
+    # 每个模型各折指标的均值和标准差
+    summary = metrics.groupby('model', sort=False)[['r2', 'rmse', 'mae']].agg(['mean', 'std'])
+    summary.columns = [f'{metric}_{stat}' for metric, stat in summary.columns]
+    return summary.reset_index()
+
+
+def long_chain_strata(index_values, long_chain_path=os.path.join('dataset', 'merged_critic_data_only_long_chain.xlsx')):
+    # 是否为长链分子(index 出现在长链数据集中), 用作分层或分组标签
+    long_chain_index = read_table(long_chain_path)['index']
+    return np.asarray(pd.Series(index_values).isin(long_chain_index), dtype=int)
+
+
+def _evaluate_fold(X, y, idx, models, split):
+    repeat, fold, train, val = split
+    stats = fold_statistics(X, y, train, val)
+    predictions, records = [], []
+    for name, params in models.items():
+        coef = fit_from_statistics(stats, **params)
+        pre = stats['x_val'] @ coef + stats['y_mean']
+        residual = y[val] - pre
+        predictions.append(pd.DataFrame({'model': name, 'repeat': repeat, 'fold': fold, 'idx': idx[val],
+                                         'label': y[val], 'pre': pre}))
+        records.append({'model': name, 'repeat': repeat, 'fold': fold, 'n_train': len(train), 'n_val': len(val),
+                        'r2': 1 - np.sum(residual ** 2) / np.sum((y[val] - y[val].mean()) ** 2),
+                        'rmse': np.sqrt(np.mean(residual ** 2)), 'mae': np.mean(np.abs(residual))})
+    return pd.concat(predictions, ignore_index=True), records
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(X, y, idx, models):
+    # 数据只在启动进程时传一次
+    _WORKER_STATE.update(X=X, y=y, idx=idx, models=models)
+
+
+def _evaluate_fold_worker(split):
+    return _evaluate_fold(_WORKER_STATE['X'], _WORKER_STATE['y'], _WORKER_STATE['idx'], _WORKER_STATE['models'], split)
+
+
+if __name__ == '__main__':
+    from os.path import join
+    from feature_expr import apply_feature_expressions
+    from fit_model import FEATURE_EXPRESSIONS, FEATURE_LABELS, load_data
+    from plot_r2 import plot_r2
+
+    target_df_path = join('dataset', 'merged_critic_data.xlsx')
+    feature_df_path = join('dataset', 'surface_result.xlsx')
+    target_df_label = ['Tc/K']
+
+    X, Y = load_data(target_df_path=target_df_path, feature_df_path=feature_df_path,
+                     target_df_label=target_df_label, feature_df_label=['index'] + FEATURE_LABELS)
+    strata = long_chain_strata(X['index'])
+    X = apply_feature_expressions(X[FEATURE_LABELS], FEATURE_EXPRESSIONS)
+
+    models = {
+        'ols': {'kind': 'ols'},
+        'ridge_1': {'kind': 'ridge', 'alpha': 1.0},
+        'ridge_10': {'kind': 'ridge', 'alpha': 10.0},
+        'lasso_1': {'kind': 'lasso', 'alpha': 1.0},
+    }
+    # 按是否长链分层, 5折重复5次
+    predictions, metrics = cross_validate(X, Y[target_df_label[0]], models, n_splits=5, n_repeats=5, strata=strata)
+    predictions.to_csv('cv_predictions.csv', index=False)
+    metrics.to_csv('cv_metrics.csv', index=False)
+    print(summarize_metrics(metrics))
+
+    # 第一次重复中每个样本恰好在验证集中出现一次
+    ridge_df = predictions[(predictions['model'] == 'ridge_1') & (predictions['repeat'] == 0)]
+    plot_r2(test_x_y_df_path=ridge_df, save=True, save_root_path='.', ticks=None)
+
+    # 按是否长链分组: 只有两组, 即用短链训练预测长链, 再反过来, 检验模型向另一类分子的外推能力
+    group_predictions, group_metrics = cross_validate(X, Y[target_df_label[0]], models, groups=strata)
+    group_metrics.to_csv('cv_group_metrics.csv', index=False)
+    print(group_metrics[['model', 'fold', 'n_train', 'n_val', 'r2', 'rmse', 'mae']])
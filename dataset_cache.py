@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  # parquet 缓存依赖 pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+CACHE_DIR_NAME = '.excel_cache'
+
+
+def read_excel_cached(path, sheet_name=0):
+    """
+    读取Excel工作表, 并在源文件旁的 .excel_cache 目录中缓存为Parquet
+    源文件的 mtime/大小 变化时校验内容哈希, 哈希变化则重新解析Excel
+
+    参数:
+    path (str): Excel文件路径
+    sheet_name (str | int): 工作表名或序号, 与 pd.read_excel 相同
+
+    返回:
+    pd.DataFrame
+    """
+    if not HAS_PYARROW:
+        return pd.read_excel(path, sheet_name=sheet_name)
+
+    meta = _load_valid_meta(path)
+    if isinstance(sheet_name, int):
+        sheet_name = meta['sheet_names'][sheet_name]
+
+    cache_path = _sheet_cache_path(path, sheet_name)
+    if sheet_name in meta['cached_sheets'] and os.path.exists(cache_path):
+        return pd.read_parquet(cache_path, memory_map=True)
+
+    df = pd.read_excel(path, sheet_name=sheet_name)
+    try:
+        atomic_write(cache_path, lambda tmp_path: df.to_parquet(tmp_path, index=True))
+    except (ValueError, TypeError, pyarrow.lib.ArrowException) as e:
+        # 混合类型的列等无法存为parquet, 直接返回解析结果
+        print(f'警告: 工作表 {sheet_name} ({path}) 无法缓存: {e}')
+        return df
+    meta['cached_sheets'].append(sheet_name)
+    _write_meta(path, meta)
+    return df
+
+
+def excel_sheet_names(path):
+    if not HAS_PYARROW:
+        with pd.ExcelFile(path) as xl:
+            return xl.sheet_names
+    return list(_load_valid_meta(path)['sheet_names'])
+
+
+def read_table(path, sheet_name=0):
+    # 按扩展名读取表格文件, Excel走缓存
+    if path.endswith(('.xlsx', '.xls')):
+        return read_excel_cached(path, sheet_name=sheet_name)
+    elif path.endswith('.csv'):
+        return pd.read_csv(path)
+    elif path.endswith('.parquet'):
+        return pd.read_parquet(path, memory_map=True)
+    else:
+        raise ValueError(f'无法识别的文件类型: {path}')
+
+
+def _load_valid_meta(path):
+    stat = os.stat(path)
+    meta = _read_meta(path)
+    if meta is not None and meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+        return meta
+
+    # mtime或大小变了, 用内容哈希判断文件是否真的变化
+    content_hash = file_hash(path)
+    if meta is not None and meta['sha256'] == content_hash:
+        meta['mtime_ns'], meta['size'] = stat.st_mtime_ns, stat.st_size
+    else:
+        with pd.ExcelFile(path) as xl:
+            sheet_names = xl.sheet_names
+        meta = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': content_hash,
+                'sheet_names': sheet_names, 'cached_sheets': []}
+    _write_meta(path, meta)
+    return meta
+
+
+def _cache_root(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+
+
+def _meta_path(path):
+    return os.path.join(_cache_root(path), f'{os.path.basename(path)}.json')
+
+
+def _sheet_cache_path(path, sheet_name):
+    sheet_hash = hashlib.sha1(str(sheet_name).encode()).hexdigest()[:12]
+    return os.path.join(_cache_root(path), f'{os.path.basename(path)}.{sheet_hash}.parquet')
+
+
+def _read_meta(path):
+    try:
+        with open(_meta_path(path), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(path, meta):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, ensure_ascii=False)
+    atomic_write(_meta_path(path), write)
+
+
+def atomic_write(target_path, write_func):
+    # write_func(tmp_path) 写入同目录下的临时文件, 完成后再替换目标文件, 中途出错不会留下不完整的文件
+    os.makedirs(os.path.dirname(os.path.abspath(target_path)), exist_ok=True)
+    tmp_path = f'{target_path}.{os.getpid()}.tmp'
+    try:
+        write_func(tmp_path)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_hash(path, chunk_size=1 << 20):
+    # 文件内容的 sha256, 分块读取
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
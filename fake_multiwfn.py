@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import numpy as np
+
+
+# 测试用的Multiwfn替身: 检查命令行和stdin菜单输入, 输出表面分析结果
+# 表面为一个细分的正二十面体球面, 面积、极值和平均值按Multiwfn的方式(面片取三个顶点的均值)由该表面计算, 其余为固定值;
+# 菜单输入中有 7 / 8 时在当前目录导出 vtx.txt / facet.pdb
+# 用法: multiwfn_driver.iter_multiwfn_runs(..., multiwfn_command=[sys.executable, 'fake_multiwfn.py'])
+HARTREE_TO_KCALMOL = 627.5095
+BOHR_TO_ANGSTROM = 0.529177210903
+RADIUS_ANGSTROM = 3.5
+CANNED_OUTPUT = """ Isosurface area:      {area_bohr2:.4f} Bohr^2  (  {area:.4f} Angstrom^2)
+ Sphericity:   0.7898
+ ================= Summary of surface analysis =================
+
+ Volume:   912.13108 Bohr^3  (135.16508 Angstrom^3)
+ Estimated density according to mass and volume (M/V):    0.9071 g/cm^3
+ Minimal value:   {min_value:.5f} kcal/mol   Maximal value:    {max_value:.5f} kcal/mol
+ Overall surface area:         {area_bohr2:.5f} Bohr^2  ( {area:.5f} Angstrom^2)
+ Positive surface area:        {positive_area_bohr2:.5f} Bohr^2  ( {positive_area:.5f} Angstrom^2)
+ Negative surface area:        {negative_area_bohr2:.5f} Bohr^2  (  {negative_area:.5f} Angstrom^2)
+ Overall average value:   {average_au:.8f} a.u. (   {average:.5f} kcal/mol)
+ Positive average value:   {positive_average_au:.8f} a.u. (    {positive_average:.5f} kcal/mol)
+ Negative average value:  {negative_average_au:.8f} a.u. (  {negative_average:.5f} kcal/mol)
+ Overall variance (sigma^2_tot):  0.00060271 a.u.^2 ( 237.33398 (kcal/mol)^2)
+ Positive variance:        0.00007832 a.u.^2 (  30.84227 (kcal/mol)^2)
+ Negative variance:        0.00052439 a.u.^2 ( 206.49171 (kcal/mol)^2)
+ Balance of charges (nu):   0.11306167
+ Product of sigma^2_tot and nu:   0.00006814 a.u.^2 (   26.83360 (kcal/mol)^2)
+ Internal charge separation (Pi):   0.01919453 a.u. (     12.04476 kcal/mol)
+ Molecular polarity index (MPI):   0.64697919 eV (     14.91961 kcal/mol)
+ Nonpolar surface area (|ESP| <= 10 kcal/mol):    151.20 Angstrom^2  ( 76.58 %)
+ Polar surface area (|ESP| > 10 kcal/mol):         46.25 Angstrom^2  ( 23.42 %)
+ Overall skewness:         0.5672
+ Positive skewness:        0.8023
+ Negative skewness:       -0.0982
+
+ Surface analysis finished!
+"""
+
+
+def sphere_surface(n_subdivisions=3):
+    # 细分正二十面体得到球面三角网格, 返回 (顶点坐标 Angstrom, 面片顶点序号从0开始, 顶点上的静电势 a.u.)
+    t = (1 + 5 ** 0.5) / 2
+    vertices = [(-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0), (0, -1, t), (0, 1, t), (0, -1, -t), (0, 1, -t),
+                (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1)]
+    facets = [(0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11), (1, 5, 9), (5, 11, 4), (11, 10, 2),
+              (10, 7, 6), (7, 1, 8), (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9), (4, 9, 5), (2, 4, 11),
+              (6, 2, 10), (8, 6, 7), (9, 8, 1)]
+    vertices = [np.array(vertex) / np.linalg.norm(vertex) for vertex in vertices]
+    for _ in range(n_subdivisions):
+        midpoints = {}
+
+        def midpoint(i, j):
+            key = (min(i, j), max(i, j))
+            if key not in midpoints:
+                vertex = vertices[i] + vertices[j]
+                vertices.append(vertex / np.linalg.norm(vertex))
+                midpoints[key] = len(vertices) - 1
+            return midpoints[key]
+
+        new_facets = []
+        for a, b, c in facets:
+            ab, bc, ca = midpoint(a, b), midpoint(b, c), midpoint(c, a)
+            new_facets += [(a, ab, ca), (b, bc, ab), (c, ca, bc), (ab, bc, ca)]
+        facets = new_facets
+    coords = np.array(vertices) * RADIUS_ANGSTROM
+    unit = coords / RADIUS_ANGSTROM
+    values = 0.03 * unit[:, 2] - 0.012 * unit[:, 0] ** 2 + 0.004
+    return coords, np.array(facets), values
+
+
+def surface_summary(coords, facets, values):
+    a, b, c = coords[facets[:, 0]], coords[facets[:, 1]], coords[facets[:, 2]]
+    areas = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    facet_values = values[facets].mean(axis=1)
+    positive, negative = facet_values > 0, facet_values < 0
+    summary = {
+        'area': areas.sum(), 'positive_area': areas[positive].sum(), 'negative_area': areas[negative].sum(),
+        'average_au': np.average(facet_values, weights=areas),
+        'positive_average_au': np.average(facet_values[positive], weights=areas[positive]),
+        'negative_average_au': np.average(facet_values[negative], weights=areas[negative]),
+        'min_value': values.min() * HARTREE_TO_KCALMOL, 'max_value': values.max() * HARTREE_TO_KCALMOL,
+    }
+    for key in ['area', 'positive_area', 'negative_area']:
+        summary[f'{key}_bohr2'] = summary[key] / BOHR_TO_ANGSTROM ** 2
+    for key in ['average', 'positive_average', 'negative_average']:
+        summary[key] = summary[f'{key}_au'] * HARTREE_TO_KCALMOL
+    return summary
+
+
+def export_surface(coords, facets, values, commands):
+    if '7' in commands:
+        with open('vtx.txt', 'w') as f:
+            f.write(f'{len(coords)}\n')
+            for (x, y, z), value in zip(coords, values):
+                f.write(f'{x:16.8f}{y:16.8f}{z:16.8f}{value:18.10E}\n')
+    if '8' in commands:
+        with open('facet.pdb', 'w') as f:
+            for i, (x, y, z) in enumerate(coords, start=1):
+                f.write(f'HETATM{i:5d}  C   SUR     1    {x:8.3f}{y:8.3f}{z:8.3f}  1.00  0.00           C\n')
+            for i, j, k in facets + 1:
+                f.write(f'CONECT{i:5d}{j:5d}{k:5d}\n')
+            f.write('END\n')
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if not args or not os.path.exists(args[0]) or '-nt' not in args:
+        print(f'用法: fake_multiwfn.py 波函数文件 -nt 线程数, 实际参数: {args}')
+        sys.exit(1)
+    commands = sys.stdin.read().split()
+    print(f' Loaded {args[0]} successfully! Threads: {args[args.index("-nt") + 1]}')
+    if commands[:2] != ['12', '0'] or commands[-1] != 'q':
+        print(f' Unexpected menu input: {commands}')
+        sys.exit(1)
+    time.sleep(float(os.environ.get('FAKE_MULTIWFN_SECONDS', '0.2')))
+    coords, facets, values = sphere_surface()
+    export_surface(coords, facets, values, commands[2:])
+    print(CANNED_OUTPUT.format(**surface_summary(coords, facets, values)))
@@ -0,0 +1,204 @@
+import ast
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+
+# 表达式中可用的函数
+FUNCTIONS = {
+    'sqrt': np.sqrt,
+    'cbrt': np.cbrt,
+    'log': np.log,
+    'exp': np.exp,
+    'abs': np.abs,
+    'square': np.square,
+}
+BINARY_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+    ast.Pow: '**',
+}
+OPERATOR_FUNCTIONS = {
+    '+': np.add,
+    '-': np.subtract,
+    '*': np.multiply,
+    '/': np.divide,
+    '**': np.power,
+}
+# 可交换的运算, 规范化时操作数按字符串排序, a*b 与 b*a 共用缓存
+COMMUTATIVE_OPERATORS = {'+', '*'}
+
+
+@lru_cache(maxsize=None)
+def parse_expression(text):
+    """
+    把表达式字符串解析为规范化的节点元组, 可作为字典键(按哈希)查找缓存
+
+    节点为 ('col', 列名)、('num', 数值)、('neg', 子节点)、('call', 函数名, 子节点) 或 (运算符, 左, 右),
+    例如 'Product_sigma_nu / sqrt(Total_area_Angstrom2)'
+
+    返回:
+    tuple: 规范化后的表达式
+    """
+    try:
+        # SISSO 风格的 (a)^2 按乘方处理; 直接替换为 ** 才能保持乘方的优先级
+        tree = ast.parse(text.strip().replace('^', '**'), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f'无法解析的表达式: {text}') from e
+    return _convert(tree.body, text)
+
+
+def expression_to_string(node):
+    # 规范化表达式的字符串形式, 每个二元运算都加括号
+    kind = node[0]
+    if kind == 'col':
+        return node[1]
+    if kind == 'num':
+        return repr(node[1])
+    if kind == 'neg':
+        return f'(-{expression_to_string(node[1])})'
+    if kind == 'call':
+        return f'{node[1]}({expression_to_string(node[2])})'
+    return f'({expression_to_string(node[1])}{kind}{expression_to_string(node[2])})'
+
+
+def expression_columns(node):
+    # 表达式用到的列
+    kind = node[0]
+    if kind == 'col':
+        return {node[1]}
+    if kind == 'num':
+        return set()
+    return set().union(*(expression_columns(child) for child in node[1:] if isinstance(child, tuple)))
+
+
+class ExpressionEvaluator:
+    """
+    在一个连续的 float64 特征矩阵上向量化计算特征表达式
+
+    每个子表达式的结果按规范化节点缓存, 大量候选变换共有的子表达式只计算一次
+
+    参数:
+    X (pd.DataFrame): 初级特征, 表达式中的变量名为列名
+    columns (list[str]): 使用的列, 默认为全部列
+    """
+
+    def __init__(self, X, columns=None):
+        columns = list(X.columns) if columns is None else list(columns)
+        # 按列存储, 取出一列不需要复制
+        self.values = np.asfortranarray(X[columns].to_numpy(dtype=np.float64))
+        # 缓存的数组会被多个表达式共用, 设为只读
+        self.values.flags.writeable = False
+        self.column_index = {name: i for i, name in enumerate(columns)}
+        self.index = X.index
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, expression):
+        # expression 为字符串或 parse_expression 的结果, 返回长度为样本数的数组
+        node = parse_expression(expression) if isinstance(expression, str) else expression
+        result = self._evaluate(node)
+        if np.ndim(result) == 0:
+            result = np.full(len(self.values), result, dtype=np.float64)
+        return result
+
+    def evaluate_many(self, expressions):
+        # 多个表达式按列组成 (样本数, 表达式数) 的矩阵
+        result = np.empty((len(self.values), len(expressions)), dtype=np.float64, order='F')
+        for i, expression in enumerate(expressions):
+            result[:, i] = self.evaluate(expression)
+        return result
+
+    def clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind == 'col':
+            if node[1] not in self.column_index:
+                raise KeyError(f'表达式中的列不存在: {node[1]}')
+            return self.values[:, self.column_index[node[1]]]
+        if kind == 'num':
+            return node[1]
+        if node in self.cache:
+            self.hits += 1
+            return self.cache[node]
+        self.misses += 1
+        with np.errstate(all='ignore'):
+            if kind == 'neg':
+                result = np.negative(self._evaluate(node[1]))
+            elif kind == 'call':
+                result = FUNCTIONS[node[1]](self._evaluate(node[2]))
+            else:
+                result = OPERATOR_FUNCTIONS[kind](self._evaluate(node[1]), self._evaluate(node[2]))
+        if isinstance(result, np.ndarray):
+            result.flags.writeable = False
+        self.cache[node] = result
+        return result
+
+
+def apply_feature_expressions(X, expressions, evaluator=None):
+    """
+    按声明的表达式生成特征, 返回新的 DataFrame, 不修改X
+
+    参数:
+    X (pd.DataFrame): 初级特征
+    expressions (dict): 列名 -> 表达式; 与X中已有列同名时替换该列(如 {'Total_area_Angstrom2': 'sqrt(Total_area_Angstrom2)'}),
+                        否则追加为新列
+    evaluator (ExpressionEvaluator): 复用已有的缓存, 默认新建
+
+    返回:
+    pd.DataFrame: 列顺序与X相同, 新列在最后
+    """
+    evaluator = ExpressionEvaluator(X) if evaluator is None else evaluator
+    derived = {name: evaluator.evaluate(expression) for name, expression in expressions.items()}
+    columns = list(X.columns) + [name for name in expressions if name not in X.columns]
+    data = {name: derived[name] if name in derived else X[name].to_numpy() for name in columns}
+    return pd.DataFrame(data, index=X.index, columns=columns)
+
+
+def _convert(node, text):
+    if isinstance(node, ast.Name):
+        return ('col', node.id)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return ('num', float(node.value))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _convert(node.operand, text)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        return ('num', -operand[1]) if operand[0] == 'num' else ('neg', operand)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        op = BINARY_OPERATORS[type(node.op)]
+        left, right = _convert(node.left, text), _convert(node.right, text)
+        if op in COMMUTATIVE_OPERATORS and repr(right) < repr(left):
+            left, right = right, left
+        return op, left, right
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+            and len(node.args) == 1 and not node.keywords):
+        return 'call', node.func.id, _convert(node.args[0], text)
+    raise ValueError(f'表达式中有不支持的部分 {ast.dump(node)}: {text}')
+
+
+if __name__ == '__main__':
+    import time
+    from os.path import join
+    from fit_model import FEATURE_LABELS, load_data
+
+    X, Y = load_data(target_df_path=join('dataset', 'merged_critic_data.xlsx'),
+                     feature_df_path=join('dataset', 'surface_result.xlsx'),
+                     target_df_label=['Tc/K'], feature_df_label=FEATURE_LABELS)
+
+    # 候选变换: 每个特征的开方、平方、对数, 以及对总面积的比值, 共用的子表达式只算一次
+    candidates = []
+    for name in FEATURE_LABELS:
+        candidates += [f'sqrt(abs({name}))', f'{name} ** 2', f'log(abs({name}))', f'{name} / sqrt(Total_area_Angstrom2)']
+    evaluator = ExpressionEvaluator(X, FEATURE_LABELS)
+    start = time.time()
+    matrix = evaluator.evaluate_many(candidates)
+    print(f'{len(candidates)} 个表达式, 用时 {time.time() - start:.4f} s, 缓存命中 {evaluator.hits}, 计算 {evaluator.misses}')
+    correlation = pd.Series(np.abs([np.corrcoef(column, Y['Tc/K'])[0, 1] for column in matrix.T]), index=candidates)
+    print(correlation.sort_values(ascending=False).head(10))
@@ -3,20 +3,72 @@ from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression, Ridge, Lasso
 from sklearn.preprocessing import StandardScaler
 from sklearn.pipeline import Pipeline
+from sklearn.metrics import r2_score
 import pandas as pd
 from typing import List
 from os.path import join
 
+from dataset_cache import read_table
+from feature_expr import apply_feature_expressions
+from model_artifact import save_model_artifact
 from plot_r2 import plot_r2
-
-
-def load_data(target_df_path:str, feature_df_path:str, target_df_label:List[str], feature_df_label:List[str], out=False):
-    target_df = pd.read_excel(target_df_path)
-    feature_df = pd.read_excel(feature_df_path)
+from smiles_index import map_smiles
+
+
+# Multiwfn表面分析得到的初级特征
+FEATURE_LABELS = [
+    'Sphericity',
+    'Volume_Angstrom3',
+    'Density_gcm3',
+    'Min_value_kcalmol',
+    'Max_value_kcalmol',
+    'Total_area_Angstrom2',
+    'Positive_area_Angstrom2',
+    'Negative_area_Angstrom2',
+    'Average_total_kcalmol',
+    'Average_positive_kcalmol',
+    'Average_negative_kcalmol',
+    'Variance_total',
+    'Variance_positive',
+    'Variance_negative',
+    'Balance_charges_nu',
+    'Product_sigma_nu',
+    'Internal_charge_separation_kcalmol',
+    'MPI_kcalmol',
+    'Nonpolar_area_Angstrom2',
+    'Nonpolar_area_percent',
+    'Polar_area_Angstrom2',
+    'Polar_area_percent',
+    'Skewness_total',
+    'Skewness_positive',
+    'Skewness_negative',
+]
+TARGET_LABELS = ['Pc/bar', 'Tb/K', 'Tc/K', 'Vc/cm3*mol^-1', 'omega', 'zc']
+# 特征变换, 列名 -> feature_expr 表达式, 与已有列同名时替换该列
+FEATURE_EXPRESSIONS = {
+    # 'Product_sigma_nu': 'sqrt(Product_sigma_nu)',  # / Total_area_Angstrom2
+    'Total_area_Angstrom2': 'sqrt(Total_area_Angstrom2)',
+    # 'Volume_Angstrom3': 'Volume_Angstrom3 ** 2',
+    # 'Nonpolar_area_Angstrom2': 'Nonpolar_area_Angstrom2 ** 2',
+}
+
+
+def load_data(target_df_path:str, feature_df_path:str, target_df_label:List[str], feature_df_label:List[str], out=False,
+              smiles_index_path:str=None, dropna_target=True):
+    # 支持 xlsx/csv/parquet, 如 read_surface_data.scan_surface_outputs 生成的 surface_result.parquet
+    # dropna_target=False 时保留第一个目标为空的行, 多个目标一起读取时由调用方按各目标分别过滤
+    target_df = read_table(target_df_path)
+    feature_df = read_table(feature_df_path)
     dataset_df = pd.merge(target_df, feature_df, on='index', how='inner')
 
     # 过滤空值
-    dataset_df = dataset_df[dataset_df[target_df_label[0]].notna()]
+    if dropna_target:
+        dataset_df = dataset_df[dataset_df[target_df_label[0]].notna()]
+
+    # 同一分子只保留一条, 避免其同时出现在训练集和测试集中
+    if smiles_index_path is not None:
+        canonical_smiles = map_smiles(dataset_df['SMILES'], index_path=smiles_index_path)['Canonical SMILES']
+        dataset_df = dataset_df[~canonical_smiles.duplicated().to_numpy()]
     if out:
         dataset_df.to_excel('dataset.xlsx')
 
@@ -33,44 +85,15 @@ if __name__ == '__main__':
     target_df_path = join('dataset', 'merged_critic_data.xlsx')
     feature_df_path = join('dataset', 'surface_result.xlsx')
     target_df_label = ['Tc/K']
-    # target_df_label = ['Pc/bar', 'Tb/K', 'Tc/K', 'Vc/cm3*mol^-1', 'omega', 'zc']
+    # target_df_label = TARGET_LABELS
     # feature_df_label = ['Total_area_Angstrom2', 'Product_sigma_nu']
 
-    feature_df_label = [
-                        'Sphericity',
-                        'Volume_Angstrom3',
-                        'Density_gcm3',
-                        'Min_value_kcalmol',
-                        'Max_value_kcalmol',
-                        'Total_area_Angstrom2',
-                        'Positive_area_Angstrom2',
-                        'Negative_area_Angstrom2',
-                        'Average_total_kcalmol',
-                        'Average_positive_kcalmol',
-                        'Average_negative_kcalmol',
-                        'Variance_total',
-                        'Variance_positive',
-                        'Variance_negative',
-                        'Balance_charges_nu',
-                        'Product_sigma_nu',
-                        'Internal_charge_separation_kcalmol',
-                        'MPI_kcalmol',
-                        'Nonpolar_area_Angstrom2',
-                        'Nonpolar_area_percent',
-                        'Polar_area_Angstrom2',
-                        'Polar_area_percent',
-                        'Skewness_total',
-                        'Skewness_positive',
-                        'Skewness_negative',
-                        ]
+    feature_df_label = FEATURE_LABELS
 
 
     X, Y = load_data(target_df_path=target_df_path, feature_df_path=feature_df_path, target_df_label=target_df_label, feature_df_label=feature_df_label, out=True)
     # ---------特征处理----------------
-    # X['Product_sigma_nu'] = (X['Product_sigma_nu'] ** 0.5) #/ X['Total_area_Angstrom2']
-    X['Total_area_Angstrom2'] = X['Total_area_Angstrom2'] ** 0.5
-    # X['Volume_Angstrom3'] = X['Volume_Angstrom3'] ** 2
-    # X['Nonpolar_area_Angstrom2'] = X['Nonpolar_area_Angstrom2'] ** 2
+    X = apply_feature_expressions(X, FEATURE_EXPRESSIONS)
     # --------------------------------
 
     sample_idx = list(range(len(X)))
@@ -140,6 +163,12 @@ if __name__ == '__main__':
     print(pipeline['model'].coef_)
     print(pipeline['model'].intercept_)
 
+    # 保存模型及特征列、特征表达式, 之后用 predict.py 对新分子批量预测
+    save_model_artifact(pipeline, root_dir='models', feature_labels=feature_df_label,
+                        feature_expressions=FEATURE_EXPRESSIONS, target_labels=target_df_label,
+                        metrics={'train_r2': r2_score(Y_train, train_pred), 'val_r2': r2_score(Y_val, val_pred),
+                                 'test_r2': r2_score(Y_test, test_pred)})
+
 
 
 
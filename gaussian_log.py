@@ -0,0 +1,224 @@
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+from ase import Atoms
+
+
+# 一次扫描整个log: 终止信息、SCF能量、热化学量和坐标块的位置
+LOG_PATTERN = re.compile(
+    r'(?P<termination>Normal termination of Gaussian|Error termination)'
+    r'|SCF Done:\s+E\([^)]*\)\s+=\s+(?P<scf_energy>\S+)'
+    r'|Zero-point correction=\s+(?P<zpe>\S+)'
+    r'|Sum of electronic and zero-point Energies=\s+(?P<e0_zpe>\S+)'
+    r'|Sum of electronic and thermal Enthalpies=\s+(?P<enthalpy>\S+)'
+    r'|Sum of electronic and thermal Free Energies=\s+(?P<free_energy>\S+)'
+    r'|(?P<orientation>(?:Standard|Input) orientation:)'
+)
+ENERGY_FIELDS = ['scf_energy', 'zpe', 'e0_zpe', 'enthalpy', 'free_energy']
+RESTART_SUFFIX = '_restart'
+
+
+def parse_gaussian_log(log_path):
+    """
+    解析Gaussian输出, 按终止信息把log切分为若干作业段
+    注意 opt freq 在一个步骤里会产生两次终止信息(opt 和自动追加的 freq 各一次);
+    出错时 Gaussian 可能连续打印 'Error termination request processed by link_exit.' 和
+    'Error termination via Lnk1e in ...' 两行, 只算一次
+
+    返回:
+    list[dict]: 每段一个字典, 包括 normal(True/False, 未结束的最后一段为None)、ENERGY_FIELDS 中的能量(Hartree)
+                和 geometry (该段最后的坐标, (原子序数数组, 坐标数组) 或 None)
+    """
+    with open(log_path, 'r', errors='ignore') as f:
+        text = f.read()
+
+    segments = []
+    segment = _new_segment()
+    for match in LOG_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == 'termination':
+            normal = match.group('termination').startswith('Normal')
+            if not normal and segments and segments[-1]['normal'] is False and _is_empty_segment(segment):
+                continue
+            segment['normal'] = normal
+            segments.append(_finish_segment(segment, text))
+            segment = _new_segment()
+        elif kind == 'orientation':
+            segment['orientation_pos'] = match.end()
+        else:
+            segment[kind] = float(match.group(kind).replace('D', 'E'))
+    if segment['orientation_pos'] is not None or segment['scf_energy'] is not None:
+        segments.append(_finish_segment(segment, text))
+    return segments
+
+
+def read_final_geometry(log_path):
+    # log 中最后一个坐标块, 转为 ase.Atoms; 没有坐标时返回 None
+    for segment in reversed(parse_gaussian_log(log_path)):
+        if segment['geometry'] is not None:
+            numbers, positions = segment['geometry']
+            return Atoms(numbers=numbers, positions=positions)
+    return None
+
+
+def read_gjf_steps(gjf_path):
+    """
+    把gjf按 --link1-- 切分为步骤
+
+    返回:
+    list[dict]: 每个步骤的 text(原文, 不含 --link1-- 行)、route(路由行)和 n_terminations(预计的终止信息数)
+    """
+    with open(gjf_path, 'r') as f:
+        chunks = re.split(r'^--link1--\s*\n', f.read(), flags=re.MULTILINE | re.IGNORECASE)
+    steps = []
+    for chunk in chunks:
+        lines = chunk.split('\n')
+        route_lines = []
+        for line in lines:
+            if line.startswith('#') or (route_lines and line.strip()):
+                route_lines.append(line.strip())
+            elif route_lines:
+                break
+        route = ' '.join(route_lines)
+        steps.append({'text': chunk, 'route': route, 'n_terminations': expected_terminations(route)})
+    return steps
+
+
+def expected_terminations(route):
+    route = route.lower()
+    return 2 if re.search(r'\bopt\b', route) and re.search(r'\bfreq\b', route) else 1
+
+
+def job_progress(gjf_path):
+    """
+    汇总一个gjf(及其 _restartN 续算文件)的完成情况
+
+    返回:
+    dict: n_steps, finished_steps(从头开始连续完成的步骤数), status('done'/'failed'/'incomplete'/'not_started'),
+          partial_terminations(第一个未完成步骤中已正常结束的作业段数, 如 opt 已完成而 freq 未完成时为1),
+          last_log(最新的log), steps(每步最后一段的能量等)
+    """
+    steps = read_gjf_steps(gjf_path)
+    n_steps = len(steps)
+    progress = {'gjf_path': gjf_path, 'n_steps': n_steps, 'finished_steps': 0, 'status': 'not_started',
+                'partial_terminations': 0, 'last_log': None, 'steps': [None] * n_steps}
+
+    # 续算文件只包含剩余的步骤, 所以它的第一步对应原始gjf中的第 n_steps - len(续算步骤) 步
+    for path in [gjf_path] + restart_gjf_paths(gjf_path):
+        log_path = path[:-len('.gjf')] + '.log'
+        if not os.path.exists(log_path):
+            continue
+        file_steps = steps if path == gjf_path else read_gjf_steps(path)
+        offset = n_steps - len(file_steps)
+        segments = parse_gaussian_log(log_path)
+        progress['last_log'] = log_path
+
+        status, finished, partial, position = 'incomplete', offset, 0, 0
+        for i, step in enumerate(file_steps):
+            step_segments = segments[position:position + step['n_terminations']]
+            position += step['n_terminations']
+            n_normal = 0
+            for segment in step_segments:
+                if segment['normal'] is not True:
+                    break
+                n_normal += 1
+            if n_normal == step['n_terminations']:
+                finished = offset + i + 1
+                progress['steps'][offset + i] = step_segments[-1]
+                continue
+            partial = n_normal
+            if any(segment['normal'] is False for segment in step_segments):
+                status = 'failed'
+            break
+        else:
+            status = 'done'
+
+        if finished >= progress['finished_steps']:
+            progress.update(finished_steps=finished, status=status, partial_terminations=partial)
+    return progress
+
+
+def restart_gjf_paths(gjf_path):
+    stem = gjf_path[:-len('.gjf')]
+    paths = glob.glob(f'{glob.escape(stem)}{RESTART_SUFFIX}*.gjf')
+    numbered = [(int(m.group(1)), p) for p in paths
+                if (m := re.fullmatch(re.escape(stem + RESTART_SUFFIX) + r'(\d+)\.gjf', p))]
+    return [p for _, p in sorted(numbered)]
+
+
+def harvest_gaussian_jobs(gjf_paths):
+    """
+    批量汇总Gaussian作业: 状态、完成步骤数和各步骤的能量
+
+    返回:
+    pd.DataFrame: 每个gjf一行; step{i}_scf_energy 为第i步最后的SCF能量, zpe/enthalpy/free_energy 取自含freq的步骤
+    """
+    records = []
+    for gjf_path in gjf_paths:
+        if re.search(re.escape(RESTART_SUFFIX) + r'\d+\.gjf$', gjf_path):
+            continue
+        progress = job_progress(gjf_path)
+        record = {key: progress[key] for key in ['gjf_path', 'status', 'n_steps', 'finished_steps', 'last_log']}
+        for i, segment in enumerate(progress['steps']):
+            if segment is None:
+                continue
+            record[f'step{i}_scf_energy'] = segment['scf_energy']
+            for field in ['zpe', 'e0_zpe', 'enthalpy', 'free_energy']:
+                if segment[field] is not None:
+                    record[field] = segment[field]
+        records.append(record)
+    df = pd.DataFrame(records)
+    if not df.empty:
+        print(df['status'].value_counts())
+    return df
+
+
+def _new_segment():
+    segment = {field: None for field in ENERGY_FIELDS}
+    segment.update(normal=None, orientation_pos=None)
+    return segment
+
+
+def _is_empty_segment(segment):
+    return segment['orientation_pos'] is None and all(segment[field] is None for field in ENERGY_FIELDS)
+
+
+def _finish_segment(segment, text):
+    pos = segment.pop('orientation_pos')
+    segment['geometry'] = _parse_orientation_block(text, pos) if pos is not None else None
+    return segment
+
+
+def _parse_orientation_block(text, pos):
+    # 坐标块: 标题行之后依次是分隔线、两行表头、分隔线, 然后每个原子一行, 最后以分隔线结束
+    # 逐行向后查找, 避免切出整个log的剩余部分
+    start = text.find('\n', pos) + 1
+    n_dash = 0
+    numbers, positions = [], []
+    while start > 0:
+        end = text.find('\n', start)
+        line = text[start:end] if end != -1 else text[start:]
+        start = end + 1
+        if line.strip().startswith('---'):
+            n_dash += 1
+            if n_dash == 3:
+                break
+            continue
+        if n_dash == 2:
+            fields = line.split()
+            if len(fields) < 6:
+                # log 在坐标块中间被截断
+                return None
+            numbers.append(int(fields[1]))
+            positions.append([float(x) for x in fields[-3:]])
+    if not numbers:
+        return None
+    return np.array(numbers), np.array(positions)
+
+
+if __name__ == '__main__':
+
+    df = harvest_gaussian_jobs(sorted(glob.glob('*.gjf')))
+    df.to_csv('gaussian_results.csv', index=False)
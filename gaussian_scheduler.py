@@ -0,0 +1,213 @@
+import math
+import os
+import re
+import pandas as pd
+from ase.data import chemical_symbols
+from ase.io import read
+
+from make_gaussian_input import structure_file_to_gjf
+
+
+# 各基组每种元素的收缩基函数数; Pople基组按Gaussian默认的笛卡尔d(6d), def2系列为球谐(5d7f)
+# 表中没有的元素按所在周期取 H/row2/row3 的值
+BASIS_FUNCTIONS = {
+    '6-31g': {'H': 2, 'row2': 9, 'row3': 13},
+    '6-31g(d)': {'H': 2, 'row2': 15, 'row3': 19},
+    '6-31g(d,p)': {'H': 5, 'row2': 15, 'row3': 19},
+    '6-311g(d,p)': {'H': 6, 'row2': 19, 'row3': 27},
+    'def2svp': {'H': 5, 'row2': 14, 'row3': 18},
+    'def2tzvp': {'H': 6, 'row2': 31, 'row3': 37},
+    'def2tzvpp': {'H': 14, 'row2': 31, 'row3': 42},
+}
+BASIS_ALIASES = {
+    '6-31g*': '6-31g(d)',
+    '6-31g**': '6-31g(d,p)',
+    '6-311g**': '6-311g(d,p)',
+}
+# 第四周期及以后的元素粗略按第三周期的1.5倍计
+HEAVY_ELEMENT_FACTOR = 1.5
+
+# 代价模型中的经验系数(相对单位, 只用于排序和分配核数)
+SOLVENT_FACTOR = 1.3
+BASIS_PER_CORE = 25
+MIN_MEM_GB_PER_JOB = 2
+
+
+def parse_basis(keywords):
+    # 从 '# opt freq b3lyp/6-31g(d,p) em=gd3bj' 这样的关键词中取出基组名, 统一为小写、去掉def2后的连字符
+    match = re.search(r'/\s*([^\s]+)', keywords)
+    if match is None:
+        raise ValueError(f'无法从关键词中识别基组: {keywords}')
+    basis = match.group(1).lower().replace('def2-', 'def2')
+    basis = BASIS_ALIASES.get(basis, basis)
+    if basis not in BASIS_FUNCTIONS:
+        raise ValueError(f'未知基组 {basis}, 请在 BASIS_FUNCTIONS 中补充')
+    return basis
+
+
+def count_basis_functions(numbers, basis):
+    table = BASIS_FUNCTIONS[basis]
+    n_basis = 0
+    for number in numbers:
+        symbol = chemical_symbols[number]
+        if symbol in table:
+            n_basis += table[symbol]
+        elif number <= 2:
+            n_basis += table['H']
+        elif number <= 10:
+            n_basis += table['row2']
+        elif number <= 18:
+            n_basis += table['row3']
+        else:
+            n_basis += math.ceil(table['row3'] * HEAVY_ELEMENT_FACTOR)
+    return n_basis
+
+
+def estimate_task_cost(keywords, n_atoms, n_electrons, n_basis):
+    """
+    估算一个计算步骤的相对代价
+
+    SCF 按 N_basis^3 计; opt 的步数按 10 + 原子数 估计, 每步约一次SCF加梯度;
+    freq 的CPHF部分按 3*原子数 * N_basis^2 * 占据轨道数 计; 隐式溶剂乘 SOLVENT_FACTOR
+    """
+    keywords = keywords.lower()
+    scf = float(n_basis) ** 3
+    cost = scf
+    if re.search(r'\bopt\b', keywords):
+        cost += scf * (10 + n_atoms)
+    if re.search(r'\bfreq\b', keywords):
+        cost += 3 * n_atoms * float(n_basis) ** 2 * (n_electrons / 2)
+    if 'scrf' in keywords:
+        cost *= SOLVENT_FACTOR
+    return cost
+
+
+def plan_gaussian_jobs(structure_file_paths, gaussian_keywords, other_tasks=None, add_other_tasks=False,
+                       charge_and_multiplicity='0 1', node_cores=128, node_mem_gb=512, min_cores=1):
+    """
+    估算每个结构的计算代价并分配 %nproc/%mem, 再按首次适应递减(FFD)装箱到节点
+
+    参数:
+    structure_file_paths (list[str]): 结构文件
+    gaussian_keywords, other_tasks, add_other_tasks, charge_and_multiplicity: 与 structure_file_to_gjf 相同
+    node_cores (int), node_mem_gb (int): 每个节点的核数和内存
+    min_cores (int): 每个作业的最少核数
+
+    返回:
+    pd.DataFrame: 每个结构一行, 包括 n_atoms/n_electrons/n_basis/cost/nproc/mem_gb/bundle
+    """
+    tasks = [gaussian_keywords] + (list(other_tasks) if add_other_tasks and other_tasks else [])
+    charge = int(charge_and_multiplicity.split()[0])
+    mem_per_core = node_mem_gb / node_cores
+
+    records = []
+    for path in structure_file_paths:
+        numbers = read(path).numbers
+        n_atoms = len(numbers)
+        n_electrons = int(numbers.sum()) - charge
+        # 同一个gjf的所有 link1 步骤使用同样的核数, 按最大的基组分配
+        n_basis = max(count_basis_functions(numbers, parse_basis(task)) for task in tasks)
+        cost = sum(estimate_task_cost(task, n_atoms, n_electrons,
+                                      count_basis_functions(numbers, parse_basis(task))) for task in tasks)
+        nproc = _round_up_power_of_two(max(min_cores, math.ceil(n_basis / BASIS_PER_CORE)), node_cores)
+        mem_gb = max(MIN_MEM_GB_PER_JOB, int(nproc * mem_per_core))
+        records.append({'structure_file': path, 'n_atoms': n_atoms, 'n_electrons': n_electrons, 'n_basis': n_basis,
+                        'cost': cost, 'nproc': nproc, 'mem_gb': mem_gb})
+
+    plan = pd.DataFrame(records, columns=['structure_file', 'n_atoms', 'n_electrons', 'n_basis', 'cost', 'nproc',
+                                          'mem_gb'])
+    plan['bundle'] = _pack_first_fit_decreasing(plan, node_cores, node_mem_gb)
+    return plan
+
+
+def write_gaussian_bundles(plan, script_dir='.', script_prefix='bundle', gaussian_command='g16',
+                           script_header=('#!/bin/bash\n#SBATCH -N 1\n#SBATCH -n 1\n#SBATCH -c {cores}\n'
+                                          '#SBATCH --mem={mem_gb}G\n#SBATCH -J {name}\n'),
+                           **gjf_kwargs):
+    """
+    按 plan 写出gjf(每个作业自己的 %nproc/%mem)和每个节点的批处理脚本
+    同一脚本中的作业在后台并行运行, 最后 wait; 写gjf失败的作业不写入脚本, 也不计入脚本申请的核数和内存
+
+    参数:
+    plan (pd.DataFrame): plan_gaussian_jobs 的返回值
+    script_header (str): 脚本开头, 可用 {cores} {mem_gb} {name} 占位; 默认申请1个任务、{cores} 个核和 {mem_gb}G 内存,
+                         Gaussian是单个多线程进程, 用 -c 而不是 -n 申请核
+    gjf_kwargs: 传给 structure_file_to_gjf 的其余参数
+
+    返回:
+    list[str]: 批处理脚本路径
+    """
+    os.makedirs(script_dir, exist_ok=True)
+    script_paths = []
+    failed = []
+    for bundle, jobs in plan.groupby('bundle', sort=True):
+        lines = []
+        cores, mem_gb = 0, 0
+        for job in jobs.itertuples(index=False):
+            stem = os.path.splitext(job.structure_file)[0]
+            gjf_path = stem + '.gjf'
+            if not structure_file_to_gjf(structure_file_path=job.structure_file, gjf_path=gjf_path,
+                                         chk_path=stem + '.chk', nproc=str(job.nproc), mem=f'{job.mem_gb}GB',
+                                         **gjf_kwargs):
+                failed.append(job.structure_file)
+                continue
+            gjf_path = os.path.abspath(gjf_path)
+            log_path = gjf_path[:-len('.gjf')] + '.log'
+            lines.append(f'{gaussian_command} < {gjf_path} > {log_path} &')
+            cores += job.nproc
+            mem_gb += job.mem_gb
+        if not lines:
+            continue
+
+        name = f'{script_prefix}_{bundle:04d}'
+        header = script_header.format(cores=int(cores), mem_gb=int(mem_gb), name=name)
+        script_path = os.path.join(script_dir, f'{name}.sh')
+        with open(script_path, 'w') as f:
+            f.write(header + '\n' + '\n'.join(lines) + '\nwait\n')
+        script_paths.append(script_path)
+
+    print(f'{len(plan) - len(failed)} 个作业装入 {len(script_paths)} 个节点')
+    if failed:
+        print(f'警告: {len(failed)} 个作业写gjf失败, 未写入脚本: {failed}')
+    return script_paths
+
+
+def _round_up_power_of_two(n, upper):
+    return min(upper, 1 << max(0, math.ceil(math.log2(n))))
+
+
+def _pack_first_fit_decreasing(plan, node_cores, node_mem_gb):
+    # 按代价从大到小, 放进第一个核数和内存都放得下的节点; 代价相近的作业因此落在同一节点, 节点总耗时更均衡
+    bundles = []
+    assignment = pd.Series(-1, index=plan.index)
+    for i in plan.sort_values('cost', ascending=False, kind='stable').index:
+        nproc, mem_gb = plan.at[i, 'nproc'], plan.at[i, 'mem_gb']
+        for b, (free_cores, free_mem) in enumerate(bundles):
+            if nproc <= free_cores and mem_gb <= free_mem:
+                bundles[b] = (free_cores - nproc, free_mem - mem_gb)
+                assignment[i] = b
+                break
+        else:
+            bundles.append((node_cores - nproc, node_mem_gb - mem_gb))
+            assignment[i] = len(bundles) - 1
+    return assignment
+
+
+if __name__ == '__main__':
+    import glob
+
+    gaussian_keywords = '# opt freq b3lyp/6-31g(d,p) em=gd3bj'
+    charge_and_multiplicity = '0 1'
+    add_other_tasks = True
+    other_tasks = [
+        '#p m062x/def2tzvp geom=check',
+        '#p m062x/def2tzvp scrf=solvent=water geom=check',
+    ]
+
+    plan = plan_gaussian_jobs(glob.glob('*.mol'), gaussian_keywords=gaussian_keywords, other_tasks=other_tasks,
+                              add_other_tasks=add_other_tasks, charge_and_multiplicity=charge_and_multiplicity,
+                              node_cores=128, node_mem_gb=512)
+    plan.to_csv('gaussian_plan.csv', index=False)
+    write_gaussian_bundles(plan, script_dir='.', gaussian_keywords=gaussian_keywords,
+                           charge_and_multiplicity=charge_and_multiplicity, add_other_tasks=add_other_tasks,
+                           other_tasks=other_tasks)
@@ -2,31 +2,67 @@ import pubchempy as pcp
 from openbabel import pybel
 from rdkit import Chem
 from rdkit.Chem import AllChem
+from ase import Atoms
 import pandas as pd
+import numpy as np
+import os
+import shutil
+import time
+import warnings
 
+from smiles_index import map_smiles
+from structure_cache import (NO_3D, NO_CID, PUBCHEM_HIT, evict_structure_cache, lookup_structure, store_structure,
+                             structure_cache_key)
+from task_runner import run_tasks
 
-def fetch_3d_from_pubchem(smiles, out_file_path, output_format="mol"):
+
+# PubChem服务地址, 可通过环境变量指向本地替身服务(测试用)
+pcp.API_BASE = os.environ.get('PUBCHEM_API_BASE', pcp.API_BASE)
+
+
+def fetch_pubchem_3d_sdf(smiles):
+    # 返回 (cid, SDF文本); PubChem无此化合物返回 (None, None), 没有3D记录返回 (cid, None), 网络等错误直接抛出
+    # 通过SMILES查询PubChem，获取首个匹配的CID
+    cids = pcp.get_cids(smiles, namespace="smiles")
+    if not cids or not cids[0]:
+        return None, None
+    cid = cids[0]
+
+    # 下载3D Conformer数据（SDF格式）
     try:
-        # 通过SMILES查询PubChem，获取首个匹配的CID
-        compounds = pcp.get_compounds(smiles, namespace="smiles")
-        if not compounds:
-            return None
-        cid = compounds[0].cid
+        return cid, pcp.get(cid, namespace="cid", output="SDF", record_type="3d").decode()
+    except pcp.NotFoundError:
+        return cid, None
+
 
-        # 下载3D Conformer数据（SDF格式）
-        sdf_data = pcp.download("SDF", f"pubchem_3d_{cid}.sdf", cid, record_type="3d", overwrite=True)
+def fetch_3d_mol_from_pubchem(smiles, cache_dir=None, fixture_dir=None, offline=False, cache_key=None):
+    # 给出 cache_dir/fixture_dir 时先查缓存(包括"无3D记录"这类否定结果), offline=True 时缓存未命中也不联网
+    try:
+        use_cache = cache_dir is not None or fixture_dir is not None
+        if use_cache:
+            if cache_key is None:
+                cache_key = structure_cache_key(smiles)[0]
+            cached = lookup_structure(cache_dir, cache_key, PUBCHEM_HIT, fixture_dir=fixture_dir)
+            if cached is not None:
+                meta, sdf_data = cached
+                return pybel.readstring("sdf", sdf_data) if sdf_data is not None else None
+        if offline:
+            return None
 
-        # 转换为目标格式（如mol）
-        mol = next(pybel.readfile("sdf", f"pubchem_3d_{cid}.sdf"))
-        mol.write(output_format, out_file_path)
-        return True
+        cid, sdf_data = fetch_pubchem_3d_sdf(smiles)
+        if cache_dir is not None:
+            status = PUBCHEM_HIT if sdf_data is not None else (NO_CID if cid is None else NO_3D)
+            store_structure(cache_dir, cache_key, PUBCHEM_HIT, {'smiles': smiles, 'cid': cid, 'status': status},
+                            sdf=sdf_data)
+        # 直接在内存中解析
+        return pybel.readstring("sdf", sdf_data) if sdf_data is not None else None
 
     except Exception as e:
         print(f"PubChem下载失败: {e}, SMILES: {smiles}")
-        return False
+        return None
 
 
-def generate_3d_with_openbabel(smiles, out_file_path, output_format="mol"):
+def generate_3d_mol_with_openbabel(smiles):
     try:
         # 将SMILES转换为分子对象
         mol = pybel.readstring("smi", smiles)
@@ -36,17 +72,14 @@ def generate_3d_with_openbabel(smiles, out_file_path, output_format="mol"):
 
         # 局部能量最小化
         mol.localopt(forcefield="mmff94", steps=1000)
-
-        # 保存为指定格式
-        mol.write(output_format, out_file_path)
-        return True
+        return mol
 
     except Exception as e:
         print(f"OpenBabel生成失败: {e}, SMILES: {smiles}")
-        return False
+        return None
 
 
-def generate_3d_with_rdkit(smiles, out_file_path, output_format="mol", rdkit_sdf_name='temp.sdf'):
+def generate_3d_mol_with_rdkit(smiles):
     try:
         # 读取SMILES并解析立体化学
         mol = Chem.MolFromSmiles(smiles)
@@ -63,28 +96,161 @@ def generate_3d_with_rdkit(smiles, out_file_path, output_format="mol", rdkit_sdf
         # 力场优化（UFF或MMFF）
         AllChem.MMFFOptimizeMolecule(mol, mmffVariant="MMFF94s")
 
-        # 保存为SDF（含3D坐标）
-        writer = Chem.SDWriter(rdkit_sdf_name)
-        writer.write(mol)
-        writer.close()
-        mol = next(pybel.readfile("sdf", filename=rdkit_sdf_name))
-        mol.write(output_format, out_file_path)
-        return True
+        # 通过MolBlock字符串交给OpenBabel, 不再写临时SDF
+        return pybel.readstring("mol", Chem.MolToMolBlock(mol))
 
     except Exception as e:
         print(f"RDKit生成失败: {e}, SMILES: {smiles}")
-        return False
+        return None
+
+
+def search_conformers(smiles, n_conformers=50, num_threads=0, rms_threshold=0.5, energy_window=10.0, max_iters=2000):
+    """
+    多构象搜索: 生成 n_conformers 个ETKDGv3构象, 用RDKit多线程MMFF94s优化后按能量窗口和RMSD去重
+
+    参数:
+    n_conformers (int): 初始构象数
+    num_threads (int): 嵌入和力场优化使用的线程数, 0表示使用全部核心
+    rms_threshold (float): RMSD(Angstrom)小于该值的构象视为重复, 保留能量较低的
+    energy_window (float): 只保留能量比最低构象高不超过该值(kcal/mol)的构象
+
+    返回:
+    (Chem.Mol, list): 含保留构象的分子, 以及按能量从低到高排列的 (构象id, 能量)
+    """
+    mol = Chem.AddHs(Chem.MolFromSmiles(smiles))
+
+    params = AllChem.ETKDGv3()
+    params.randomSeed = 42  # 可复现结果
+    params.numThreads = num_threads
+    params.pruneRmsThresh = rms_threshold
+    conf_ids = list(AllChem.EmbedMultipleConfs(mol, numConfs=n_conformers, params=params))
+    if not conf_ids:
+        raise RuntimeError("rdkit构象生成失败")
+
+    results = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=num_threads, maxIters=max_iters,
+                                                 mmffVariant="MMFF94s")
+    energies = np.array([energy for _, energy in results])
+    order = np.argsort(energies)
+    order = order[energies[order] - energies[order[0]] <= energy_window]
+
+    # 优化后构象可能收敛到同一极小点, 再按RMSD去重(从低能量到高能量贪心保留)
+    heavy_mol = Chem.RemoveHs(mol)
+    kept = []
+    for i in order:
+        conf_id = conf_ids[i]
+        if all(AllChem.GetConformerRMS(heavy_mol, conf_id, kept_id) >= rms_threshold for kept_id, _ in kept):
+            kept.append((conf_id, float(energies[i])))
+
+    kept_ids = {conf_id for conf_id, _ in kept}
+    for conf_id in conf_ids:
+        if conf_id not in kept_ids:
+            mol.RemoveConformer(conf_id)
+    return mol, kept
+
+
+def generate_3d_mol_with_rdkit_conformers(smiles, n_conformers=50, num_threads=0, rms_threshold=0.5,
+                                          energy_window=10.0):
+    # 多构象搜索, 返回能量最低的构象
+    try:
+        mol, kept = search_conformers(smiles, n_conformers=n_conformers, num_threads=num_threads,
+                                      rms_threshold=rms_threshold, energy_window=energy_window)
+        return pybel.readstring("mol", Chem.MolToMolBlock(mol, confId=kept[0][0]))
+
+    except Exception as e:
+        print(f"RDKit构象搜索失败: {e}, SMILES: {smiles}")
+        return None
+
+
+def fetch_3d_from_pubchem(smiles, out_file_path, output_format="mol"):
+    return _write_mol(fetch_3d_mol_from_pubchem(smiles), out_file_path, output_format)
+
+
+def generate_3d_with_openbabel(smiles, out_file_path, output_format="mol"):
+    return _write_mol(generate_3d_mol_with_openbabel(smiles), out_file_path, output_format)
+
+
+def generate_3d_with_rdkit(smiles, out_file_path, output_format="mol", rdkit_sdf_name=None):
+    _warn_rdkit_sdf_name(rdkit_sdf_name)
+    return _write_mol(generate_3d_mol_with_rdkit(smiles), out_file_path, output_format)
 
 
-def get_3D_structure_form_smiles(smiles, out_file_path, output_format="mol", rdkit_sdf_name='temp.sdf'):
-    if fetch_3d_from_pubchem(smiles=smiles, out_file_path=out_file_path, output_format=output_format):
-        return True
-    elif generate_3d_with_rdkit(smiles=smiles, out_file_path=out_file_path, output_format=output_format, rdkit_sdf_name=rdkit_sdf_name):
-        return True
-    elif generate_3d_with_openbabel(smiles=smiles, out_file_path=out_file_path, output_format=output_format):
-        return True
+def get_3D_mol_from_smiles(smiles, n_conformers=1, conformer_threads=0, cache_dir=None, fixture_dir=None,
+                           offline=False):
+    """
+    依次尝试 PubChem -> RDKit -> OpenBabel 获取3D结构
+
+    参数:
+    n_conformers (int): 大于1时RDKit一步改为多构象搜索, 取能量最低的构象, 并且先于PubChem进行
+                        (构象搜索针对的柔性长链分子大多有PubChem 3D结构, 否则不会被搜索)
+    cache_dir (str): 结构缓存目录(以InChIKey为键), 缓存PubChem结果(含否定结果)和本地生成的结构
+    fixture_dir (str): 只读的预置缓存目录, 用于测试或离线运行
+    offline (bool): 为True时不访问PubChem
+
+    返回:
+    (pybel.Molecule, str): 结构和方法名, 全部失败返回 (None, None)
+    """
+    use_cache = cache_dir is not None or fixture_dir is not None
+    cache_key = structure_cache_key(smiles)[0] if use_cache else None
+
+    openbabel_method = ('openbabel', generate_3d_mol_with_openbabel)
+    if n_conformers > 1:
+        conformer_method = (f'rdkit_conformers_{n_conformers}', lambda s: generate_3d_mol_with_rdkit_conformers(
+            s, n_conformers=n_conformers, num_threads=conformer_threads))
+        methods = [conformer_method, ('pubchem', None), openbabel_method]
     else:
+        methods = [('pubchem', None), ('rdkit', generate_3d_mol_with_rdkit), openbabel_method]
+
+    for method, generator in methods:
+        if method == 'pubchem':
+            mol = fetch_3d_mol_from_pubchem(smiles, cache_dir=cache_dir, fixture_dir=fixture_dir, offline=offline,
+                                            cache_key=cache_key)
+            if mol is not None:
+                return mol, method
+            continue
+        if use_cache:
+            cached = lookup_structure(cache_dir, cache_key, method, fixture_dir=fixture_dir)
+            if cached is not None and cached[1] is not None:
+                return pybel.readstring("sdf", cached[1]), method
+        mol = generator(smiles)
+        if mol is not None:
+            if cache_dir is not None:
+                store_structure(cache_dir, cache_key, method, {'smiles': smiles, 'status': method},
+                                sdf=mol.write("sdf"))
+            return mol, method
+    return None, None
+
+
+def get_3D_structure_form_smiles(smiles, out_file_path, output_format="mol", rdkit_sdf_name=None, **kwargs):
+    # kwargs 传给 get_3D_mol_from_smiles (n_conformers, cache_dir 等)
+    _warn_rdkit_sdf_name(rdkit_sdf_name)
+    return _generate_3D_structure(smiles=smiles, out_file_path=out_file_path, output_format=output_format,
+                                  **kwargs) is not None
+
+
+def _warn_rdkit_sdf_name(rdkit_sdf_name):
+    # 结构已在内存中转换, 不再写临时sdf文件; 保留参数以兼容旧的调用
+    if rdkit_sdf_name is not None:
+        warnings.warn('rdkit_sdf_name 已不再使用(不再生成临时sdf文件), 将在以后的版本中删除',
+                      DeprecationWarning, stacklevel=3)
+
+
+def _generate_3D_structure(smiles, out_file_path, output_format="mol", **kwargs):
+    mol, method = get_3D_mol_from_smiles(smiles, **kwargs)
+    if mol is None or not _write_mol(mol, out_file_path, output_format):
+        return None
+    return method
+
+
+def _write_mol(mol, out_file_path, output_format):
+    if mol is None:
         return False
+    mol.write(output_format, out_file_path, overwrite=True)
+    return True
+
+
+def mol_to_atoms(mol):
+    # pybel.Molecule 转为 ase.Atoms, 可直接交给 make_gaussian_input 写坐标
+    return Atoms(numbers=[atom.atomicnum for atom in mol.atoms], positions=[atom.coords for atom in mol.atoms])
 
 
 def convert_file_format(in_format, in_path, out_format, out_path):
@@ -93,6 +259,116 @@ def convert_file_format(in_format, in_path, out_format, out_path):
     return None
 
 
+MANIFEST_COLUMNS = ['index', 'smiles', 'canonical_smiles', 'status', 'method', 'seconds', 'out_file', 'error']
+
+
+def batch_get_3D_structure(index_list, smiles_list, out_dir='structure_3D', output_format='mol', max_workers=None,
+                           timeout=300, manifest_path=None, smiles_index_path='smiles_index.csv', n_conformers=1,
+                           conformer_threads=1, cache_dir=None, fixture_dir=None, offline=False,
+                           max_cache_bytes=None):
+    """
+    多进程批量生成3D结构, 支持断点续跑
+
+    结构在内存中转换, 不产生临时文件; 超时由主进程计时(见 task_runner.run_tasks), 超过 timeout 秒的分子
+    所在子进程被kill, 记为 timeout; 子进程崩溃(如RDKit/OpenBabel段错误)只使该分子记为 fail, 不影响其余分子
+    结果逐条追加到清单 manifest_path(csv), 再次运行时跳过清单中已成功且输出文件存在的分子
+    规范SMILES相同的分子只生成一次, 其余直接复制结构文件
+
+    参数:
+    index_list (Sequence): 分子编号, 输出文件为 {out_dir}/{index}.{output_format}
+    smiles_list (Sequence[str]): SMILES
+    max_workers (int): 进程数, 默认为CPU核数
+    n_conformers (int): 大于1时先做多构象搜索(见 get_3D_mol_from_smiles), 每个进程使用 conformer_threads 个线程
+    cache_dir, fixture_dir, offline: 见 get_3D_mol_from_smiles; max_cache_bytes 给出时运行结束后按LRU淘汰缓存
+    timeout (float): 单个分子的超时时间(秒), None表示不限制
+
+    返回:
+    pd.DataFrame: 状态表, 列为 MANIFEST_COLUMNS
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(out_dir, 'status.csv')
+
+    tasks = pd.DataFrame({'index': list(index_list), 'smiles': list(smiles_list)})
+    tasks['canonical_smiles'] = map_smiles(tasks['smiles'], index_path=smiles_index_path)['Canonical SMILES'].to_numpy()
+    tasks['out_file'] = [os.path.join(out_dir, f'{index}.{output_format}') for index in tasks['index']]
+
+    # 断点续跑: 跳过已完成的分子
+    finished = _load_finished(manifest_path)
+    todo = tasks[~tasks['out_file'].isin(finished)]
+    print(f'共 {len(tasks)} 个分子, 已完成 {len(tasks) - len(todo)} 个, 待生成 {len(todo)} 个')
+
+    # 同一分子只计算一次
+    representatives = todo.drop_duplicates('canonical_smiles')
+    duplicates = todo[todo.duplicated('canonical_smiles')]
+
+    rows = list(representatives.itertuples(index=False))
+    generate_kwargs = {'n_conformers': n_conformers, 'conformer_threads': conformer_threads, 'cache_dir': cache_dir,
+                       'fixture_dir': fixture_dir, 'offline': offline}
+    task_args = [(row.index, row.smiles, row.out_file, output_format, generate_kwargs) for row in rows]
+    for i, status, value in run_tasks(_generate_3D_structure_task, task_args, max_workers=max_workers,
+                                      timeout=timeout):
+        row = rows[i]
+        if status == 'ok':
+            record = value
+        else:
+            record = {'index': row.index, 'smiles': row.smiles, 'status': 'timeout' if status == 'timeout' else 'fail',
+                      'method': None, 'seconds': timeout if status == 'timeout' else None, 'out_file': row.out_file,
+                      'error': value}
+        record['canonical_smiles'] = row.canonical_smiles
+        _append_manifest(manifest_path, [record])
+
+        # 复制给规范SMILES相同的其他分子
+        copies = []
+        for dup in duplicates[duplicates['canonical_smiles'] == row.canonical_smiles].itertuples(index=False):
+            if record['status'] == 'success':
+                shutil.copyfile(row.out_file, dup.out_file)
+            copies.append({'index': dup.index, 'smiles': dup.smiles, 'canonical_smiles': dup.canonical_smiles,
+                           'status': record['status'], 'method': f"copy of {row.index}", 'seconds': 0.0,
+                           'out_file': dup.out_file, 'error': record['error']})
+        _append_manifest(manifest_path, copies)
+
+    # 整理清单: 每个分子只保留最后一条记录
+    manifest = pd.read_csv(manifest_path)
+    manifest = manifest.drop_duplicates('out_file', keep='last').sort_values('index', kind='stable')
+    manifest.to_csv(manifest_path, index=False)
+    print(manifest['status'].value_counts())
+
+    if cache_dir is not None and max_cache_bytes is not None:
+        evict_structure_cache(cache_dir, max_cache_bytes)
+    return manifest
+
+
+def _generate_3D_structure_task(index, smiles, out_file_path, output_format, generate_kwargs):
+    # 在子进程中运行, 超时由 run_tasks 在主进程中处理
+    start = time.time()
+    record = {'index': index, 'smiles': smiles, 'status': 'fail', 'method': None, 'out_file': out_file_path,
+              'error': None}
+    try:
+        method = _generate_3D_structure(smiles=smiles, out_file_path=out_file_path, output_format=output_format,
+                                        **generate_kwargs)
+        if method is not None:
+            record['status'], record['method'] = 'success', method
+    except Exception as e:
+        record['error'] = repr(e)
+    record['seconds'] = round(time.time() - start, 3)
+    return record
+
+def _load_finished(manifest_path):
+    if not os.path.exists(manifest_path):
+        return set()
+    manifest = pd.read_csv(manifest_path).drop_duplicates('out_file', keep='last')
+    done = manifest[manifest['status'] == 'success']
+    return {path for path in done['out_file'] if os.path.exists(path)}
+
+
+def _append_manifest(manifest_path, records):
+    if not records:
+        return
+    pd.DataFrame(records, columns=MANIFEST_COLUMNS).to_csv(manifest_path, mode='a', index=False,
+                                                           header=not os.path.exists(manifest_path))
+
+
 if __name__ == '__main__':
     # 示例调用
     run_mode = 'batch'
@@ -104,23 +380,10 @@ if __name__ == '__main__':
     elif run_mode == 'batch':
 
         df = pd.read_excel('merged_critic_data.xlsx')
-        smiles_list = df['SMILES']
-        index_list = df['index']
-        success = []
-        fail = []
-        for index, smiles in zip(index_list, smiles_list):
-            #flag = fetch_3d_from_pubchem(smiles=smiles, out_file_path=f'structure_3D/{index}.mol', output_format='mol')
-            flag = get_3D_structure_form_smiles(smiles=smiles, out_file_path=f'structure_3D/{index}.mol', output_format='mol', rdkit_sdf_name=f'{index}_temp.sdf')
-            if flag:
-                success.append(smiles)
-            else:
-                fail.append(smiles)
-        with open('success.txt', 'w') as f:
-            for i in success:
-                f.write(i + '\n')
-        with open('fail.txt', 'w') as f:
-            for i in fail:
-                f.write(i + '\n')
+        # 状态表写入 structure_3D/status.csv, 中断后重新运行会跳过已完成的分子
+        batch_get_3D_structure(index_list=df['index'], smiles_list=df['SMILES'], out_dir='structure_3D',
+                               output_format='mol', max_workers=None, timeout=300, cache_dir='structure_cache',
+                               max_cache_bytes=2 * 1024 ** 3)
 
     elif run_mode == 'convert':
         in_format='sdf'
@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+import pandas as pd
+
+from get_3D_structure import get_3D_mol_from_smiles, mol_to_atoms
+from make_gaussian_input import atoms_to_gjf
+from task_runner import run_tasks
+
+
+PIPELINE_COLUMNS = ['index', 'smiles', 'status', 'method', 'seconds', 'gjf_path', 'error']
+
+
+def smiles_to_gjf_pipeline(index_list, smiles_list, out_dir='gaussian_input', max_workers=None, queue_size=64,
+                           timeout=300, skip_existing=True, generate_kwargs=None, nproc='12', mem='12GB',
+                           gaussian_keywords='#p opt freq b3lyp/6-31g*', charge_and_multiplicity='0 1',
+                           add_other_tasks=False, other_tasks=None, status_path=None):
+    """
+    SMILES -> 3D结构 -> gjf 的流式流水线, 不写中间 .mol 文件
+
+    子进程生成3D结构并转为 ase.Atoms 返回, 主线程把结果放入有界队列, 写入线程从队列取出直接写gjf;
+    同时在途的生成任务数等于进程数, 队列满时生成端等待, 内存占用有上界
+    超时由主进程计时(见 task_runner.run_tasks), 超时或崩溃的子进程被kill, 该分子记为 timeout / fail;
+    每个分子处理完即追加到状态表, 流水线中途出错时已完成的分子也有记录
+
+    参数:
+    index_list (Sequence): 分子编号, 输出为 {out_dir}/{index}.gjf, chk 为 {index}.chk(相对gjf所在目录)
+    smiles_list (Sequence[str]): SMILES
+    max_workers (int): 生成3D结构的进程数
+    queue_size (int): 生成和写入之间的队列长度
+    timeout (float): 单个分子生成3D结构的超时时间(秒)
+    skip_existing (bool): 跳过gjf已存在的分子
+    generate_kwargs (dict): 传给 get_3D_mol_from_smiles (n_conformers, cache_dir 等)
+    nproc, mem, gaussian_keywords, charge_and_multiplicity, add_other_tasks, other_tasks: 与 structure_file_to_gjf 相同
+    status_path (str): 状态表路径, 默认 {out_dir}/status.csv
+
+    返回:
+    pd.DataFrame: 状态表, 列为 PIPELINE_COLUMNS
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    if status_path is None:
+        status_path = os.path.join(out_dir, 'status.csv')
+    if other_tasks is None:
+        other_tasks = [
+            '#p m062x/def2tzvp geom=check',
+            '#p m062x/def2tzvp scrf=solvent=water geom=check',
+        ]
+    gjf_kwargs = {'nproc': nproc, 'mem': mem, 'gaussian_keywords': gaussian_keywords,
+                  'charge_and_multiplicity': charge_and_multiplicity, 'add_other_tasks': add_other_tasks,
+                  'other_tasks': other_tasks}
+
+    tasks = [(index, smiles, os.path.join(out_dir, f'{index}.gjf')) for index, smiles in zip(index_list, smiles_list)]
+    if skip_existing:
+        tasks = [task for task in tasks if not os.path.exists(task[2])]
+    print(f'待生成 {len(tasks)} 个gjf')
+
+    # 写入线程
+    results = queue.Queue(maxsize=queue_size)
+    records = []
+    writer = threading.Thread(target=_write_gjf_worker, args=(results, records, gjf_kwargs, status_path), daemon=True)
+    writer.start()
+
+    try:
+        task_args = ((index, smiles, gjf_path, generate_kwargs or {}) for index, smiles, gjf_path in tasks)
+        for i, status, value in run_tasks(_generate_atoms_task, task_args, max_workers=max_workers, timeout=timeout):
+            if status == 'ok':
+                results.put(value)
+            else:
+                index, smiles, gjf_path = tasks[i]
+                results.put({'index': index, 'smiles': smiles, 'status': 'timeout' if status == 'timeout' else 'fail',
+                             'method': None, 'seconds': timeout if status == 'timeout' else None,
+                             'gjf_path': gjf_path, 'error': value, 'atoms': None})
+    finally:
+        results.put(None)
+        writer.join()
+
+    status = pd.DataFrame(records, columns=PIPELINE_COLUMNS)
+    print(status['status'].value_counts())
+    return status
+
+
+def _generate_atoms_task(index, smiles, gjf_path, generate_kwargs):
+    # 在子进程中运行, 超时由 run_tasks 在主进程中处理; pybel.Molecule 不能跨进程传递, 转为 ase.Atoms 返回
+    start = time.time()
+    record = {'index': index, 'smiles': smiles, 'status': 'fail', 'method': None, 'gjf_path': gjf_path,
+              'error': None, 'atoms': None}
+    try:
+        mol, method = get_3D_mol_from_smiles(smiles, **generate_kwargs)
+        if mol is not None:
+            record['atoms'], record['method'] = mol_to_atoms(mol), method
+    except Exception as e:
+        record['error'] = repr(e)
+    record['seconds'] = round(time.time() - start, 3)
+    return record
+
+
+def _write_gjf_worker(results, records, gjf_kwargs, status_path):
+    while True:
+        record = results.get()
+        if record is None:
+            break
+        atoms = record.pop('atoms')
+        if atoms is not None:
+            try:
+                atoms_to_gjf(atoms=atoms, gjf_path=record['gjf_path'], chk_path=f"{record['index']}.chk",
+                             note=record['index'], **gjf_kwargs)
+                record['status'] = 'success'
+            except Exception as e:
+                record['error'] = repr(e)
+        records.append(record)
+        pd.DataFrame([record], columns=PIPELINE_COLUMNS).to_csv(status_path, mode='a', index=False,
+                                                                header=not os.path.exists(status_path))
+
+
+if __name__ == '__main__':
+
+    df = pd.read_excel('merged_critic_data.xlsx')
+    smiles_to_gjf_pipeline(index_list=df['index'], smiles_list=df['SMILES'], out_dir='gaussian_input',
+                           max_workers=None, queue_size=64, timeout=300,
+                           generate_kwargs={'cache_dir': 'structure_cache'},
+                           nproc='128', mem='512GB', gaussian_keywords='# opt freq b3lyp/6-31g(d,p) em=gd3bj',
+                           charge_and_multiplicity='0 1', add_other_tasks=True,
+                           other_tasks=['#p m062x/def2tzvp geom=check',
+                                        '#p m062x/def2tzvp scrf=solvent=water geom=check'])
@@ -1,7 +1,14 @@
 import ase
 from ase.io import read, write
+import numpy as np
 import os
+import re
 import glob
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from dataset_cache import atomic_write
+from gaussian_log import RESTART_SUFFIX, job_progress, read_final_geometry, read_gjf_steps, restart_gjf_paths
 
 
 def structure_file_to_gjf(structure_file_path, gjf_path=None, nproc='12', mem='12GB', chk_path=None,
@@ -31,61 +38,147 @@ def structure_file_to_gjf(structure_file_path, gjf_path=None, nproc='12', mem='1
         ]
 
     try:
-        if os.path.exists(gjf_path):
-            os.remove(gjf_path)
-        write_gjf_link0_and_keyword(gjf_path=gjf_path, chk_path=chk_path, nproc=nproc, mem=mem,
-                                         gaussian_keywords=gaussian_keywords,
-                                         charge_and_multiplicity=charge_and_multiplicity, note=structure_file_name)
-        write_gjf_coord(gjf_path=gjf_path, structure_file_path=structure_file_path)
-        if add_other_tasks:
-            for task_index, task in enumerate(other_tasks):
-                i_chk_path = chk_path.split('.')[0] + f'_{task_index + 1}' + '.chk'
-                write_gjf_link0_and_keyword(gjf_path=gjf_path, chk_path=i_chk_path, nproc=nproc, mem=mem,
-                                                 gaussian_keywords=task, charge_and_multiplicity=charge_and_multiplicity,
-                                                 note=structure_file_name, old_chk_path=chk_path, add_link1=True)
-                write_gjf_blank_line(gjf_path=gjf_path, blank_line_number=2)
+        atoms = read(structure_file_path)
+        atoms_to_gjf(atoms=atoms, gjf_path=gjf_path, chk_path=chk_path, nproc=nproc, mem=mem,
+                     gaussian_keywords=gaussian_keywords, charge_and_multiplicity=charge_and_multiplicity,
+                     note=structure_file_name, add_other_tasks=add_other_tasks, other_tasks=other_tasks)
         return True
     except:
         print(f'Error! There is something wrong when converting {structure_file_path} to gjf file, please check it.')
         return False
 
 
-def write_gjf_link0_and_keyword(gjf_path, chk_path, nproc, mem, gaussian_keywords, charge_and_multiplicity, note,
-                                old_chk_path=None, add_link1=False):
-    with open(gjf_path, 'a') as gjf:
-        if add_link1:
-            gjf.write('--link1--' + '\n')
-        gjf.write(f'%nproc={nproc}' + '\n')
-        gjf.write(f'%mem={mem}' + '\n')
-        if old_chk_path is not None:
-            gjf.write(f'%oldchk={old_chk_path}' + '\n')
-        gjf.write(f'%chk={chk_path}' + '\n')
-        gjf.write(f'{gaussian_keywords}' + '\n')
-        gjf.write('\n')
-        gjf.write(f'{note}' + '\n')
-        gjf.write('\n')
-        gjf.write(f'{charge_and_multiplicity}' + '\n')
-        gjf.close()
-    return None
-
-
-def write_gjf_coord(gjf_path, structure_file_path):
-    atoms = read(structure_file_path)
-    pos = atoms.positions
-    # number = atoms.numbers
-    chemical_symbols = atoms.get_chemical_symbols()
-    with open(gjf_path, 'a') as gjf:
-        for chemical_symbols, xyz in zip(chemical_symbols, pos):
-            x, y, z = xyz[0], xyz[1], xyz[2]
-            gjf.write(f'{chemical_symbols} {x} {y} {z}' + '\n')
-        gjf.write('\n\n')
+def atoms_to_gjf(atoms, gjf_path, chk_path, nproc, mem, gaussian_keywords, charge_and_multiplicity, note,
+                 add_other_tasks=False, other_tasks=None):
+    # 整个gjf(包括 --link1-- 任务)在内存中拼好, 一次性原子写入
+    text = build_gjf_text(atoms=atoms, chk_path=chk_path, nproc=nproc, mem=mem, gaussian_keywords=gaussian_keywords,
+                          charge_and_multiplicity=charge_and_multiplicity, note=note,
+                          other_tasks=other_tasks if add_other_tasks else None)
+    atomic_write(gjf_path, lambda tmp_path: _write_text(tmp_path, text))
     return None
 
 
-def write_gjf_blank_line(gjf_path, blank_line_number=1):
-    with open(gjf_path, 'a') as gjf:
-        gjf.write('\n' * blank_line_number)
-    return None
+def build_gjf_text(atoms, chk_path, nproc, mem, gaussian_keywords, charge_and_multiplicity, note, other_tasks=None):
+    parts = [gjf_link0_and_keyword_text(chk_path=chk_path, nproc=nproc, mem=mem, gaussian_keywords=gaussian_keywords,
+                                        charge_and_multiplicity=charge_and_multiplicity, note=note),
+             gjf_coord_text(atoms), '\n\n']
+    for task_index, task in enumerate(other_tasks or []):
+        i_chk_path = chk_path.split('.')[0] + f'_{task_index + 1}' + '.chk'
+        parts.append(gjf_link0_and_keyword_text(chk_path=i_chk_path, nproc=nproc, mem=mem, gaussian_keywords=task,
+                                                charge_and_multiplicity=charge_and_multiplicity, note=note,
+                                                old_chk_path=chk_path, add_link1=True))
+        parts.append('\n' * 2)
+    return ''.join(parts)
+
+
+def gjf_link0_and_keyword_text(chk_path, nproc, mem, gaussian_keywords, charge_and_multiplicity, note,
+                               old_chk_path=None, add_link1=False):
+    lines = []
+    if add_link1:
+        lines.append('--link1--')
+    lines.append(f'%nproc={nproc}')
+    lines.append(f'%mem={mem}')
+    if old_chk_path is not None:
+        lines.append(f'%oldchk={old_chk_path}')
+    lines += [f'%chk={chk_path}', f'{gaussian_keywords}', '', f'{note}', '', f'{charge_and_multiplicity}']
+    return '\n'.join(lines) + '\n'
+
+
+def gjf_coord_text(atoms):
+    # 元素符号和坐标放进一个 object 数组, 用一次 format 完成所有原子的格式化
+    n_atoms = len(atoms)
+    table = np.empty((n_atoms, 4), dtype=object)
+    table[:, 0] = atoms.get_chemical_symbols()
+    table[:, 1:] = atoms.positions.tolist()
+    return ('{} {} {} {}\n' * n_atoms).format(*table.ravel())
+
+
+def batch_structure_files_to_gjf(structure_file_paths, max_workers=None, chunksize=16, **kwargs):
+    """
+    用进程池批量把结构文件转换为gjf
+
+    参数:
+    structure_file_paths (list[str]): 结构文件路径
+    max_workers (int): 进程数, 默认CPU核数
+    chunksize (int): 每次分发给子进程的文件数, 文件很多时减少进程间通信
+    kwargs: 传给 structure_file_to_gjf 的参数(gjf_path/chk_path 除外, 按结构文件名生成)
+
+    返回:
+    list[str]: 转换失败的结构文件
+    """
+    structure_file_paths = list(structure_file_paths)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(partial(structure_file_to_gjf, **kwargs), structure_file_paths, chunksize=chunksize)
+        failed = [path for path, success in zip(structure_file_paths, results) if not success]
+    print(f'共 {len(structure_file_paths)} 个结构文件, 失败 {len(failed)} 个')
+    return failed
+
+
+def restart_gjf(gjf_path):
+    """
+    根据已有的log生成续算文件 {gjf名}_restart{n}.gjf, 只包含未完成的步骤
+
+    已完成的步骤不重算: 后续步骤照原样保留 %oldchk, 直接读取第一步的chk;
+    第一步未完成时从log中最后的几何结构重新开始, 如果 opt 已正常结束只剩 freq, 则去掉 opt 只做 freq
+
+    返回:
+    str: 续算文件路径, 全部步骤已完成时返回 None
+    """
+    progress = job_progress(gjf_path)
+    if progress['status'] == 'done':
+        return None
+
+    steps = read_gjf_steps(gjf_path)
+    remaining = [step['text'] for step in steps[progress['finished_steps']:]]
+    if progress['finished_steps'] == 0:
+        remaining[0] = _restart_first_step(steps[0], progress)
+
+    # 上一个续算文件还没有运行时直接覆盖, 不再新建
+    restart_paths = restart_gjf_paths(gjf_path)
+    if restart_paths and not os.path.exists(restart_paths[-1][:-len('.gjf')] + '.log'):
+        restart_path = restart_paths[-1]
+    else:
+        restart_path = f'{gjf_path[:-len(".gjf")]}{RESTART_SUFFIX}{len(restart_paths) + 1}.gjf'
+    text = '--link1--\n'.join(remaining)
+    atomic_write(restart_path, lambda tmp_path: _write_text(tmp_path, text))
+    return restart_path
+
+
+def restart_unfinished_jobs(gjf_paths):
+    restart_paths = []
+    for gjf_path in gjf_paths:
+        if RESTART_SUFFIX in os.path.basename(gjf_path):
+            continue
+        restart_path = restart_gjf(gjf_path)
+        if restart_path is not None:
+            restart_paths.append(restart_path)
+    print(f'共 {len(gjf_paths)} 个gjf, 需要续算 {len(restart_paths)} 个')
+    return restart_paths
+
+
+def _restart_first_step(step, progress):
+    lines = step['text'].split('\n')
+    if progress['partial_terminations'] > 0:
+        # opt 已完成, 只剩 freq
+        route = re.sub(r'\bopt(=\S+|\([^)]*\))?\s*', '', step['route'], flags=re.IGNORECASE)
+        route_start = next(i for i, line in enumerate(lines) if line.startswith('#'))
+        route_end = lines.index('', route_start)
+        lines[route_start:route_end] = [route]
+
+    atoms = read_final_geometry(progress['last_log']) if progress['last_log'] is not None else None
+    if atoms is not None:
+        # 路由行、标题之后是电荷和自旋多重度, 接着是坐标, 到空行结束
+        route_start = next(i for i, line in enumerate(lines) if line.startswith('#'))
+        title_end = lines.index('', lines.index('', route_start) + 1)
+        coord_start = title_end + 2
+        coord_end = lines.index('', coord_start)
+        lines[coord_start:coord_end] = gjf_coord_text(atoms).rstrip('\n').split('\n')
+    return '\n'.join(lines)
+
+
+def _write_text(path, text):
+    with open(path, 'w') as gjf:
+        gjf.write(text)
 
 
 if __name__ == '__main__':
@@ -116,9 +209,12 @@ if __name__ == '__main__':
         # structure_file_name_list = [f'{str(i).zfill(2)}.mol' for i in range(1, 44)]
         structure_file_name_list = glob.glob('*.mol')
         print(structure_file_name_list)
-        for i in structure_file_name_list:
-            structure_file_to_gjf(structure_file_path=i, gjf_path=None, nproc=nproc, mem=mem,
-                                  chk_path=chk_path, gaussian_keywords=gaussian_keywords,
-                                  charge_and_multiplicity=charge_and_multiplicity, add_other_tasks=add_other_tasks,
-                                  other_tasks=other_tasks)
+        batch_structure_files_to_gjf(structure_file_name_list, max_workers=None, nproc=nproc, mem=mem,
+                                     chk_path=chk_path, gaussian_keywords=gaussian_keywords,
+                                     charge_and_multiplicity=charge_and_multiplicity, add_other_tasks=add_other_tasks,
+                                     other_tasks=other_tasks)
+
+    elif mode == 'restart':
 
+        # 根据log只为未完成的步骤生成续算文件
+        restart_unfinished_jobs(glob.glob('*.gjf'))
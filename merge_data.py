@@ -1,26 +1,54 @@
 import pandas as pd
 import numpy as np
 import os
-from collections import defaultdict
 from typing import List
 
+from dataset_cache import excel_sheet_names, read_excel_cached
+from smiles_index import canonicalize_smiles_column
 
-def merge_thermo_databases(input_sources, output_file="merged_thermo_database.xlsx"):
+
+def merge_thermo_databases(input_sources, output_file="merged_thermo_database.xlsx", conflict_strategy=None,
+                           source_priority=None, source_uncertainty=None, smiles_index_path=None):
     # 步骤1: 解析输入源并读取数据
+    dfs = read_input_sources(input_sources)
+
+    # 步骤2: 合并所有数据
+    combined_df = pd.concat(dfs, ignore_index=True)
+
+    # 检查必要列是否存在
+    if 'SMILES' not in combined_df.columns:
+        raise ValueError("所有数据源必须包含'SMILE'列")
+
+    # 用规范SMILES作为化合物的键, 避免同一分子的不同写法(如 CCO 与 OCC)被当成不同化合物
+    if smiles_index_path is not None:
+        combined_df = canonicalize_smiles_column(combined_df, index_path=smiles_index_path)
+    print(combined_df)
+
+    # 步骤3-6: 按SMILES分组合并（一次groupby完成，不再逐行重建结果）
+    merged_df = merge_combined_df(combined_df, conflict_strategy=conflict_strategy, source_priority=source_priority,
+                                  source_uncertainty=source_uncertainty)
+
+    # 步骤7: 保存结果（只写一次）
+    merged_df.to_excel(output_file, index=False)
+    print(f"成功合并数据库! 共处理 {len(dfs)} 个数据表, 得到 {len(merged_df)} 个唯一化合物。")
+    print(f"结果已保存至: {output_file}")
+
+    return merged_df
+
+
+def read_input_sources(input_sources):
     dfs = []
     for source in input_sources:
         # 处理不同类型的输入源
         if isinstance(source, str):
             # 单个文件路径 - 读取所有工作表
             file_path = source
-            xl = pd.ExcelFile(file_path)
-            sheet_names = xl.sheet_names
+            sheet_names = excel_sheet_names(file_path)
             for sheet_name in sheet_names:
-                df = xl.parse(sheet_name)
+                df = read_excel_cached(file_path, sheet_name=sheet_name)
                 source_name = f"{os.path.splitext(os.path.basename(file_path))[0]}_{sheet_name}"
                 df['Source'] = source_name
                 dfs.append(df)
-            xl.close()
 
         elif isinstance(source, tuple) and len(source) == 2:
             # 元组格式: (文件路径, 工作表规范)
@@ -34,157 +62,308 @@ def merge_thermo_databases(input_sources, output_file="merged_thermo_database.xl
             else:
                 raise ValueError(f"无效的工作表规范类型: {type(sheet_spec)}")
 
-            xl = pd.ExcelFile(file_path)
-            available_sheets = xl.sheet_names
+            available_sheets = excel_sheet_names(file_path)
 
             for sheet_name in sheet_names:
                 if sheet_name not in available_sheets:
                     print(f"警告: 工作表 '{sheet_name}' 在文件 '{file_path}' 中不存在，跳过")
                     continue
 
-                df = xl.parse(sheet_name)
+                df = read_excel_cached(file_path, sheet_name=sheet_name)
                 source_name = f"{os.path.splitext(os.path.basename(file_path))[0]}_{sheet_name}"
                 df['Source'] = source_name
                 dfs.append(df)
-            xl.close()
         else:
             raise ValueError("无效的输入源格式。应为文件路径字符串或(文件路径, 工作表)元组")
 
-    # 步骤2: 合并所有数据
-    combined_df = pd.concat(dfs, ignore_index=True)
-
-    # 检查必要列是否存在
-    if 'SMILES' not in combined_df.columns:
-        raise ValueError("所有数据源必须包含'SMILE'列")
-    print(combined_df)
-
-    # 步骤3: 创建数据收集字典
-    data_collection = defaultdict(lambda: {
-        'names': set(),
-        'sources': set(),
-        'properties': defaultdict(list),
-        'source_data': defaultdict(dict)
+    return dfs
+
+
+NAME_COLUMNS = ['Compound Name', 'Name', 'name']
+NON_PROPERTY_COLUMNS = ['SMILES', 'InChIKey', 'Compound Name', 'Name', 'Source']
+AVERAGED_PROPERTY_PREFIXES = ('critical', 'temperature', 'pressure', 'acentric', 'factor')
+CORE_COLUMNS = ['SMILES', 'InChIKey', 'Compound Names', 'Sources', 'Source Count']
+# 没有SMILES的行(如 note 工作表)分组时使用的键, 结果中还原为空值
+MISSING_SMILES_KEY = '<missing SMILES>'
+
+
+def merge_combined_df(combined_df, conflict_strategy=None, source_priority=None, source_uncertainty=None):
+    # 与原实现一样, 没有SMILES的行合并为一个SMILES为空的条目; 化合物保持首次出现的顺序
+    combined_df = combined_df.assign(SMILES=combined_df['SMILES'].fillna(MISSING_SMILES_KEY)).reset_index(drop=True)
+    smiles_order = pd.unique(combined_df['SMILES'])
+
+    # 化合物名称: 每行按 'Compound Name' > 'Name' > 'name' 的优先级取第一个非空值
+    name_columns = [col for col in NAME_COLUMNS if col in combined_df.columns]
+    if name_columns:
+        row_names = combined_df[name_columns].bfill(axis=1).iloc[:, 0]
+        names_df = pd.DataFrame({'SMILES': combined_df['SMILES'], 'name': row_names}).dropna()
+        names_df['name'] = names_df['name'].astype(str)
+        compound_names = _join_unique_sorted(names_df, key='SMILES', value='name', sep='; ')
+    else:
+        compound_names = pd.Series(dtype=object)
+
+    # 来源
+    sources = _join_unique_sorted(combined_df[['SMILES', 'Source']], key='SMILES', value='Source', sep=', ')
+    source_count = combined_df.groupby('SMILES', sort=False)['Source'].nunique()
+
+    core_df = pd.DataFrame(index=pd.Index(smiles_order, name='SMILES'))
+    if 'InChIKey' in combined_df.columns:
+        core_df['InChIKey'] = combined_df.groupby('SMILES', sort=False)['InChIKey'].first().reindex(core_df.index)
+    core_df['Compound Names'] = compound_names.reindex(core_df.index)
+    core_df['Sources'] = sources.reindex(core_df.index)
+    core_df['Source Count'] = source_count.reindex(core_df.index)
+
+    # 属性: 宽表转长表, 每个 (SMILES, 属性) 为一组
+    long_df = melt_properties(combined_df)
+    resolved_df = resolve_properties(long_df, conflict_strategy=conflict_strategy, source_priority=source_priority,
+                                     source_uncertainty=source_uncertainty)
+    merged_df = core_df.join(resolved_df, how='left').reset_index()
+    merged_df['SMILES'] = merged_df['SMILES'].replace(MISSING_SMILES_KEY, np.nan)
+
+    return order_merged_columns(merged_df)
+
+
+def melt_properties(combined_df):
+    property_columns = [col for col in combined_df.columns if col not in NON_PROPERTY_COLUMNS]
+    combined_df = combined_df.copy()
+    combined_df['_row'] = np.arange(len(combined_df))
+    long_df = combined_df.melt(id_vars=['SMILES', 'Source', '_row'], value_vars=property_columns,
+                               var_name='Property', value_name='Value')
+    long_df = long_df[long_df['Value'].notna()]
+    # 组内按原始行顺序排列
+    long_df = long_df.sort_values(['Property', '_row'], kind='stable').reset_index(drop=True)
+    return long_df
+
+
+def resolve_properties(long_df, conflict_strategy=None, source_priority=None, source_uncertainty=None):
+    if long_df.empty:
+        return pd.DataFrame()
+
+    keys = ['SMILES', 'Property']
+    grouped = long_df.groupby(keys, sort=False)['Value']
+    stats = pd.DataFrame({
+        'n': grouped.size(),
+        'n_unique': grouped.nunique(),
+        'first': grouped.first(),
     })
 
-    # 步骤4: 按SMILES分组收集数据
-    property_columns = set()
-    for _, row in combined_df.iterrows():  # 遍历合并后的DataFrame中的每一行
-        smiles = row['SMILES']
-        record = data_collection[smiles]
-
-        # 收集化合物名称
-        if 'Compound Name' in row and pd.notna(row['Compound Name']):
-            record['names'].add(str(row['Compound Name']))
-        elif 'Name' in row and pd.notna(row['Name']):
-            record['names'].add(str(row['Name']))
-        elif 'name' in row and pd.notna(row['name']):
-            record['names'].add(str(row['name']))
-
-        # 记录来源
-        source = row['Source']
-        record['sources'].add(source)
-
-        # 收集所有属性
-        for col in row.index:  # 遍历当前行的所有列  # row.index返回了这一行的所有列的名字
-            if col in ['SMILES', 'Compound Name', 'Name', 'Source']:
-                continue
-
-            if pd.notna(row[col]):
-                property_columns.add(col)
-                # 记录属性值
-                record['properties'][col].append(row[col])
-                # 记录来源特定数据
-                record['source_data'][col][source] = row[col]
-
-        # 步骤5: 创建合并后的数据结构
-        merged_data = []
-
-        for smiles, record in data_collection.items():
-            # 创建新行
-            new_row = {
-                'SMILES': smiles,
-                'Compound Names': '; '.join(sorted(record['names'])) if record['names'] else np.nan,
-                'Sources': ', '.join(sorted(record['sources'])),
-                'Source Count': len(record['sources'])
-            }
-
-            # 添加属性值（使用智能策略）
-            for prop in property_columns:
-                if prop not in record['properties']:
-                    # 该属性在此化合物中不存在
-                    continue
-
-                values = record['properties'][prop]
-                source_data = record['source_data'][prop]
-
-                # 冲突解决策略
-                if len(values) == 0:
-                    # 无数据
-                    new_row[prop] = np.nan
-                    new_row[f'{prop}_Sources'] = np.nan
-
-                elif len(values) == 1:
-                    # 单一来源
-                    new_row[prop] = values[0]
-                    new_row[f'{prop}_Sources'] = list(source_data.keys())[0]
-
-                else:
-                    # 多来源 - 智能处理
-                    unique_vals = set(values)
-
-                    if len(unique_vals) == 1:
-                        # 所有来源值相同
-                        new_row[prop] = values[0]
-                        new_row[f'{prop}_Sources'] = '; '.join(source_data.keys())
-                    else:
-                        # 值不同 - 根据属性类型处理
-                        if prop.lower().startswith(('critical', 'temperature', 'pressure', 'acentric', 'factor')):
-                            # 数值属性：计算平均值
-                            try:
-                                num_vals = [float(v) for v in values]
-                                new_row[prop] = np.mean(num_vals)
-                                new_row[f'{prop}_Conflicts'] = f"{len(values)} values (avg: {new_row[prop]:.4f})"
-                            except:
-                                # 如果转换失败，取第一个值
-                                new_row[prop] = values[0]
-                                new_row[f'{prop}_Conflicts'] = f"{len(values)} values (first used)"
-                        else:
-                            # 非数值属性：取第一个值
-                            new_row[prop] = values[0]
-                            new_row[f'{prop}_Conflicts'] = f"{len(values)} values (first used)"
-
-                        # 记录来源详细数据
-                        source_details = [f"{src}: {val}" for src, val in source_data.items()]
-                        new_row[f'{prop}_Sources'] = '; '.join(source_details)
-
-            merged_data.append(new_row)
-
-        # 步骤6: 创建最终DataFrame
-        merged_df = pd.DataFrame(merged_data)
-
-        # 排序列：核心列 + 属性列 + 来源列 + 冲突列
-        core_columns = ['SMILES', 'Compound Names', 'Sources', 'Source Count']
-        prop_columns = sorted([col for col in merged_df.columns if
-                               col not in core_columns and not col.endswith(('_Sources', '_Conflicts'))])
-
-        # 组织列顺序
-        ordered_columns = core_columns.copy()
-        for prop in prop_columns:
-            ordered_columns.append(prop)
-            if f'{prop}_Conflicts' in merged_df.columns:
-                ordered_columns.append(f'{prop}_Conflicts')
-            ordered_columns.append(f'{prop}_Sources')
-
-        # 确保只包含实际存在的列
-        final_columns = [col for col in ordered_columns if col in merged_df.columns]
-        merged_df = merged_df[final_columns]
-
-        # 步骤7: 保存结果
-        merged_df.to_excel(output_file, index=False)
-        print(f"成功合并数据库! 共处理 {len(dfs)} 个数据表, 得到 {len(merged_df)} 个唯一化合物。")
-        print(f"结果已保存至: {output_file}")
-
-    return merged_df
+    # 只有所有值都能转为数字时才按数值策略处理
+    numeric = pd.to_numeric(long_df['Value'], errors='coerce')
+    stats['all_numeric'] = numeric.notna().groupby([long_df['SMILES'], long_df['Property']], sort=False).all()
+
+    # 来源明细: 同一来源多次出现时保留最后一个值, 按来源首次出现的顺序排列
+    source_df = long_df.copy()
+    source_df['_first_row'] = source_df.groupby(keys + ['Source'], sort=False)['_row'].transform('min')
+    source_df = source_df.drop_duplicates(keys + ['Source'], keep='last').sort_values(
+        ['Property', '_first_row'], kind='stable')
+    source_df['detail'] = source_df['Source'].astype(str) + ': ' + source_df['Value'].astype(str)
+    source_grouped = source_df.groupby(keys, sort=False)
+    stats['source_names'] = source_grouped['Source'].agg('; '.join)
+    stats['source_details'] = source_grouped['detail'].agg('; '.join)
+
+    # 冲突解决: 非数值属性取第一个值, 数值属性按列选择策略, 每个属性整列向量化计算
+    conflict = (stats['n'] > 1) & (stats['n_unique'] > 1)
+    numeric_conflict = conflict & stats['all_numeric']
+    stats['value'] = stats['first']
+    stats['strategy'] = 'first'
+    stats['spread'] = np.nan
+
+    conflict_rows = long_df.join(numeric_conflict.rename('_numeric_conflict'), on=keys)['_numeric_conflict']
+    for prop, prop_df in long_df[conflict_rows.to_numpy()].groupby('Property', sort=False):
+        strategy = get_conflict_strategy(prop, conflict_strategy)
+        codes = prop_df.groupby('SMILES', sort=False).ngroup().to_numpy()
+        n_groups = codes.max() + 1
+        values = numeric[prop_df.index].to_numpy(dtype=float)
+        sources = prop_df['Source'].to_numpy()
+
+        resolved = CONFLICT_STRATEGIES[strategy](values, codes, n_groups, sources,
+                                                 source_priority=source_priority,
+                                                 source_uncertainty=source_uncertainty)
+        index = pd.MultiIndex.from_arrays([pd.unique(prop_df['SMILES']), [prop] * n_groups], names=keys)
+        stats.loc[index, 'value'] = resolved
+        stats.loc[index, 'strategy'] = strategy
+        stats.loc[index, 'spread'] = group_relative_spread(values, codes, n_groups)
+
+    stats['sources'] = stats['source_names'].where(~conflict, stats['source_details'])
+    stats['conflicts'] = pd.Series(np.nan, index=stats.index, dtype=object)
+    stats.loc[conflict, 'conflicts'] = [_describe_conflict(n, strategy, value) for n, strategy, value in
+                                        zip(stats.loc[conflict, 'n'], stats.loc[conflict, 'strategy'],
+                                            stats.loc[conflict, 'value'])]
+
+    return pivot_resolved(stats, has_conflicts=conflict.groupby(level='Property', sort=False).any(),
+                          has_spread=numeric_conflict.groupby(level='Property', sort=False).any())
+
+
+def get_conflict_strategy(prop, conflict_strategy=None):
+    # conflict_strategy 可以是策略名（所有数值列共用）或 {列名: 策略名} 字典
+    if isinstance(conflict_strategy, str):
+        strategy = conflict_strategy
+    elif isinstance(conflict_strategy, dict) and prop in conflict_strategy:
+        strategy = conflict_strategy[prop]
+    elif prop.lower().startswith(AVERAGED_PROPERTY_PREFIXES):
+        strategy = 'mean'
+    else:
+        strategy = 'first'
+
+    if strategy not in CONFLICT_STRATEGIES:
+        raise ValueError(f"未知的冲突解决策略: {strategy}, 可选: {list(CONFLICT_STRATEGIES)}")
+    return strategy
+
+
+def uses_cross_compound_strategy(conflict_strategy=None):
+    # 是否有属性使用 CROSS_COMPOUND_STRATEGIES 中的策略(合并值依赖其他化合物, 不能只重新合并部分化合物)
+    if isinstance(conflict_strategy, str):
+        strategies = [conflict_strategy]
+    elif isinstance(conflict_strategy, dict):
+        strategies = conflict_strategy.values()
+    else:
+        strategies = []
+    return any(strategy in CROSS_COMPOUND_STRATEGIES for strategy in strategies)
+
+
+def _describe_conflict(n, strategy, value):
+    if strategy == 'first':
+        return f"{n} values (first used)"
+    elif strategy == 'mean':
+        return f"{n} values (avg: {value:.4f})"
+    else:
+        return f"{n} values ({strategy}: {value:.4f})"
+
+
+# ---------- 冲突解决策略 ----------
+# 每个策略接收同一属性所有冲突化合物的数值 values、组编号 codes（0..n_groups-1）及对应来源 sources,
+# 返回每个组（化合物）的合并值
+
+def resolve_first(values, codes, n_groups, sources, **options):
+    return values[_group_starts_in_order(np.argsort(codes, kind='stable'), codes, n_groups)]
+
+
+def resolve_mean(values, codes, n_groups, sources, **options):
+    counts = np.bincount(codes, minlength=n_groups)
+    return np.bincount(codes, weights=values, minlength=n_groups) / counts
+
+
+def resolve_median(values, codes, n_groups, sources, **options):
+    return group_median(values, codes, n_groups)
+
+
+def resolve_source_priority(values, codes, n_groups, sources, source_priority=None, **options):
+    # 按 source_priority 中的先后顺序取值, 不在列表中的来源优先级最低
+    if not source_priority:
+        raise ValueError("source_priority 策略需要提供 source_priority 来源列表")
+    ranks = pd.Series(sources).map({source: i for i, source in enumerate(source_priority)})
+    ranks = ranks.fillna(len(source_priority)).to_numpy()
+    order = np.lexsort((np.arange(len(values)), ranks, codes))
+    return values[_group_starts_in_order(order, codes, n_groups)]
+
+
+def resolve_inverse_variance(values, codes, n_groups, sources, source_uncertainty=None, **options):
+    # 以 1/sigma^2 为权重加权平均; 未给出不确定度的来源, 用其相对各化合物中位数的偏差估计方差
+    median = group_median(values, codes, n_groups)
+    squared_residual = (values - median[codes]) ** 2
+    residual_df = pd.DataFrame({'source': sources, 'squared_residual': squared_residual})
+    source_variance = residual_df.groupby('source')['squared_residual'].mean()
+    pooled_variance = squared_residual.mean()
+
+    variance = pd.Series(sources).map(source_variance).to_numpy(dtype=float)
+    if source_uncertainty:
+        sigma = pd.Series(sources).map(source_uncertainty).to_numpy(dtype=float)
+        variance = np.where(np.isnan(sigma), variance, sigma ** 2)
+    if pooled_variance > 0:
+        variance = np.maximum(variance, pooled_variance * 1e-2)
+    else:
+        variance = np.ones_like(values)
+
+    weights = 1.0 / variance
+    return (np.bincount(codes, weights=weights * values, minlength=n_groups) /
+            np.bincount(codes, weights=weights, minlength=n_groups))
+
+
+def resolve_trimmed_mean(values, codes, n_groups, sources, outlier_threshold=3.0, **options):
+    # 剔除偏离中位数超过 outlier_threshold 倍 MAD 的值后再取平均
+    median = group_median(values, codes, n_groups)
+    deviation = np.abs(values - median[codes])
+    scale = np.maximum(1.4826 * group_median(deviation, codes, n_groups), np.abs(median) * 1e-3)
+    keep = deviation <= outlier_threshold * scale[codes]
+    counts = np.bincount(codes, weights=keep, minlength=n_groups)
+    sums = np.bincount(codes, weights=values * keep, minlength=n_groups)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), median)
+
+
+CONFLICT_STRATEGIES = {
+    'first': resolve_first,
+    'mean': resolve_mean,
+    'median': resolve_median,
+    'source_priority': resolve_source_priority,
+    'inverse_variance': resolve_inverse_variance,
+    'trimmed_mean': resolve_trimmed_mean,
+}
+# 各来源的方差在该属性所有冲突化合物上估计, 一个化合物的合并值依赖其他化合物
+CROSS_COMPOUND_STRATEGIES = {'inverse_variance'}
+
+
+def group_median(values, codes, n_groups):
+    order = np.lexsort((values, codes))
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_values = values[order]
+    return (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+
+
+def group_relative_spread(values, codes, n_groups):
+    # 每个化合物的离散程度: (最大值 - 最小值) / |中位数|, 用于标记可疑数据
+    order = np.lexsort((values, codes))
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_values = values[order]
+    value_range = sorted_values[starts + counts - 1] - sorted_values[starts]
+    median = np.abs(group_median(values, codes, n_groups))
+    return np.divide(value_range, median, out=np.full(n_groups, np.inf), where=median > 0)
+
+
+def _group_starts_in_order(order, codes, n_groups):
+    # order 按组排序后, 返回每组第一个元素在原数组中的位置
+    counts = np.bincount(codes, minlength=n_groups)
+    return order[np.concatenate(([0], np.cumsum(counts)[:-1]))]
+
+
+def pivot_resolved(stats, has_conflicts, has_spread):
+    # 长表转回宽表: 每个属性对应 <prop>, <prop>_Conflicts, <prop>_Spread, <prop>_Sources 列
+    columns = {}
+    for prop in stats.index.get_level_values('Property').unique():
+        prop_stats = stats.xs(prop, level='Property')
+        columns[prop] = prop_stats['value'].infer_objects()
+        if has_conflicts[prop]:
+            columns[f'{prop}_Conflicts'] = prop_stats['conflicts']
+        if has_spread[prop]:
+            columns[f'{prop}_Spread'] = prop_stats['spread']
+        columns[f'{prop}_Sources'] = prop_stats['sources']
+    return pd.DataFrame(columns)
+
+
+def order_merged_columns(merged_df):
+    # 排序列：核心列 + 属性列 + 来源列 + 冲突列
+    prop_columns = sorted([col for col in merged_df.columns if
+                           col not in CORE_COLUMNS and not col.endswith(('_Sources', '_Conflicts', '_Spread'))])
+
+    # 组织列顺序
+    ordered_columns = CORE_COLUMNS.copy()
+    for prop in prop_columns:
+        ordered_columns.append(prop)
+        if f'{prop}_Conflicts' in merged_df.columns:
+            ordered_columns.append(f'{prop}_Conflicts')
+        if f'{prop}_Spread' in merged_df.columns:
+            ordered_columns.append(f'{prop}_Spread')
+        ordered_columns.append(f'{prop}_Sources')
+
+    # 确保只包含实际存在的列
+    final_columns = [col for col in ordered_columns if col in merged_df.columns]
+    return merged_df[final_columns]
+
+
+def _join_unique_sorted(df, key, value, sep):
+    unique_df = df.drop_duplicates([key, value]).sort_values([key, value])
+    return unique_df.groupby(key, sort=False)[value].agg(sep.join)
 
 if __name__ == '__main__':
 
@@ -192,4 +371,16 @@ if __name__ == '__main__':
     input_source = [
         ('critic_data.xlsx', ['Sheet1', 'Sheet2', 'Sheet3', 'Sheet4', 'Sheet5'])
     ]
-    merge_thermo_databases(input_sources=input_source, output_file='merged_thermo_database.xlsx')
+    # 冲突解决策略: 'first', 'mean', 'median', 'source_priority', 'inverse_variance', 'trimmed_mean'
+    # 未指定的列沿用默认规则（critical/temperature/pressure/acentric/factor 开头的列取平均, 其余取第一个值）
+    conflict_strategy = {
+        'Tc/K': 'trimmed_mean',
+        'Pc/bar': 'trimmed_mean',
+        'Tb/K': 'median',
+        'omega': 'source_priority',
+    }
+    source_priority = ['critic_data_Sheet1', 'critic_data_Sheet2', 'critic_data_Sheet3', 'critic_data_Sheet4',
+                       'critic_data_Sheet5']
+    merge_thermo_databases(input_sources=input_source, output_file='merged_thermo_database.xlsx',
+                           conflict_strategy=conflict_strategy, source_priority=source_priority,
+                           smiles_index_path='smiles_index.csv')
@@ -0,0 +1,120 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from rdkit import Chem
+from rdkit.Chem import AllChem
+
+
+def build_mock_records(smiles_list, no_cid_fraction=0.1, no_3d_fraction=0.1, seed=0):
+    """
+    为模拟服务生成数据: 一部分SMILES没有CID, 一部分有CID但没有3D记录, 其余用RDKit生成3D结构
+
+    返回:
+    (dict, dict): (规范SMILES -> CID, CID -> SDF文本或None)
+    """
+    rng = random.Random(seed)
+    smiles_to_cid, cid_to_sdf = {}, {}
+    for i, smiles in enumerate(dict.fromkeys(smiles_list)):
+        mol = Chem.MolFromSmiles(smiles)
+        if mol is None or rng.random() < no_cid_fraction:
+            continue
+        cid = 1000 + i
+        smiles_to_cid[Chem.MolToSmiles(mol)] = cid
+        cid_to_sdf[cid] = None
+        if rng.random() < no_3d_fraction:
+            continue
+        mol = Chem.AddHs(mol)
+        if AllChem.EmbedMolecule(mol, randomSeed=seed) == -1:
+            continue
+        mol.SetProp('_Name', str(cid))
+        cid_to_sdf[cid] = Chem.MolToMolBlock(mol) + '$$$$\n'
+    return smiles_to_cid, cid_to_sdf
+
+
+def start_mock_server(smiles_to_cid, cid_to_sdf, port=0, latency=0.05, busy_rate=0.0):
+    """
+    在后台线程启动模拟 PUG REST 服务, 只实现 fetch_3d_structures / pubchempy 用到的两个接口:
+    POST /compound/smiles/cids/JSON (smiles=...) 和 POST /compound/cid/SDF?record_type=3d (cid=1,2,...)
+
+    参数:
+    latency (float): 每个请求的模拟延迟(秒)
+    busy_rate (float): 以此概率返回 503 ServerBusy, 用于检验退避重试
+
+    返回:
+    (ThreadingHTTPServer, str): (服务对象, api_base), 用完调用 server.shutdown()
+    """
+    stats = {'requests': 0, 'busy': 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = parse_qs(self.rfile.read(length).decode())
+            time.sleep(latency)
+            with lock:
+                stats['requests'] += 1
+                busy = random.random() < busy_rate
+                stats['busy'] += busy
+            if busy:
+                return self._send_fault(503, 'PUGREST.ServerBusy', 'Too many requests or server too busy')
+
+            if self.path.startswith('/compound/smiles/cids/JSON') and 'smiles' in body:
+                mol = Chem.MolFromSmiles(body['smiles'][0])
+                cid = smiles_to_cid.get(Chem.MolToSmiles(mol), 0) if mol is not None else 0
+                return self._send(200, json.dumps({'IdentifierList': {'CID': [cid]}}))
+
+            if self.path.startswith('/compound/cid/SDF') and 'cid' in body:
+                cids = [int(cid) for cid in body['cid'][0].split(',')]
+                records = [cid_to_sdf[cid] for cid in cids if cid_to_sdf.get(cid) is not None]
+                if not records:
+                    return self._send_fault(404, 'PUGREST.NotFound', 'No records found for the given CID(s)')
+                return self._send(200, ''.join(records))
+
+            self._send_fault(400, 'PUGREST.BadRequest', f'Unsupported request: {self.path}')
+
+        def _send_fault(self, code, fault_code, message):
+            self._send(code, json.dumps({'Fault': {'Code': fault_code, 'Message': message}}))
+
+        def _send(self, code, text):
+            data = text.encode()
+            self.send_response(code)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    from pubchem_async import fetch_3d_structures
+
+    # 在本地模拟服务上测量异步获取的吞吐量
+    df = pd.read_excel('merged_critic_data.xlsx')
+    smiles_list = list(df['SMILES'].dropna().astype(str).unique()[:200])
+    smiles_to_cid, cid_to_sdf = build_mock_records(smiles_list, no_cid_fraction=0.1, no_3d_fraction=0.1)
+    server, api_base = start_mock_server(smiles_to_cid, cid_to_sdf, latency=0.2, busy_rate=0.05)
+    try:
+        for max_concurrency in [1, 5, 20]:
+            server.stats.update(requests=0, busy=0)
+            start = time.time()
+            results = fetch_3d_structures(smiles_list, api_base=api_base, max_concurrency=max_concurrency,
+                                          requests_per_second=None, max_retries=5)
+            seconds = time.time() - start
+            methods = pd.Series([method for _, method in results.values()]).value_counts(dropna=False).to_dict()
+            print(f'并发 {max_concurrency}: {len(smiles_list)} 个分子, 耗时 {seconds:.1f} s, '
+                  f'{len(smiles_list) / seconds:.1f} 分子/秒, 请求 {server.stats["requests"]} 次 '
+                  f'(503 {server.stats["busy"]} 次), {methods}')
+    finally:
+        server.shutdown()
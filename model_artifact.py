@@ -0,0 +1,125 @@
+import datetime
+import glob
+import json
+import os
+import re
+import shutil
+import joblib
+import numpy as np
+import sklearn
+
+from dataset_cache import file_hash
+from feature_expr import expression_columns, parse_expression
+
+
+ARTIFACT_FORMAT_VERSION = 1
+MODEL_FILE = 'model.joblib'
+MANIFEST_FILE = 'manifest.json'
+
+
+def save_model_artifact(pipeline, root_dir='models', name=None, feature_labels=None, feature_expressions=None,
+                        target_labels=None, metrics=None):
+    """
+    把训练好的模型保存为带版本号的目录: {root_dir}/{name}/v{N}/, 其中有 model.joblib 和 manifest.json
+
+    manifest 记录特征列、特征表达式、目标、模型文件的sha256、sklearn/numpy版本和评价指标, 预测时据此重建特征;
+    先写入临时目录再改名, 不会留下不完整的版本
+
+    参数:
+    pipeline: 训练好的 sklearn Pipeline
+    name (str): 模型名, 默认由目标名生成(如 Tc/K -> Tc_K)
+    feature_labels (list[str]): 模型输入的特征列(顺序与训练时相同)
+    feature_expressions (dict): 列名 -> feature_expr 表达式, 见 fit_model.FEATURE_EXPRESSIONS
+    target_labels (list[str]): 预测的目标
+    metrics (dict): 评价指标
+
+    返回:
+    str: 新版本的目录
+    """
+    target_labels = list(target_labels or [])
+    if name is None:
+        name = '_'.join(re.sub(r'\W+', '_', label).strip('_') for label in target_labels) or 'model'
+    model_dir = os.path.join(root_dir, name)
+    os.makedirs(model_dir, exist_ok=True)
+
+    tmp_dir = os.path.join(model_dir, f'.tmp_{os.getpid()}')
+    try:
+        os.makedirs(tmp_dir, exist_ok=True)
+        model_path = os.path.join(tmp_dir, MODEL_FILE)
+        joblib.dump(pipeline, model_path)
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'name': name,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'target_labels': target_labels,
+            'feature_labels': list(feature_labels if feature_labels is not None else pipeline.feature_names_in_),
+            'feature_expressions': dict(feature_expressions or {}),
+            'model_file': MODEL_FILE,
+            'sha256': file_hash(model_path),
+            'sklearn_version': sklearn.__version__,
+            'numpy_version': np.__version__,
+            'estimator': repr(pipeline),
+            'metrics': {key: float(value) for key, value in (metrics or {}).items()},
+        }
+        # 版本号在改名时确定, 目录已存在(并发保存)时顺延
+        while True:
+            version = _latest_version(model_dir) + 1
+            manifest['version'] = version
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+            version_dir = os.path.join(model_dir, f'v{version}')
+            try:
+                os.rename(tmp_dir, version_dir)
+                break
+            except OSError:
+                if not os.path.exists(version_dir):
+                    raise
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+    print(f'模型已保存至 {version_dir}')
+    return version_dir
+
+
+def load_model_artifact(path):
+    """
+    读取模型; path 为某个版本的目录, 或模型目录(取最新版本)
+
+    返回:
+    dict: pipeline、manifest、path(版本目录)、input_columns(输入表中需要的原始列)
+    """
+    if not os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        version = _latest_version(path)
+        if version == 0:
+            raise FileNotFoundError(f'没有找到模型: {path}')
+        path = os.path.join(path, f'v{version}')
+    with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version', 0) > ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f'模型格式版本 {manifest["format_version"]} 高于当前支持的 {ARTIFACT_FORMAT_VERSION}: {path}')
+
+    model_path = os.path.join(path, manifest['model_file'])
+    if file_hash(model_path) != manifest['sha256']:
+        raise ValueError(f'模型文件与manifest中的sha256不一致: {model_path}')
+    if manifest['sklearn_version'] != sklearn.__version__:
+        print(f'警告: 模型由 sklearn {manifest["sklearn_version"]} 训练, 当前为 {sklearn.__version__}')
+
+    return {'pipeline': joblib.load(model_path), 'manifest': manifest, 'path': path,
+            'input_columns': artifact_input_columns(manifest)}
+
+
+def artifact_input_columns(manifest):
+    # 由特征列和表达式推出输入表中需要的原始列
+    columns = []
+    for label in manifest['feature_labels']:
+        expression = manifest['feature_expressions'].get(label)
+        needed = sorted(expression_columns(parse_expression(expression))) if expression is not None else [label]
+        columns.extend(column for column in needed if column not in columns)
+    return columns
+
+
+def _latest_version(model_dir):
+    versions = [int(m.group(1)) for path in glob.glob(os.path.join(glob.escape(model_dir), 'v*'))
+                if (m := re.fullmatch(r'v(\d+)', os.path.basename(path)))]
+    return max(versions, default=0)
+
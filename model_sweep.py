@@ -0,0 +1,159 @@
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import enet_path, lasso_path
+from sklearn.model_selection import KFold
+
+from feature_expr import apply_feature_expressions
+from fit_model import FEATURE_EXPRESSIONS, FEATURE_LABELS, TARGET_LABELS, load_data
+
+
+SWEEP_MODELS = ['lasso', 'ridge', 'elasticnet']
+SWEEP_METRICS = ['r2', 'rmse', 'mae', 'n_nonzero']
+
+
+def regularization_sweep(X, Y, target_labels=None, models=None, n_alphas=50, alpha_ratio=1e-3, ridge_alphas=None,
+                         l1_ratios=(0.5,), n_splits=5, random_state=123, standardize=True, max_iter=100000,
+                         max_workers=None):
+    """
+    对多个目标同时计算 Lasso、Ridge、ElasticNet 的正则化路径, 用k折交叉验证评价每个alpha
+
+    数据只读取一次; 每个 (目标, 折) 是一个任务, 在进程池中并行.
+    Lasso/ElasticNet 用 lasso_path/enet_path 沿alpha从大到小热启动; Ridge 对每折做一次SVD, 所有alpha用闭式解一次算出.
+    同一目标的各折使用相同的alpha网格, 由全部数据的 alpha_max 和 alpha_ratio 确定
+
+    参数:
+    X (pd.DataFrame): 特征
+    Y (pd.DataFrame): 目标, 每列一个目标, 空值的行只在该目标中去掉
+    target_labels (list[str]): 参与的目标, 默认为Y的全部列
+    models (list[str]): SWEEP_MODELS 中的模型
+    n_alphas (int): Lasso/ElasticNet 路径上的alpha个数
+    alpha_ratio (float): 最小alpha与 alpha_max 之比
+    ridge_alphas (np.ndarray): Ridge 的alpha网格, 默认 10^-3 ~ 10^4
+    l1_ratios (Sequence[float]): ElasticNet 的 l1_ratio
+    standardize (bool): 按训练折的均值和标准差标准化特征
+    max_workers (int): 进程数
+
+    返回:
+    pd.DataFrame: 每个 (target, model, l1_ratio, alpha) 一行, 各指标为验证集上各折的均值(_mean)和标准差(_std)
+    """
+    target_labels = list(Y.columns) if target_labels is None else target_labels
+    models = SWEEP_MODELS if models is None else models
+    ridge_alphas = np.logspace(-3, 4, n_alphas) if ridge_alphas is None else np.asarray(ridge_alphas, dtype=float)
+    features = X.to_numpy(dtype=float)
+
+    tasks = []
+    for target in target_labels:
+        mask = Y[target].notna().to_numpy()
+        x, y = features[mask], Y[target].to_numpy(dtype=float)[mask]
+        paths = _alpha_paths(x, y, models, n_alphas, alpha_ratio, ridge_alphas, l1_ratios, standardize)
+        folds = KFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(x)
+        for fold, (train, val) in enumerate(folds):
+            tasks.append({'target': target, 'fold': fold, 'x_train': x[train], 'y_train': y[train],
+                          'x_val': x[val], 'y_val': y[val], 'paths': paths, 'standardize': standardize,
+                          'max_iter': max_iter})
+        print(f'{target}: {len(y)} 个样本')
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        fold_df = pd.concat(executor.map(_sweep_fold, tasks), ignore_index=True)
+
+    summary = fold_df.groupby(['target', 'model', 'l1_ratio', 'alpha'], sort=False)[SWEEP_METRICS].agg(['mean', 'std'])
+    summary.columns = [f'{metric}_{stat}' for metric, stat in summary.columns]
+    summary.insert(0, 'n_folds', fold_df.groupby(['target', 'model', 'l1_ratio', 'alpha'], sort=False).size())
+    return summary.reset_index()
+
+
+def best_alphas(summary, metric='r2_mean', larger_is_better=True):
+    # 每个 (target, model, l1_ratio) 中验证指标最优的一行
+    order = summary[metric].rank(ascending=not larger_is_better, method='first')
+    best = order.groupby([summary['target'], summary['model'], summary['l1_ratio']]).idxmin()
+    return summary.loc[best.to_numpy()].reset_index(drop=True)
+
+
+def _alpha_paths(x, y, models, n_alphas, alpha_ratio, ridge_alphas, l1_ratios, standardize):
+    # 每个模型的 (model, l1_ratio, alphas); Lasso/ElasticNet 的 alpha_max 为使全部系数为0的最小alpha
+    x = _scale(x, x, standardize)[0]
+    xty = np.abs(x.T @ (y - y.mean())).max() / len(y)
+    grid = np.logspace(0, np.log10(alpha_ratio), n_alphas)
+    paths = []
+    for model in models:
+        if model == 'lasso':
+            paths.append(('lasso', 1.0, xty * grid))
+        elif model == 'elasticnet':
+            paths.extend(('elasticnet', l1_ratio, xty / l1_ratio * grid) for l1_ratio in l1_ratios)
+        elif model == 'ridge':
+            paths.append(('ridge', 0.0, ridge_alphas))
+        else:
+            raise ValueError(f'未知的模型: {model}')
+    return paths
+
+
+def _sweep_fold(task):
+    x_train, x_val = _scale(task['x_train'], task['x_val'], task['standardize'])
+    y_train, y_val = task['y_train'], task['y_val']
+    x_mean, y_mean = x_train.mean(axis=0), y_train.mean()
+    x_centered, y_centered = x_train - x_mean, y_train - y_mean
+
+    frames = []
+    for model, l1_ratio, alphas in task['paths']:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', ConvergenceWarning)
+            if model == 'lasso':
+                coefs = lasso_path(x_centered, y_centered, alphas=alphas, max_iter=task['max_iter'])[1]
+            elif model == 'elasticnet':
+                coefs = enet_path(x_centered, y_centered, l1_ratio=l1_ratio, alphas=alphas,
+                                  max_iter=task['max_iter'])[1]
+            else:
+                coefs = _ridge_path(x_centered, y_centered, alphas)
+        # 所有alpha的预测一次算出: (验证样本数, alpha数)
+        pred = (x_val - x_mean) @ coefs + y_mean
+        residual = y_val[:, None] - pred
+        frames.append(pd.DataFrame({
+            'target': task['target'],
+            'model': model,
+            'l1_ratio': l1_ratio,
+            'alpha': alphas,
+            'fold': task['fold'],
+            'r2': 1 - (residual ** 2).sum(axis=0) / ((y_val - y_val.mean()) ** 2).sum(),
+            'rmse': np.sqrt((residual ** 2).mean(axis=0)),
+            'mae': np.abs(residual).mean(axis=0),
+            'n_nonzero': (np.abs(coefs) > 0).sum(axis=0),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _ridge_path(x_centered, y_centered, alphas):
+    # min ||y - Xw||^2 + alpha ||w||^2 的闭式解 w = V diag(s / (s^2 + alpha)) Uᵀy, 一次SVD得到所有alpha的系数
+    u, s, vt = np.linalg.svd(x_centered, full_matrices=False)
+    uty = u.T @ y_centered
+    return vt.T @ (s[:, None] / (s[:, None] ** 2 + alphas[None, :]) * uty[:, None])
+
+
+def _scale(x_train, x_other, standardize):
+    if not standardize:
+        return x_train, x_other
+    mean = x_train.mean(axis=0)
+    std = x_train.std(axis=0)
+    std = np.where(std > 0, std, 1.0)
+    return (x_train - mean) / std, (x_other - mean) / std
+
+
+if __name__ == '__main__':
+    from os.path import join
+
+    target_df_path = join('dataset', 'merged_critic_data.xlsx')
+    feature_df_path = join('dataset', 'surface_result.xlsx')
+
+    # 所有目标一起读取一次, 每个目标只去掉自己为空的行
+    X, Y = load_data(target_df_path=target_df_path, feature_df_path=feature_df_path, target_df_label=TARGET_LABELS,
+                     feature_df_label=FEATURE_LABELS, dropna_target=False)
+    X = apply_feature_expressions(X, FEATURE_EXPRESSIONS)
+
+    summary = regularization_sweep(X, Y, target_labels=TARGET_LABELS, n_alphas=50, l1_ratios=(0.2, 0.5, 0.8),
+                                   n_splits=5, random_state=123, max_workers=None)
+    summary.to_csv('model_sweep.csv', index=False)
+    print(best_alphas(summary)[['target', 'model', 'l1_ratio', 'alpha', 'r2_mean', 'r2_std', 'rmse_mean']])
+    print(f'结果已保存至 {os.path.abspath("model_sweep.csv")}')
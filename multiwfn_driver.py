@@ -0,0 +1,136 @@
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from read_surface_data import SURFACE_FIELDS, extract_multiwfn_info, file_index
+
+
+# 主功能12(定量分子表面分析) -> 0 开始分析(默认映射静电势) -> 后处理菜单 7 导出顶点到 vtx.txt, 8 导出面片到 facet.pdb
+# -> 返回上级菜单 -> 退出; 后处理菜单的选项号以所用Multiwfn版本为准
+SURFACE_ANALYSIS_INPUT = '12\n0\n7\n8\n-1\n-1\nq\n'
+# Multiwfn导出到工作目录的文件 -> 保存到输出目录时的后缀, 如 surface_result/12.vtx.txt (见 surface_stats)
+VERTEX_SUFFIX = '.vtx.txt'
+FACET_SUFFIX = '.facet.pdb'
+EXPORTED_FILES = {'vtx.txt': VERTEX_SUFFIX, 'facet.pdb': FACET_SUFFIX}
+WAVEFUNCTION_PATTERNS = ['*.fchk', '*.fch', '*.wfn', '*.wfx']
+RUN_COLUMNS = ['index', 'wavefunction', 'out_file', 'status', 'returncode', 'seconds']
+
+
+def iter_multiwfn_runs(wavefunction_paths, out_dir='surface_result', multiwfn_command=None, total_cores=None,
+                       threads_per_job=4, menu_input=SURFACE_ANALYSIS_INPUT, timeout=None, skip_existing=True,
+                       out_suffix='.sufrace_out'):
+    """
+    并发运行Multiwfn, 每完成一个就解析其输出并立即返回结果
+
+    同时运行的进程数为 total_cores // threads_per_job, 每个进程用 -nt 指定线程数, 总线程数不超过核数预算
+    输出先写入临时文件, 正常结束后再改名, 中断的运行不会留下不完整的输出
+    每个进程在单独的临时工作目录中运行, 导出的 EXPORTED_FILES 移到 {out_dir}/{文件名}{后缀}
+
+    参数:
+    wavefunction_paths (list[str]): .fchk/.wfn 等波函数文件, 文件名去掉扩展名后作为输出文件名
+    out_dir (str): 输出目录, 输出文件为 {out_dir}/{文件名}{out_suffix}
+    multiwfn_command (str | list[str]): Multiwfn可执行文件(或命令列表), 默认取环境变量 MULTIWFN, 否则为 'Multiwfn';
+                                        其中存在的相对路径转为绝对路径
+    total_cores (int): 核数预算, 默认为CPU核数
+    threads_per_job (int): 每个Multiwfn进程的线程数
+    menu_input (str): 通过stdin输入的菜单命令
+    timeout (float): 单个任务的超时时间(秒)
+    skip_existing (bool): 跳过输出已存在的任务(仍会解析已有输出)
+
+    返回:
+    迭代器, 每项为 dict: RUN_COLUMNS 中的运行信息和 extract_multiwfn_info 的解析结果
+    """
+    if multiwfn_command is None:
+        multiwfn_command = os.environ.get('MULTIWFN', 'Multiwfn')
+    if isinstance(multiwfn_command, str):
+        multiwfn_command = [multiwfn_command]
+    multiwfn_command = [os.path.abspath(arg) if os.path.exists(arg) else arg for arg in multiwfn_command]
+    if total_cores is None:
+        total_cores = os.cpu_count()
+    threads_per_job = min(threads_per_job, total_cores)
+    n_jobs = max(1, total_cores // threads_per_job)
+    os.makedirs(out_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = []
+        for wavefunction in wavefunction_paths:
+            stem = os.path.basename(wavefunction).split('.')[0]
+            out_file = os.path.join(out_dir, f'{stem}{out_suffix}')
+            if skip_existing and os.path.exists(out_file):
+                record = {'index': file_index(out_file), 'wavefunction': wavefunction, 'out_file': out_file,
+                          'status': 'skipped', 'returncode': None, 'seconds': 0.0}
+                record.update(extract_multiwfn_info(out_file))
+                yield record
+                continue
+            futures.append(executor.submit(_run_multiwfn, multiwfn_command, wavefunction, out_file,
+                                           os.path.join(out_dir, stem), threads_per_job, menu_input, timeout,
+                                           file_index(out_file)))
+
+        for future in as_completed(futures):
+            record = future.result()
+            if record['status'] == 'success':
+                record.update(extract_multiwfn_info(record['out_file']))
+            yield record
+
+
+def run_multiwfn_batch(input_dir, out_dir='surface_result', patterns=None, **kwargs):
+    # 扫描 input_dir 中的波函数文件并运行, 返回结果表(按文件名排序); kwargs 见 iter_multiwfn_runs
+    wavefunction_paths = sorted(path for pattern in (patterns or WAVEFUNCTION_PATTERNS)
+                                for path in glob.glob(os.path.join(input_dir, pattern)))
+    print(f'共 {len(wavefunction_paths)} 个波函数文件')
+
+    records = []
+    for record in iter_multiwfn_runs(wavefunction_paths, out_dir=out_dir, **kwargs):
+        print(f"{record['index']}: {record['status']} ({record['seconds']} s)")
+        records.append(record)
+
+    # 按输入顺序排列
+    order = {path: i for i, path in enumerate(wavefunction_paths)}
+    records.sort(key=lambda record: order[record['wavefunction']])
+    df = pd.DataFrame(records, columns=RUN_COLUMNS + SURFACE_FIELDS)
+    print(df['status'].value_counts())
+    return df
+
+
+def _run_multiwfn(multiwfn_command, wavefunction, out_file, export_prefix, threads, menu_input, timeout, index):
+    start = time.time()
+    record = {'index': index, 'wavefunction': wavefunction, 'out_file': out_file, 'status': 'fail', 'returncode': None}
+    tmp_file = f'{out_file}.tmp'
+    # Multiwfn把 vtx.txt 等文件写到当前目录, 并发运行时每个进程需要单独的工作目录; 当前目录的 settings.ini 一并复制
+    work_dir = tempfile.mkdtemp(dir=os.path.dirname(out_file) or '.')
+    if os.path.exists('settings.ini'):
+        shutil.copy('settings.ini', work_dir)
+    try:
+        with open(tmp_file, 'w') as out:
+            completed = subprocess.run(multiwfn_command + [os.path.abspath(wavefunction), '-nt', str(threads)],
+                                       input=menu_input, stdout=out, stderr=subprocess.STDOUT, text=True,
+                                       timeout=timeout, cwd=work_dir)
+        record['returncode'] = completed.returncode
+        if completed.returncode == 0:
+            for name, suffix in EXPORTED_FILES.items():
+                if os.path.exists(os.path.join(work_dir, name)):
+                    os.replace(os.path.join(work_dir, name), export_prefix + suffix)
+            os.replace(tmp_file, out_file)
+            record['status'] = 'success'
+    except subprocess.TimeoutExpired:
+        record['status'] = 'timeout'
+    except OSError as e:
+        print(f'Multiwfn启动失败: {e}')
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    record['seconds'] = round(time.time() - start, 3)
+    return record
+
+
+if __name__ == '__main__':
+
+    df = run_multiwfn_batch(input_dir='wavefunction', out_dir='surface_result', multiwfn_command=None,
+                            total_cores=None, threads_per_job=4, timeout=3600)
+    df.to_csv(os.path.join('surface_result', 'multiwfn_status.csv'), index=False)
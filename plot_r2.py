@@ -8,6 +8,8 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 
+from dataset_cache import read_table
+
 
 def plot_r2(train_x_y_df_path=None, val_x_y_df_path=None, test_x_y_df_path=None,
             y_label_name='label', y_pre_name='pre',
@@ -177,13 +179,10 @@ def plot_r2(train_x_y_df_path=None, val_x_y_df_path=None, test_x_y_df_path=None,
 
 
 def load_df(path):
-    if path.endswith('.xlsx'):
-        df = pd.read_excel(path)
-    elif path.endswith('.csv'):
-        df = pd.read_csv(path)
-    else:
-        raise NotImplemented('无法识别的文件类型!')
-    return df
+    # 可以直接传入DataFrame(如 read_sisso_predict.read_prediction_table 的结果), 或 xlsx/csv/parquet 文件路径
+    if isinstance(path, pd.DataFrame):
+        return path.copy()
+    return read_table(path)
 
 
 def cal_metric(y_label, y_pred, key='data', save=False, save_root_path='.'):
@@ -202,9 +201,11 @@ def cal_metric(y_label, y_pred, key='data', save=False, save_root_path='.'):
 
 
 if __name__ == '__main__':
+    from read_sisso_predict import read_prediction_table
 
     for i in range(1, 6):
         print(i)
         os.makedirs(f'd{i}', exist_ok=True)
-        plot_r2(train_x_y_df_path=f'train/dimension_{i}.xlsx', test_x_y_df_path=f'test/dimension_{i}.xlsx',
+        plot_r2(train_x_y_df_path=read_prediction_table('train/predict_Y.parquet', dimension=i),
+                test_x_y_df_path=read_prediction_table('test/predict_Y.parquet', dimension=i),
                 save=True, save_root_path=f'd{i}', ticks=[0, 0.5, 1])
\ No newline at end of file
@@ -0,0 +1,149 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+
+from dataset_cache import HAS_PYARROW, atomic_write, read_table
+from feature_expr import apply_feature_expressions
+from model_artifact import load_model_artifact
+
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+def iter_table_chunks(path, chunk_size=50000, columns=None):
+    """
+    分块读取描述符表; parquet 按 row group 流式读取, csv 用 chunksize, Excel 只能整体读入后再分块
+
+    参数:
+    columns (list[str]): 只读取这些列(表中不存在的列忽略)
+    """
+    if path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [column for column in columns if column in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif path.endswith('.csv'):
+        usecols = None if columns is None else lambda column: column in columns
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=usecols)
+    else:
+        df = read_table(path)
+        if columns is not None:
+            df = df[[column for column in columns if column in df.columns]]
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def table_columns(path):
+    # 描述符表的列名; parquet 只读 schema, csv 只读表头
+    if path.endswith('.parquet'):
+        return pq.ParquetFile(path).schema_arrow.names
+    if path.endswith('.csv'):
+        return list(pd.read_csv(path, nrows=0).columns)
+    return list(read_table(path).columns)
+
+
+def predict_chunk(artifacts, chunk, id_columns=('index',)):
+    """
+    用一组模型预测一块描述符表
+
+    特征按各模型manifest中的表达式重新计算; 特征为空值或 nan/inf 的行预测值为 NaN
+    (chunk 必须包含各模型的 input_columns, predict_table 在读取前检查)
+
+    返回:
+    pd.DataFrame: id_columns 中存在的列, 加上每个模型每个目标一列预测值
+    """
+    out = chunk[[column for column in id_columns if column in chunk.columns]].reset_index(drop=True)
+    for artifact in artifacts:
+        manifest = artifact['manifest']
+        labels = manifest['feature_labels']
+        expressions = {name: expression for name, expression in manifest['feature_expressions'].items()
+                       if name in labels}
+        X = apply_feature_expressions(chunk[artifact['input_columns']], expressions)[labels].reset_index(drop=True)
+        valid = np.isfinite(X.to_numpy(dtype=float)).all(axis=1)
+        targets = manifest['target_labels'] or [manifest['name']]
+        pred = np.full((len(X), len(targets)), np.nan)
+        if valid.any():
+            pred[valid] = np.asarray(artifact['pipeline'].predict(X[valid])).reshape(int(valid.sum()), -1)
+        for i, target in enumerate(targets):
+            column = target if target not in out.columns else f"{target}_{manifest['name']}_v{manifest['version']}"
+            out[column] = pred[:, i]
+    return out
+
+
+def predict_table(model_paths, input_path, output_path, chunk_size=50000, id_columns=('index',)):
+    """
+    分块读取描述符表(如 read_surface_data.scan_surface_outputs 的结果), 逐块预测并追加写出, 内存占用与总行数无关
+
+    参数:
+    model_paths (list[str]): 模型目录(model_artifact.save_model_artifact 的结果, 或其上级的模型名目录)
+    input_path (str): 描述符表, .parquet/.csv/.xlsx
+    output_path (str): 预测结果, .parquet(没有pyarrow时改存为csv)或 .csv
+    chunk_size (int): 每块行数
+    id_columns (Sequence[str]): 原样复制到结果中的编号列
+
+    返回:
+    int: 预测的行数
+    """
+    artifacts = [load_model_artifact(path) for path in model_paths]
+    input_columns = set(table_columns(input_path))
+    for artifact in artifacts:
+        manifest = artifact['manifest']
+        missing = [column for column in artifact['input_columns'] if column not in input_columns]
+        if missing:
+            raise ValueError(f"{input_path} 缺少模型 {artifact['path']} 需要的列: {missing}")
+        print(f"{artifact['path']}: {manifest['target_labels']}, {len(manifest['feature_labels'])} 个特征")
+    columns = list(id_columns) + [column for artifact in artifacts for column in artifact['input_columns']]
+    if not HAS_PYARROW and output_path.endswith('.parquet'):
+        output_path = output_path[:-len('.parquet')] + '.csv'
+        print(f'警告: 没有安装pyarrow, 结果改存为 {output_path}')
+
+    n_rows = 0
+
+    def write_predictions(tmp_path):
+        nonlocal n_rows
+        writer = None
+        try:
+            for chunk in iter_table_chunks(input_path, chunk_size=chunk_size, columns=columns):
+                out = predict_chunk(artifacts, chunk, id_columns=id_columns)
+                if output_path.endswith('.parquet'):
+                    table = pa.Table.from_pandas(out, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table)
+                else:
+                    out.to_csv(tmp_path, mode='a', index=False, header=n_rows == 0)
+                n_rows += len(out)
+                print(f'已预测 {n_rows} 行')
+        finally:
+            if writer is not None:
+                writer.close()
+        if not os.path.exists(tmp_path):
+            # 输入为空时也写出只有表头的结果
+            empty = pd.DataFrame(columns=list(id_columns))
+            if output_path.endswith('.parquet'):
+                empty.to_parquet(tmp_path, index=False)
+            else:
+                empty.to_csv(tmp_path, index=False)
+
+    atomic_write(output_path, write_predictions)
+    print(f'预测结果已保存至 {output_path}')
+    return n_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='用保存的模型分块批量预测描述符表')
+    parser.add_argument('input', help='描述符表(.parquet/.csv/.xlsx), 如 surface_result.parquet')
+    parser.add_argument('-m', '--model', nargs='+', required=True,
+                        help='模型目录, 如 models/Tc_K (取最新版本) 或 models/Tc_K/v2')
+    parser.add_argument('-o', '--output', default='predictions.parquet', help='输出文件(.parquet/.csv)')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='每块行数')
+    parser.add_argument('--id-column', nargs='*', default=['index'], help='复制到结果中的编号列')
+    args = parser.parse_args(argv)
+    predict_table(args.model, args.input, args.output, chunk_size=args.chunk_size, id_columns=args.id_column)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pubchempy as pcp
+from openbabel import pybel
+
+from get_3D_structure import get_3D_mol_from_smiles
+from structure_cache import NO_3D, NO_CID, PUBCHEM_HIT, lookup_structure, store_structure, structure_cache_key
+
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    # 限制请求发起频率(PubChem要求不超过5次/秒)
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def slow_down(self, seconds):
+        # 服务端提示繁忙时, 推迟后续所有请求
+        self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+
+def fetch_3d_structures(smiles_list, api_base=None, max_concurrency=5, requests_per_second=5, cid_batch_size=50,
+                        max_retries=5, local_workers=None, n_conformers=1, cache_dir=None, fixture_dir=None):
+    """
+    异步批量获取3D结构: 并发解析CID, 按CID批量下载3D SDF, 未命中的分子同时在进程池中用RDKit/OpenBabel本地生成
+
+    PUG REST 中只有 cid/sid/aid 输入可以用逗号分隔一次给出多个, SMILES 输入每次请求只接受一个,
+    所以CID解析是每个SMILES一个请求, 由 max_concurrency 和 requests_per_second 控制并发; 只有SDF下载按CID批量进行
+
+    参数:
+    smiles_list (Iterable[str]): SMILES, 重复的只查询一次
+    api_base (str): PUG REST 地址, 默认与 pubchempy 相同(可用环境变量 PUBCHEM_API_BASE 指向本地模拟服务)
+    max_concurrency (int): 同时进行的HTTP请求数上限
+    requests_per_second (float): 请求频率上限, None 表示不限制
+    cid_batch_size (int): 每次批量下载SDF的CID数
+    max_retries (int): 遇到 429/5xx/网络错误时的最大重试次数(指数退避)
+    local_workers (int): 本地生成的进程数
+    n_conformers (int): 本地生成时传给 get_3D_mol_from_smiles; 这里总是先查PubChem,
+                        需要对有PubChem结构的分子也做构象搜索时用 get_3D_structure.batch_get_3D_structure
+    cache_dir, fixture_dir: 见 structure_cache, 给出时先查缓存并把结果写入缓存
+
+    返回:
+    dict: SMILES -> (SDF文本, 方法名), 全部失败时为 (None, None)
+    """
+    return asyncio.run(_fetch_3d_structures(
+        list(dict.fromkeys(smiles_list)), api_base=api_base or os.environ.get('PUBCHEM_API_BASE', pcp.API_BASE),
+        max_concurrency=max_concurrency, requests_per_second=requests_per_second, cid_batch_size=cid_batch_size,
+        max_retries=max_retries, local_workers=local_workers, n_conformers=n_conformers, cache_dir=cache_dir,
+        fixture_dir=fixture_dir))
+
+
+def fetch_3d_structures_to_files(index_list, smiles_list, out_dir='structure_3D', output_format='mol', **kwargs):
+    # 结果写为 {out_dir}/{index}.{output_format}, 返回状态表 (index, smiles, method)
+    os.makedirs(out_dir, exist_ok=True)
+    smiles_list = list(smiles_list)
+    results = fetch_3d_structures(smiles_list, **kwargs)
+    status = []
+    for index, smiles in zip(index_list, smiles_list):
+        sdf, method = results[smiles]
+        if sdf is not None:
+            pybel.readstring('sdf', sdf).write(output_format, os.path.join(out_dir, f'{index}.{output_format}'),
+                                               overwrite=True)
+        status.append({'index': index, 'smiles': smiles, 'method': method})
+    return status
+
+
+async def _fetch_3d_structures(smiles_list, api_base, max_concurrency, requests_per_second, cid_batch_size,
+                               max_retries, local_workers, n_conformers, cache_dir, fixture_dir):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = RateLimiter(requests_per_second)
+    results = {}
+    local_tasks = []
+    use_cache = cache_dir is not None or fixture_dir is not None
+
+    with ProcessPoolExecutor(max_workers=local_workers) as executor:
+        def generate_locally(smiles):
+            local_tasks.append(asyncio.ensure_future(_generate_locally(loop, executor, smiles, n_conformers, cache_dir,
+                                                                       fixture_dir, results)))
+
+        # 1. 查缓存
+        keys = {}
+        to_resolve = []
+        for smiles in smiles_list:
+            if use_cache:
+                keys[smiles] = structure_cache_key(smiles)[0]
+                cached = lookup_structure(cache_dir, keys[smiles], PUBCHEM_HIT, fixture_dir=fixture_dir)
+                if cached is not None:
+                    if cached[1] is not None:
+                        results[smiles] = (cached[1], 'pubchem')
+                    else:
+                        generate_locally(smiles)
+                    continue
+            to_resolve.append(smiles)
+
+        # 2. 并发解析CID(SMILES输入不支持批量, 每个SMILES一个请求), 无CID的分子立即开始本地生成
+        async def resolve(smiles):
+            body = await _request(f'{api_base}/compound/smiles/cids/JSON', {'smiles': smiles}, semaphore, limiter,
+                                  max_retries)
+            cids = json.loads(body)['IdentifierList']['CID'] if body is not None else []
+            cid = cids[0] if cids and cids[0] else None
+            if cid is None:
+                _store(cache_dir, keys.get(smiles), smiles, None, None)
+                generate_locally(smiles)
+            return smiles, cid
+
+        resolved = await asyncio.gather(*[resolve(smiles) for smiles in to_resolve], return_exceptions=True)
+        cid_to_smiles = {}
+        for smiles, item in zip(to_resolve, resolved):
+            if isinstance(item, BaseException):
+                print(f'PubChem查询失败: {item!r}, SMILES: {smiles}')
+                generate_locally(smiles)
+            elif item[1] is not None:
+                cid_to_smiles.setdefault(item[1], []).append(smiles)
+
+        # 3. 按CID批量下载3D SDF
+        cids = list(cid_to_smiles)
+        batches = [cids[i:i + cid_batch_size] for i in range(0, len(cids), cid_batch_size)]
+        downloaded = await asyncio.gather(*[_download_sdf_batch(api_base, batch, semaphore, limiter, max_retries)
+                                            for batch in batches], return_exceptions=True)
+        for batch, records in zip(batches, downloaded):
+            for cid in batch:
+                failed = isinstance(records, BaseException)
+                sdf = None if failed else records.get(cid)
+                for smiles in cid_to_smiles[cid]:
+                    if sdf is not None:
+                        results[smiles] = (sdf, 'pubchem')
+                    else:
+                        if failed:
+                            print(f'PubChem下载失败: {records!r}, CID: {cid}')
+                        else:
+                            _store(cache_dir, keys.get(smiles), smiles, cid, None)
+                        generate_locally(smiles)
+                    if sdf is not None:
+                        _store(cache_dir, keys.get(smiles), smiles, cid, sdf)
+
+        # 4. 等待本地生成完成
+        await asyncio.gather(*local_tasks)
+
+    return results
+
+
+async def _download_sdf_batch(api_base, cids, semaphore, limiter, max_retries):
+    # 返回 CID -> SDF文本, 没有3D记录的CID不在结果中
+    body = await _request(f'{api_base}/compound/cid/SDF?record_type=3d', {'cid': ','.join(map(str, cids))},
+                          semaphore, limiter, max_retries)
+    if body is None:
+        # 整批404时二分重试, 找出其中有3D记录的CID
+        if len(cids) == 1:
+            return {}
+        half = len(cids) // 2
+        first, second = await asyncio.gather(_download_sdf_batch(api_base, cids[:half], semaphore, limiter, max_retries),
+                                             _download_sdf_batch(api_base, cids[half:], semaphore, limiter, max_retries))
+        return {**first, **second}
+
+    records = {}
+    for record in body.split('$$$$'):
+        record = record.strip('\n')
+        if not record.strip():
+            continue
+        title = record.split('\n', 1)[0].strip()
+        if title.isdigit():
+            records[int(title)] = record + '\n$$$$\n'
+    return records
+
+
+async def _request(url, data, semaphore, limiter, max_retries):
+    # 返回响应文本, 404 返回 None; 429/5xx/网络错误按指数退避重试
+    payload = urlencode(data).encode()
+    for attempt in range(max_retries + 1):
+        await limiter.wait()
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(_post, url, payload)
+            except HTTPError as e:
+                if e.code == 404:
+                    return None
+                if e.code not in RETRY_STATUS or attempt == max_retries:
+                    raise
+                retry_after = e.headers.get('Retry-After') if e.headers is not None else None
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else 2 ** attempt
+            except (URLError, TimeoutError, ConnectionError):
+                if attempt == max_retries:
+                    raise
+                delay = 2 ** attempt
+        delay *= 0.5 + random.random()
+        limiter.slow_down(delay)
+        await asyncio.sleep(delay)
+
+
+def _post(url, payload, timeout=30):
+    with urlopen(url, payload, timeout=timeout) as response:
+        return response.read().decode()
+
+
+async def _generate_locally(loop, executor, smiles, n_conformers, cache_dir, fixture_dir, results):
+    results[smiles] = await loop.run_in_executor(executor, _generate_local_sdf, smiles, n_conformers, cache_dir,
+                                                 fixture_dir)
+
+
+def _generate_local_sdf(smiles, n_conformers=1, cache_dir=None, fixture_dir=None):
+    # 在子进程中运行, pybel.Molecule 不能跨进程传递, 因此返回SDF文本
+    mol, method = get_3D_mol_from_smiles(smiles, n_conformers=n_conformers, conformer_threads=1, cache_dir=cache_dir,
+                                         fixture_dir=fixture_dir, offline=True)
+    return (mol.write('sdf'), method) if mol is not None else (None, None)
+
+
+def _store(cache_dir, key, smiles, cid, sdf):
+    if cache_dir is None or key is None:
+        return
+    status = PUBCHEM_HIT if sdf is not None else (NO_CID if cid is None else NO_3D)
+    store_structure(cache_dir, key, PUBCHEM_HIT, {'smiles': smiles, 'cid': cid, 'status': status}, sdf=sdf)
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    df = pd.read_excel('merged_critic_data.xlsx')
+    start = time.time()
+    status = fetch_3d_structures_to_files(df['index'], df['SMILES'], out_dir='structure_3D', max_concurrency=5,
+                                          requests_per_second=5, cache_dir='structure_cache')
+    status_df = pd.DataFrame(status)
+    status_df.to_csv(os.path.join('structure_3D', 'status.csv'), index=False)
+    print(status_df['method'].value_counts(dropna=False))
+    print(f'耗时 {time.time() - start:.1f} s, {len(df) / (time.time() - start):.2f} 分子/秒')
@@ -1,80 +1,169 @@
+import numpy as np
 import pandas as pd
-import re
 import os
 
+from dataset_cache import HAS_PYARROW, atomic_write
 
-def extract_prediction_data(input_file_path, output_dir):
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+BLOCK_HEADER = 'Predictions (y,pred,y-pred) by the model of dimension:'
+SUMMARY_HEADER = 'Prediction RMSE and MaxAE'
+PREDICTION_COLUMNS = ['dimension', 'idx', 'label', 'pre', 'delta', 'rmse', 'maxae']
+
+
+def iter_prediction_blocks(input_file_path, chunk_lines=100000):
     """
-    从预测数据文件中提取不同维度的预测结果，并保存为独立的Excel文件
+    逐行流式读取SISSO的 predict_Y.out, 每读完一个维度的数据块返回一次
+
+    数据行先按原文缓存, 每 chunk_lines 行用NumPy整体转换一次, 内存中只保留当前维度的数组
 
     参数:
     input_file_path (str): 原始数据文件路径
-    output_dir (str): 输出Excel文件的目录路径
+    chunk_lines (int): 每次批量转换的行数
 
     返回:
-    list: 生成的Excel文件路径列表
+    迭代器, 每项为 (dimension, data, rmse, maxae); data 为 (n, 3) 数组, 列为 label, pre, delta; 没有汇总行时 rmse/maxae 为 NaN
     """
-    # 确保输出目录存在
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 读取输入文件内容
+    dim = None
     with open(input_file_path, 'r') as f:
-        data = f.read()
-
-    # 分割不同维度的数据块
-    blocks = re.split(r'Predictions \(y,pred,y-pred\) by the model of dimension:\s+', data)[1:]
-
-    output_files = []
-
-    for block in blocks:
-        # 提取维度号和实际数据
-        lines = block.strip().split('\n')
-        if not lines:
-            continue
-
-        dim_line = lines[0]
-        dim = dim_line.split()[0]
-
-        # 移除最后的RMSE行
-        data_lines = [line.strip() for line in lines[1:]
-                      if line.strip() and not line.startswith('Prediction RMSE and MaxAE')]
-
-        # 解析数据
-        records = []
-        for line in data_lines:
-            # 分割数据行
-            values = line.split()
-            if len(values) >= 3:
-                try:
-                    records.append({
-                        'label': float(values[0]),
-                        'pre': float(values[1]),
-                        'delta': float(values[2])
-                    })
-                except ValueError:
-                    # 忽略无法解析的行
-                    continue
+        for line in f:
+            if BLOCK_HEADER in line:
+                if dim is not None:
+                    yield _finish_block(dim, lines, arrays, rmse, maxae)
+                dim = int(line.split(':', 1)[1].split()[0])
+                lines, arrays, rmse, maxae = [], [], np.nan, np.nan
+            elif dim is None:
+                continue
+            elif SUMMARY_HEADER in line:
+                values = _parse_floats(line.split(':', 1)[-1].split())
+                if len(values) >= 2:
+                    rmse, maxae = values[0], values[1]
+            elif line.strip():
+                lines.append(line)
+                if len(lines) >= chunk_lines:
+                    arrays.append(_parse_rows(lines))
+                    lines = []
+    if dim is not None:
+        yield _finish_block(dim, lines, arrays, rmse, maxae)
+
+
+def extract_prediction_data(input_file_path, output_path='predict_Y.parquet', chunk_lines=100000):
+    """
+    从预测数据文件中提取所有维度的预测结果, 写入同一个长表
+
+    Parquet 中每个维度一个 row group, 边读边写, 不需要把整个文件读入内存
 
-        # 创建DataFrame并保存为Excel
-        if records:
-            df = pd.DataFrame(records)
-            filename = f'dimension_{dim}.xlsx'
-            output_path = os.path.join(output_dir, filename)
-            df.to_excel(output_path, index=False)
-            output_files.append(output_path)
-            print(f'已创建文件: {output_path} (维度 {dim}, {len(df)} 行数据)')
-        else:
-            print(f'警告: 维度 {dim} 未找到有效数据')
+    参数:
+    input_file_path (str): 原始数据文件路径
+    output_path (str): 输出路径, 列为 PREDICTION_COLUMNS(idx 为该维度内的行号); 没有pyarrow时改存为csv
+    chunk_lines (int): 每次批量转换的行数
 
-    return output_files
+    返回:
+    pd.DataFrame: 每个维度一行的汇总(dimension, n, rmse, maxae)
+    """
+    if not HAS_PYARROW and output_path.endswith('.parquet'):
+        output_path = output_path[:-len('.parquet')] + '.csv'
+        print(f'警告: 没有安装pyarrow, 结果改存为 {output_path}')
+
+    summary = []
+
+    def write_blocks(tmp_path):
+        writer, n_written = None, 0
+        try:
+            for dim, data, rmse, maxae in iter_prediction_blocks(input_file_path, chunk_lines):
+                summary.append({'dimension': dim, 'n': len(data), 'rmse': rmse, 'maxae': maxae})
+                if not len(data):
+                    print(f'警告: 维度 {dim} 未找到有效数据')
+                    continue
+                print(f'维度 {dim}: {len(data)} 行数据')
+                columns = _block_columns(dim, data, rmse, maxae)
+                if output_path.endswith('.parquet'):
+                    table = pa.table(columns)
+                    if writer is None:
+                        writer = pq.ParquetWriter(tmp_path, table.schema)
+                    writer.write_table(table)
+                else:
+                    pd.DataFrame(columns).to_csv(tmp_path, mode='a', index=False, header=n_written == 0)
+                n_written += len(data)
+        finally:
+            if writer is not None:
+                writer.close()
+        if n_written == 0:
+            # 没有任何数据时也写出一个空表
+            empty = pd.DataFrame(_block_columns(0, np.empty((0, 3)), np.nan, np.nan))
+            if output_path.endswith('.parquet'):
+                empty.to_parquet(tmp_path, index=False)
+            else:
+                empty.to_csv(tmp_path, index=False)
+
+    atomic_write(output_path, write_blocks)
+    print(f'已创建文件: {output_path}')
+    return pd.DataFrame(summary, columns=['dimension', 'n', 'rmse', 'maxae'])
+
+
+def read_prediction_table(path, dimension=None):
+    """
+    读取 extract_prediction_data 生成的长表; 给出 dimension 时只读取该维度(Parquet按row group过滤, 不加载其他维度)
+
+    返回:
+    pd.DataFrame: 列为 PREDICTION_COLUMNS, 可直接传给 plot_r2
+    """
+    if path.endswith('.parquet'):
+        filters = [('dimension', '==', int(dimension))] if dimension is not None else None
+        return pd.read_parquet(path, filters=filters)
+    df = pd.read_csv(path)
+    if dimension is not None:
+        df = df[df['dimension'] == int(dimension)].reset_index(drop=True)
+    return df
+
+
+def _finish_block(dim, lines, arrays, rmse, maxae):
+    if lines:
+        arrays.append(_parse_rows(lines))
+    data = np.concatenate(arrays) if arrays else np.empty((0, 3))
+    return dim, data, rmse, maxae
+
+
+def _parse_rows(lines):
+    # 与原实现一样每行只取前三列; 每行都至少有三列时整块一次转换,
+    # 有不足三列的行或无法解析的内容时退回逐行解析, 跳过坏行
+    fields = [line.split()[:3] for line in lines]
+    if all(len(row) == 3 for row in fields):
+        try:
+            return np.array(fields, dtype=float).reshape(-1, 3)
+        except ValueError:
+            pass
+    rows = [values for values in (_parse_floats(row) for row in fields) if len(values) == 3]
+    return np.array(rows, dtype=float).reshape(-1, 3)
+
+
+def _parse_floats(fields):
+    try:
+        return [float(value) for value in fields]
+    except ValueError:
+        return []
+
+
+def _block_columns(dim, data, rmse, maxae):
+    n = len(data)
+    return {
+        'dimension': np.full(n, dim, dtype=np.int32),
+        'idx': np.arange(n, dtype=np.int64),
+        'label': data[:, 0],
+        'pre': data[:, 1],
+        'delta': data[:, 2],
+        'rmse': np.full(n, rmse),
+        'maxae': np.full(n, maxae),
+    }
 
 
 # 使用示例
 if __name__ == "__main__":
     input_file = "predict_Y.out"  # 替换为实际输入文件路径
-    output_directory = 'test'  # 替换为实际输出目录路径
+    output_file = os.path.join('test', 'predict_Y.parquet')  # 替换为实际输出路径
 
-    created_files = extract_prediction_data(input_file, output_directory)
-    print(f"\n已创建 {len(created_files)} 个文件:")
-    for file in created_files:
-        print(f" - {file}")
\ No newline at end of file
+    summary_df = extract_prediction_data(input_file, output_file)
+    print(summary_df)
\ No newline at end of file
@@ -1,75 +1,188 @@
+import mmap
 import re
 import glob
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset_cache import HAS_PYARROW, atomic_write
+
+
+# 汇总部分每一行对应一个分支, 一行中有多个字段时分支里有多个命名组; 所有分支合成一个正则, 只扫描一遍
+SUMMARY_FIELD_PATTERNS = [
+    rb"Volume:\s*(?P<Volume_Bohr3>[\d.]+)\s+Bohr\^3\s+\(\s*(?P<Volume_Angstrom3>[\d.]+)\s+Angstrom\^3\)",
+    rb"Estimated density[^\n]*?:\s*(?P<Density_gcm3>[\d.]+)\s+g/cm\^3",
+    rb"Minimal value:\s*(?P<Min_value_kcalmol>[-\d.]+)\s+kcal/mol",
+    rb"Maximal value:\s*(?P<Max_value_kcalmol>[-\d.]+)\s+kcal/mol",
+    rb"Overall surface area:[^\n]*?\(\s*(?P<Total_area_Angstrom2>[\d.]+)\s+Angstrom\^2\)",
+    rb"Positive surface area:[^\n]*?\(\s*(?P<Positive_area_Angstrom2>[\d.]+)\s+Angstrom\^2\)",
+    rb"Negative surface area:[^\n]*?\(\s*(?P<Negative_area_Angstrom2>[\d.]+)\s+Angstrom\^2\)",
+    rb"Overall average value:[^\n]*?\(\s*(?P<Average_total_kcalmol>[-\d.]+)\s+kcal/mol\)",
+    rb"Positive average value:[^\n]*?\(\s*(?P<Average_positive_kcalmol>[-\d.]+)\s+kcal/mol\)",
+    rb"Negative average value:[^\n]*?\(\s*(?P<Average_negative_kcalmol>[-\d.]+)\s+kcal/mol\)",
+    rb"Overall variance[^\n]*?:\s*[\d.]+\s+a\.u\.\^2\s+\(\s*(?P<Variance_total>[\d.]+)\s+\(kcal/mol\)\^2\)",
+    rb"Positive variance:[^\n]*?\(\s*(?P<Variance_positive>[\d.]+)\s+\(kcal/mol\)\^2\)",
+    rb"Negative variance:[^\n]*?\(\s*(?P<Variance_negative>[\d.]+)\s+\(kcal/mol\)\^2\)",
+    rb"Balance of charges \(nu\):\s*(?P<Balance_charges_nu>[\d.]+)",
+    rb"Product of sigma\^2_tot and nu:[^\n]*?\(\s*(?P<Product_sigma_nu>[\d.]+)\s+\(kcal/mol\)\^2\)",
+    rb"Internal charge separation \(Pi\):[^\n]*?\(\s*(?P<Internal_charge_separation_kcalmol>[-\d.]+)\s+kcal/mol\)",
+    rb"Molecular polarity index \(MPI\):[^\n]*?\(\s*(?P<MPI_kcalmol>[-\d.]+)\s+kcal/mol\)",
+    rb"Nonpolar surface area[^\n]*?:\s*(?P<Nonpolar_area_Angstrom2>[\d.]+)\s+Angstrom\^2"
+    rb"(?:[^\n]*?\(\s*(?P<Nonpolar_area_percent>[\d.]+)\s+%\))?",
+    rb"Polar surface area[^\n]*?:\s*(?P<Polar_area_Angstrom2>[\d.]+)\s+Angstrom\^2"
+    rb"(?:[^\n]*?\(\s*(?P<Polar_area_percent>[\d.]+)\s+%\))?",
+    rb"Overall skewness:\s*(?P<Skewness_total>[-\d.]+)",
+    rb"Positive skewness:\s*(?P<Skewness_positive>[-\d.]+)",
+    rb"Negative skewness:\s*(?P<Skewness_negative>[-\d.]+)",
+]
+HEADER_FIELD_PATTERNS = [
+    rb"Isosurface area:\s*[\d.]+\s+Bohr\^2\s+\(\s*(?P<Isosurface_area_Angstrom2>[\d.]+)\s+Angstrom\^2\)",
+    rb"Sphericity:\s*(?P<Sphericity>[\d.]+)",
+]
+# 汇总部分很短, 用组合正则扫描; 表头字段按字面量定位后再匹配
+SUMMARY_PATTERN = re.compile(b'|'.join(SUMMARY_FIELD_PATTERNS))
+HEADER_PATTERNS = [(pattern.split(b':')[0], re.compile(pattern)) for pattern in HEADER_FIELD_PATTERNS]
+SUMMARY_TITLE = b"Summary of surface analysis"
+SUMMARY_START_PATTERN = re.compile(rb"=\s*Summary of surface analysis\s*=")
+SUMMARY_END = b"Surface analysis finished!"
+SURFACE_FIELDS = [key for _, pattern in HEADER_PATTERNS for key in pattern.groupindex] + list(SUMMARY_PATTERN.groupindex)
 
 
 def extract_multiwfn_info(filename):
+    """
+    提取Multiwfn表面分析输出中的汇总数据
+
+    文件用mmap读取, 正则全部预编译; Summary of surface analysis 部分用一个组合正则扫描一遍, 字段取第一次出现的值
+    汇总部分和等值面面积、球形度都在输出末尾附近, 因此从文件末尾反向定位(rfind), 不扫描前面大量的中间输出;
+    一个文件中有多次表面分析时取最后一次
+
+    参数:
+    filename (str): Multiwfn输出文件
+
+    返回:
+    dict: 字段名 -> float, 百分比字段也是float; 文件中没有的字段不出现
+    """
+    with open(filename, 'rb') as file:
+        try:
+            content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件不能mmap
+            return {}
+        try:
+            return _scan_multiwfn_output(content)
+        finally:
+            content.close()
+
+
+def _scan_multiwfn_output(content):
     results = {}
+    title = content.rfind(SUMMARY_TITLE)
 
-    with open(filename, 'r') as file:
-        content = file.read()
-
-        # 提取Isosurface area和Sphericity
-        isosurface_match = re.search(r"Isosurface area:\s*[\d.]+\s+Bohr\^2\s+\(\s*([\d.]+)\s+Angstrom\^2\)", content)
-        sphericity_match = re.search(r"Sphericity:\s*([\d.]+)", content)
-
-        if isosurface_match:
-            results['Isosurface_area_Angstrom2'] = float(isosurface_match.group(1))
-        if sphericity_match:
-            results['Sphericity'] = float(sphericity_match.group(1))
-
-        # 提取Summary of surface analysis部分
-        summary_section = re.search(r"=\s*Summary of surface analysis\s*=(.*?)Surface analysis finished!", content,
-                                    re.DOTALL)
-
-        if summary_section:
-            summary = summary_section.group(1)
-
-            # 定义要提取的字段及其正则表达式模式
-            patterns = {
-                'Volume_Bohr3': r"Volume:\s*([\d.]+)\s+Bohr\^3",
-                'Volume_Angstrom3': r"Volume:\s*[\d.]+\s+Bohr\^3\s+\(\s*([\d.]+)\s+Angstrom\^3\)",
-                'Density_gcm3': r"Estimated density.*?:\s*([\d.]+)\s+g/cm\^3",
-                'Min_value_kcalmol': r"Minimal value:\s*([-\d.]+)\s+kcal/mol",
-                'Max_value_kcalmol': r"Maximal value:\s*([-\d.]+)\s+kcal/mol",
-                'Total_area_Angstrom2': r"Overall surface area:.*?\(\s*([\d.]+)\s+Angstrom\^2\)",
-                'Positive_area_Angstrom2': r"Positive surface area:.*?\(\s*([\d.]+)\s+Angstrom\^2\)",
-                'Negative_area_Angstrom2': r"Negative surface area:.*?\(\s*([\d.]+)\s+Angstrom\^2\)",
-                'Average_total_kcalmol': r"Overall average value:.*?\(\s*([-\d.]+)\s+kcal/mol\)",
-                'Average_positive_kcalmol': r"Positive average value:.*?\(\s*([-\d.]+)\s+kcal/mol\)",
-                'Average_negative_kcalmol': r"Negative average value:.*?\(\s*([-\d.]+)\s+kcal/mol\)",
-                'Variance_total': r"Overall variance.*?:\s*[\d.]+\s+a\.u\.\^2\s+\(\s*([\d.]+)\s+\(kcal/mol\)\^2\)",
-                'Variance_positive': r"Positive variance:.*?\(\s*([\d.]+)\s+\(kcal/mol\)\^2\)",
-                'Variance_negative': r"Negative variance:.*?\(\s*([\d.]+)\s+\(kcal/mol\)\^2\)",
-                'Balance_charges_nu': r"Balance of charges \(nu\):\s*([\d.]+)",
-                'Product_sigma_nu': r"Product of sigma\^2_tot and nu:.*?\(\s*([\d.]+)\s+\(kcal/mol\)\^2\)",
-                'Internal_charge_separation_kcalmol': r"Internal charge separation \(Pi\):.*?\(\s*([-\d.]+)\s+kcal/mol\)",
-                'MPI_kcalmol': r"Molecular polarity index \(MPI\):.*?\(\s*([-\d.]+)\s+kcal/mol\)",
-                'Nonpolar_area_Angstrom2': r"Nonpolar surface area.*?:\s*([\d.]+)\s+Angstrom\^2",
-                'Nonpolar_area_percent': r"Nonpolar surface area.*?\(\s*([\d.]+)\s+%\)",
-                'Polar_area_Angstrom2': r"Polar surface area.*?:\s*([\d.]+)\s+Angstrom\^2",
-                'Polar_area_percent': r"Polar surface area.*?\(\s*([\d.]+)\s+%\)",
-                'Skewness_total': r"Overall skewness:\s*([-\d.]+)",
-                'Skewness_positive': r"Positive skewness:\s*([-\d.]+)",
-                'Skewness_negative': r"Negative skewness:\s*([-\d.]+)"
-            }
-
-            for key, pattern in patterns.items():
-                match = re.search(pattern, summary)
-                if match:
-                    # 尝试转换为浮点数（百分比除外）
-                    if 'percent' not in key:
-                        try:
-                            results[key] = float(match.group(1))
-                        except ValueError:
-                            results[key] = match.group(1)
-                    else:
-                        results[key] = match.group(1)
+    # 表头字段在汇总标题之前, 找不到时再在整个文件中查找
+    for literal, pattern in HEADER_PATTERNS:
+        pos = content.rfind(literal, 0, title) if title != -1 else -1
+        if pos == -1:
+            pos = content.find(literal)
+        match = pattern.match(content, pos) if pos != -1 else None
+        if match is not None:
+            _collect_groups(match, results)
 
+    # 从标题附近开始匹配带等号的标题行
+    section = SUMMARY_START_PATTERN.search(content, max(0, title - 200)) if title != -1 else None
+    if section is not None:
+        end = content.find(SUMMARY_END, section.end())
+        if end != -1:
+            for match in SUMMARY_PATTERN.finditer(content, section.end(), end):
+                _collect_groups(match, results)
     return results
 
 
+def _collect_groups(match, results):
+    for key, value in match.groupdict().items():
+        if value is not None and key not in results:
+            try:
+                results[key] = float(value)
+            except ValueError:
+                results[key] = float('nan')
+
+
+STORE_KEY_COLUMNS = ['path', 'size', 'mtime_ns']
+
+
+def scan_surface_outputs(result_dir='surface_result', pattern='*.sufrace_out', store_path='surface_result.parquet',
+                         max_workers=None, chunksize=32, excel_path=None):
+    """
+    扫描目录中的Multiwfn输出并增量更新结果表
+
+    结果表本身就是缓存: 每行记录输出文件的 path/size/mtime_ns, 三者都没变的文件直接沿用旧结果,
+    新增或修改过的文件用进程池重新解析, 已删除的文件从表中去掉
+
+    参数:
+    result_dir (str): 输出文件所在目录
+    pattern (str): 文件名通配符, 文件名去掉扩展名后为分子编号(index)
+    store_path (str): 结果表路径(.parquet, 没有pyarrow时改存为.csv), 可由 fit_model.load_data 直接读取
+    max_workers (int): 解析进程数
+    excel_path (str): 同时导出Excel, None表示不导出
+
+    返回:
+    pd.DataFrame: 按 index 排序的结果表
+    """
+    if not HAS_PYARROW and store_path.endswith('.parquet'):
+        store_path = store_path[:-len('.parquet')] + '.csv'
+        print(f'警告: 没有安装pyarrow, 结果改存为 {store_path}')
+
+    files = []
+    for path in glob.glob(os.path.join(result_dir, pattern)):
+        stat = os.stat(path)
+        files.append({'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+    files = pd.DataFrame(files, columns=STORE_KEY_COLUMNS)
+
+    # 与已有结果比较, 只解析新增或变化的文件
+    cached = _read_store(store_path)
+    if cached is not None:
+        cached = cached.merge(files, on=STORE_KEY_COLUMNS, how='inner')
+        todo = files[~files['path'].isin(cached['path'])]
+    else:
+        todo = files
+    print(f'共 {len(files)} 个输出文件, 沿用缓存 {len(files) - len(todo)} 个, 需要解析 {len(todo)} 个')
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        parsed = list(executor.map(extract_multiwfn_info, todo['path'], chunksize=chunksize))
+    new_df = pd.DataFrame(parsed, columns=SURFACE_FIELDS, index=todo.index, dtype=float)
+    new_df = pd.concat([todo, new_df], axis=1)
+    new_df.insert(0, 'index', [file_index(path) for path in new_df['path']])
+
+    frames = [frame for frame in [cached, new_df] if frame is not None and len(frame)]
+    df = pd.concat(frames, ignore_index=True) if frames else new_df
+    df = df.sort_values('index', kind='stable').reset_index(drop=True)
+    df = df[['index'] + SURFACE_FIELDS + STORE_KEY_COLUMNS]
+    _write_store(df, store_path)
+    if excel_path is not None:
+        df.drop(columns=STORE_KEY_COLUMNS).to_excel(excel_path)
+    return df
+
+
+def file_index(path):
+    # 输出文件名中的分子编号, 如 12.out -> 12
+    stem = os.path.basename(path).split('.')[0]
+    return int(stem) if stem.isdigit() else stem
+
+
+def _read_store(store_path):
+    if not os.path.exists(store_path):
+        return None
+    if store_path.endswith('.parquet'):
+        return pd.read_parquet(store_path)
+    return pd.read_csv(store_path)
+
+
+def _write_store(df, store_path):
+    if store_path.endswith('.parquet'):
+        atomic_write(store_path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+    else:
+        atomic_write(store_path, lambda tmp_path: df.to_csv(tmp_path, index=False))
+
+
 if __name__ == "__main__":
     # filename = "0.sufrace_out"  # 替换为实际文件名
     # results = extract_multiwfn_info(filename)
@@ -78,14 +191,9 @@ if __name__ == "__main__":
     # for key, value in results.items():
     #     print(f"{key}: {value}")
     # print(results)
-    filename_list = [f'{i}.sufrace_out' for i in range(584)]
-    surface_results = []
-    for index, file in enumerate(filename_list):
-        filepath = os.path.join('surface_result', file)
-        result = extract_multiwfn_info(filename=filepath)
-        result['index'] = index
-        surface_results.append(result)
-
-    df = pd.DataFrame(data=surface_results)
+
+    # 只解析新增或修改过的输出文件
+    df = scan_surface_outputs(result_dir='surface_result', pattern='*.sufrace_out',
+                              store_path='surface_result.parquet', max_workers=None,
+                              excel_path='surface_result.xlsx')
     print(df)
-    df.to_excel('surface_result.xlsx')
@@ -0,0 +1,358 @@
+import os
+import numpy as np
+import pandas as pd
+
+from read_sisso_predict import PREDICTION_COLUMNS
+from subset_regression import exhaustive_search, gram_statistics
+
+
+# 运算名 -> (函数, 表达式格式)
+UNARY_OPERATORS = {
+    'sqrt': (np.sqrt, 'sqrt({})'),
+    '^2': (np.square, '({})^2'),
+    'exp': (np.exp, 'exp({})'),
+    'log': (np.log, 'log({})'),
+}
+BINARY_OPERATORS = {
+    '+': (np.add, '({}+{})'),
+    '-': (np.subtract, '({}-{})'),
+    '*': (np.multiply, '({}*{})'),
+    '/': (np.divide, '({}/{})'),
+}
+DEFAULT_OPERATORS = ['+', '-', '*', '/', 'sqrt', '^2', 'exp', 'log']
+# 特征编码中使用的运算序号
+OPERATORS = list(UNARY_OPERATORS) + list(BINARY_OPERATORS)
+OPERATOR_CODES = {op: code for code, op in enumerate(OPERATORS)}
+# 可交换的运算每对特征只生成一次, 其余运算两个方向都生成
+COMMUTATIVE_OPERATORS = {'+', '*'}
+# 最高一层的特征直接进入线性模型, a-b 与 b-a 只差符号, 也只生成一次;
+# 低层的 a-b 还会被 sqrt、log 等继续变换, 两个方向是不同的特征
+SYMMETRIC_OPERATORS = {'+', '-', '*'}
+# 相关系数超过该值的候选特征视为重复
+DUPLICATE_CORRELATION = 0.9999
+
+
+def sisso_fit(X, y, feature_names=None, max_dimension=3, sis_size=20, n_rungs=2, operators=None,
+              max_chunk_mb=128, n_keep=1, max_workers=None, batch_size=20000, max_abs_value=1e8, min_std=1e-8):
+    """
+    SISSO: 由初级特征和运算符构造特征空间, 用确定独立筛选(SIS)选出子空间, 再在子空间中做 ℓ0 穷举回归
+
+    低于 n_rungs 的各层特征全部保存在内存中; 最高一层特征数量很大, 按 max_chunk_mb 分块生成、筛选后即丢弃,
+    每个维度重新生成一遍. 第 d 维的SIS以 d-1 维最优模型的残差为目标, ℓ0 在前 d 次筛选出的特征并集中进行
+
+    参数:
+    X (pd.DataFrame): 初级特征
+    y (array-like): 目标值
+    feature_names (list[str]): 使用的初级特征列, 默认为X的全部列
+    max_dimension (int): 最大描述符维度
+    sis_size (int): 每个维度SIS选出的特征数
+    n_rungs (int): 特征复杂度(运算符嵌套的层数)
+    operators (list[str]): 使用的运算, 见 UNARY_OPERATORS 和 BINARY_OPERATORS
+    max_chunk_mb (float): 最高一层特征每块占用的内存上限(MB)
+    n_keep (int): 每个维度保留的最优模型数
+    max_workers (int): ℓ0 搜索的进程数
+    batch_size (int): ℓ0 搜索中每批求解的组合数
+    max_abs_value (float): 特征绝对值上限, 超过的特征(以及含 nan/inf 的特征)被丢弃
+    min_std (float): 特征标准差下限, 低于该值的常数特征被丢弃
+
+    返回:
+    list[dict]: 每个维度的最优模型, 键为 dimension、features(表达式)、recipes、coef、intercept、rmse、maxae
+                和 candidates(前 n_keep 个模型的 (rmse, features))
+    """
+    if feature_names is None:
+        feature_names = list(X.columns)
+    operators = DEFAULT_OPERATORS if operators is None else operators
+    unary = [op for op in operators if op in UNARY_OPERATORS]
+    binary = [op for op in operators if op in BINARY_OPERATORS]
+    y = np.asarray(y, dtype=float).reshape(-1)
+    n_samples = len(y)
+    # 每块除特征本身外还有中心化等临时数组, 按3倍估计
+    chunk_size = max(1, int(max_chunk_mb * 2 ** 20 / (8 * n_samples * 3)))
+
+    values = np.ascontiguousarray(X[feature_names].to_numpy(dtype=float))
+    keep = _valid_columns(values, max_abs_value, min_std)
+    values, recipes = values[:, keep], [name for name, k in zip(feature_names, keep) if k]
+    prev_start = 0
+    for _ in range(n_rungs - 1):
+        rung_values, rung_recipes = [], []
+        for chunk, keys in _iter_rung(values, prev_start, unary, binary, chunk_size, top_rung=False):
+            keep = _valid_columns(chunk, max_abs_value, min_std)
+            rung_values.append(chunk[:, keep])
+            rung_recipes.extend(_key_to_recipe(key, recipes) for key in keys[keep])
+        prev_start = values.shape[1]
+        values = np.concatenate([values] + rung_values, axis=1)
+        recipes = recipes + rung_recipes
+    print(f'低层特征数: {values.shape[1]}, 每块特征数: {chunk_size}')
+
+    def iter_space():
+        # 先是已保存的低层特征, 再是逐块生成的最高一层
+        for start in range(0, values.shape[1], chunk_size):
+            index = np.arange(start, min(start + chunk_size, values.shape[1]))
+            yield values[:, index], np.column_stack([np.full(len(index), -1), index, np.full(len(index), -1)])
+        if n_rungs > 0:
+            yield from _iter_rung(values, prev_start, unary, binary, chunk_size, top_rung=True)
+
+    models = []
+    subspace_values = np.empty((n_samples, 0))
+    subspace_recipes = []
+    residual = y - y.mean()
+    for dimension in range(1, max_dimension + 1):
+        selected_values, selected_recipes = sure_independence_screening(
+            residual, iter_space(), recipes, sis_size, subspace_values, max_abs_value, min_std)
+        subspace_values = np.concatenate([subspace_values, selected_values], axis=1)
+        subspace_recipes = subspace_recipes + selected_recipes
+        if subspace_values.shape[1] < dimension:
+            print(f'警告: 特征数不足, 停止于维度 {dimension - 1}')
+            break
+
+        top = l0_search(subspace_values, y, dimension, n_keep=n_keep, max_workers=max_workers, batch_size=batch_size)
+        best = list(top[0][1])
+        coef, intercept = _least_squares(subspace_values[:, best], y)
+        pred = subspace_values[:, best] @ coef + intercept
+        residual = y - pred
+        model = {
+            'dimension': dimension,
+            'features': [recipe_to_string(subspace_recipes[i]) for i in best],
+            'recipes': [subspace_recipes[i] for i in best],
+            'coef': coef,
+            'intercept': intercept,
+            'rmse': float(np.sqrt(np.mean(residual ** 2))),
+            'maxae': float(np.max(np.abs(residual))),
+            'candidates': [(float(np.sqrt(max(sse, 0.0) / n_samples)),
+                            [recipe_to_string(subspace_recipes[i]) for i in combo]) for sse, combo in top],
+        }
+        print(f"维度 {dimension}: RMSE {model['rmse']:.6g}, MaxAE {model['maxae']:.6g}, {model['features']}")
+        models.append(model)
+    return models
+
+
+def sure_independence_screening(target, feature_chunks, lower_recipes, sis_size, exclude_values=None,
+                                max_abs_value=1e8, min_std=1e-8):
+    """
+    从逐块给出的特征中选出与 target 相关性(|Pearson r|)最高的 sis_size 个互不重复的特征
+
+    每块的相关系数用一次矩阵乘法计算; 高于当前第 sis_size 名的候选按相关性从高到低逐个检查,
+    与已保留特征(或 exclude_values 中已选特征)几乎完全相关的重复特征在进入缓冲区之前跳过,
+    因此等价的表达式不会占满缓冲区, 只要特征空间中有足够多不重复的特征就能选满 sis_size 个
+
+    参数:
+    target (np.ndarray): 目标(或上一维度的残差)
+    feature_chunks (Iterable): 每项为 (特征矩阵 n×m, 编码 m×3), 见 _iter_rung
+    lower_recipes (list): 编码中下标对应的低层特征
+    exclude_values (np.ndarray): 已选特征, 与其重复的候选不再选择
+
+    返回:
+    (np.ndarray, list): 选出的特征矩阵和对应的 recipe
+    """
+    target = target - target.mean()
+    target_norm = np.linalg.norm(target)
+    n_samples = len(target)
+    excluded = list(_standardize(exclude_values).T) if exclude_values is not None else []
+    # 缓冲区: 当前最优且互不重复的特征, 不超过 sis_size 个
+    best_scores, best_values, best_standardized, best_keys = [], [], [], []
+
+    for chunk, keys in feature_chunks:
+        # target 已中心化, target·chunk 等于与中心化后的特征的内积, 不需要复制出中心化的矩阵
+        var, valid = _column_statistics(chunk, max_abs_value, min_std)
+        with np.errstate(all='ignore'):
+            scores = np.abs(target @ chunk) / (np.sqrt(n_samples * var) * target_norm)
+        threshold = min(best_scores) if len(best_scores) >= sis_size else -np.inf
+        candidates = np.flatnonzero(valid & (scores > threshold))
+
+        for i in candidates[np.argsort(-scores[candidates], kind='stable')]:
+            if len(best_scores) >= sis_size and scores[i] <= min(best_scores):
+                break
+            column = _standardize(chunk[:, i])
+            reference = excluded + best_standardized
+            if reference and np.max(np.abs(np.array(reference) @ column)) / n_samples > DUPLICATE_CORRELATION:
+                continue
+            best_scores.append(scores[i])
+            best_values.append(chunk[:, i])
+            best_standardized.append(column)
+            best_keys.append(keys[i])
+            if len(best_scores) > sis_size:
+                worst = int(np.argmin(best_scores))
+                for buffer in (best_scores, best_values, best_standardized, best_keys):
+                    del buffer[worst]
+
+    if len(best_scores) < sis_size:
+        print(f'警告: 特征空间中只有 {len(best_scores)} 个有效且不重复的特征, 少于 sis_size={sis_size}')
+    order = np.argsort(-np.array(best_scores), kind='stable')
+    print(f'SIS选出 {len(order)} 个特征 (已选 {len(excluded)} 个)')
+    selected_values = np.column_stack([best_values[i] for i in order]) if len(order) else np.empty((n_samples, 0))
+    return selected_values, [_key_to_recipe(best_keys[i], lower_recipes) for i in order]
+
+
+def l0_search(values, y, dimension, n_keep=1, max_workers=None, batch_size=20000):
+    """
+    ℓ0 回归: 在 values 的所有 dimension 个特征的组合中找出最小二乘残差最小的组合, 见 subset_regression.exhaustive_search
+
+    返回:
+    list[(float, tuple)]: 前 n_keep 个 (残差平方和, 特征下标组合), 按残差从小到大
+    """
+    gram, xty, yy = gram_statistics(values, y)
+    return exhaustive_search(gram, xty, yy, dimension, n_keep=n_keep, max_workers=max_workers, batch_size=batch_size)
+
+
+def sisso_predict(model, X):
+    # 用 sisso_fit 返回的模型预测, X 中需要包含表达式用到的初级特征列
+    features = np.column_stack([evaluate_recipe(recipe, X) for recipe in model['recipes']])
+    return features @ model['coef'] + model['intercept']
+
+
+def prediction_table(models, X, y, idx=None):
+    """
+    各维度模型的预测结果, 与 read_sisso_predict 的长表格式相同(列为 PREDICTION_COLUMNS)
+
+    按 dimension 筛选后可直接传给 plot_r2 (列 pre/label)
+    """
+    y = np.asarray(y, dtype=float).reshape(-1)
+    idx = np.arange(len(y)) if idx is None else np.asarray(idx)
+    frames = []
+    for model in models:
+        pre = sisso_predict(model, X)
+        delta = y - pre
+        frames.append(pd.DataFrame({
+            'dimension': np.full(len(y), model['dimension'], dtype=np.int32),
+            'idx': idx,
+            'label': y,
+            'pre': pre,
+            'delta': delta,
+            'rmse': np.sqrt(np.mean(delta ** 2)),
+            'maxae': np.max(np.abs(delta)),
+        }))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PREDICTION_COLUMNS)
+
+
+def evaluate_recipe(recipe, X):
+    # recipe 为初级特征列名, 或 (运算, 子recipe[, 子recipe])
+    if isinstance(recipe, str):
+        return np.asarray(X[recipe], dtype=float)
+    op, *args = recipe
+    func = (UNARY_OPERATORS if len(args) == 1 else BINARY_OPERATORS)[op][0]
+    operands = [evaluate_recipe(arg, X) for arg in args]
+    with np.errstate(all='ignore'):
+        return func(*operands)
+
+
+def recipe_to_string(recipe):
+    if isinstance(recipe, str):
+        return recipe
+    op, *args = recipe
+    template = (UNARY_OPERATORS if len(args) == 1 else BINARY_OPERATORS)[op][1]
+    return template.format(*(recipe_to_string(arg) for arg in args))
+
+
+def _iter_rung(values, prev_start, unary, binary, chunk_size, top_rung=True):
+    # 由已有特征生成新一层, 每项为 (特征矩阵, 编码); 编码每行为 (OPERATOR_CODES 中的运算序号, i, j), 一元运算 j=-1
+    # 新特征至少有一个操作数来自上一层(下标 >= prev_start); top_rung 为最高一层, 见 SYMMETRIC_OPERATORS
+    symmetric = SYMMETRIC_OPERATORS if top_rung else COMMUTATIVE_OPERATORS
+    n_lower = values.shape[1]
+    prev = np.arange(prev_start, n_lower)
+    with np.errstate(all='ignore'):
+        for op in unary:
+            func = UNARY_OPERATORS[op][0]
+            for start in range(0, len(prev), chunk_size):
+                i = prev[start:start + chunk_size]
+                yield func(values[:, i]), _keys(OPERATOR_CODES[op], i, np.full(len(i), -1))
+
+        for i, j in _iter_pairs(prev_start, n_lower, chunk_size):
+            a, b = values[:, i], values[:, j]
+            for op in binary:
+                func = BINARY_OPERATORS[op][0]
+                yield func(a, b), _keys(OPERATOR_CODES[op], i, j)
+                if op not in symmetric:
+                    yield func(b, a), _keys(OPERATOR_CODES[op], j, i)
+
+
+def _iter_pairs(prev_start, n_lower, chunk_size):
+    # 所有 i >= prev_start, j < i 的下标对, 分块给出
+    pending_i, pending_j, size = [], [], 0
+    for i in range(max(prev_start, 1), n_lower):
+        for start in range(0, i, chunk_size):
+            j = np.arange(start, min(i, start + chunk_size))
+            pending_i.append(np.full(len(j), i))
+            pending_j.append(j)
+            size += len(j)
+            if size >= chunk_size:
+                yield np.concatenate(pending_i), np.concatenate(pending_j)
+                pending_i, pending_j, size = [], [], 0
+    if size:
+        yield np.concatenate(pending_i), np.concatenate(pending_j)
+
+
+def _keys(code, i, j):
+    return np.column_stack([np.full(len(i), code), i, j])
+
+
+def _key_to_recipe(key, lower_recipes):
+    code, i, j = (int(v) for v in key)
+    if code == -1:
+        return lower_recipes[i]
+    op = OPERATORS[code]
+    if j == -1:
+        return op, lower_recipes[i]
+    return op, lower_recipes[i], lower_recipes[j]
+
+
+def _valid_columns(values, max_abs_value, min_std):
+    return _column_statistics(values, max_abs_value, min_std)[1]
+
+
+def _column_statistics(values, max_abs_value, min_std):
+    # 一次遍历得到各列方差; 含 nan/inf、超出 max_abs_value 或近似常数的列无效
+    n = len(values)
+    with np.errstate(all='ignore'):
+        mean = values.sum(axis=0) / n
+        mean_square = np.einsum('ij,ij->j', values, values) / n
+        var = mean_square - mean ** 2
+        valid = (np.isfinite(mean_square) & (values.max(axis=0) <= max_abs_value)
+                 & (values.min(axis=0) >= -max_abs_value) & (var > min_std ** 2) & (var > 1e-12 * mean_square))
+    return var, valid
+
+
+def _standardize(values):
+    centered = values - values.mean(axis=0)
+    std = centered.std(axis=0)
+    return centered / np.where(std > 0, std, 1.0)
+
+
+def _least_squares(values, y):
+    # 带截距的最小二乘, 返回 (系数, 截距)
+    design = np.column_stack([values, np.ones(len(y))])
+    solution = np.linalg.lstsq(design, y, rcond=None)[0]
+    return solution[:-1], float(solution[-1])
+
+
+if __name__ == '__main__':
+    from os.path import join
+    from sklearn.model_selection import train_test_split
+
+    from dataset_cache import atomic_write
+    from fit_model import FEATURE_LABELS, load_data
+    from plot_r2 import plot_r2
+
+    target_df_path = join('dataset', 'merged_critic_data.xlsx')
+    feature_df_path = join('dataset', 'surface_result.xlsx')
+    target_df_label = ['Tc/K']
+
+    X, Y = load_data(target_df_path=target_df_path, feature_df_path=feature_df_path,
+                     target_df_label=target_df_label, feature_df_label=FEATURE_LABELS)
+    # 与 fit_model 相同的测试集划分
+    idx_train, idx_test = train_test_split(list(range(len(X))), test_size=0.15, random_state=123)
+
+    models = sisso_fit(X.iloc[idx_train], Y.iloc[idx_train].to_numpy(), feature_names=FEATURE_LABELS,
+                       max_dimension=3, sis_size=20, n_rungs=2, max_workers=None)
+    train_df = prediction_table(models, X.iloc[idx_train], Y.iloc[idx_train].to_numpy(), idx=idx_train)
+    test_df = prediction_table(models, X.iloc[idx_test], Y.iloc[idx_test].to_numpy(), idx=idx_test)
+    atomic_write('sisso_train.parquet', lambda tmp_path: train_df.to_parquet(tmp_path, index=False))
+    atomic_write('sisso_test.parquet', lambda tmp_path: test_df.to_parquet(tmp_path, index=False))
+
+    for model in models:
+        dimension = model['dimension']
+        print(f'维度 {dimension}: y = {model["intercept"]:.6g} '
+              + ' '.join(f'{c:+.6g}*{f}' for c, f in zip(model['coef'], model['features'])))
+        os.makedirs(f'sisso_d{dimension}', exist_ok=True)
+        plot_r2(train_x_y_df_path=train_df[train_df['dimension'] == dimension],
+                test_x_y_df_path=test_df[test_df['dimension'] == dimension],
+                save=True, save_root_path=f'sisso_d{dimension}')
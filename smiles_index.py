@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+from rdkit import Chem
+from rdkit import RDLogger
+
+
+INDEX_COLUMNS = ['SMILES', 'Canonical SMILES', 'InChIKey']
+
+
+def canonicalize_smiles(smiles):
+    # 返回 (canonical SMILES, InChIKey); 无法解析的SMILES保留原字符串, InChIKey为None
+    mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        return smiles, None
+    inchikey = Chem.MolToInchiKey(mol) or None
+    return Chem.MolToSmiles(mol), inchikey
+
+
+def load_smiles_index(index_path='smiles_index.csv'):
+    if not os.path.exists(index_path):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(index_path, dtype=str, keep_default_na=False, na_values=[''])
+
+
+def update_smiles_index(smiles_list, index_path='smiles_index.csv'):
+    """
+    把 smiles_list 中尚未出现在索引里的SMILES规范化并追加写入索引文件, 每个不同的字符串只计算一次
+
+    参数:
+    smiles_list (Iterable[str]): 输入SMILES
+    index_path (str): 索引文件路径(csv)
+
+    返回:
+    pd.DataFrame: 完整索引, 列为 SMILES, Canonical SMILES, InChIKey
+    """
+    index_df = load_smiles_index(index_path)
+    known = set(index_df['SMILES'])
+    new_smiles = [s for s in pd.unique(pd.Series(list(smiles_list), dtype=object).dropna().astype(str))
+                  if s not in known]
+
+    if new_smiles:
+        RDLogger.DisableLog('rdApp.*')
+        try:
+            records = [(s, *canonicalize_smiles(s)) for s in new_smiles]
+        finally:
+            RDLogger.EnableLog('rdApp.*')
+        new_df = pd.DataFrame(records, columns=INDEX_COLUMNS)
+        new_df.to_csv(index_path, mode='a', header=not os.path.exists(index_path), index=False)
+        index_df = pd.concat([index_df, new_df], ignore_index=True)
+
+    return index_df
+
+
+def map_smiles(smiles, index_path='smiles_index.csv'):
+    # 返回与输入对齐的 DataFrame(Canonical SMILES, InChIKey), 必要时先更新索引
+    smiles = pd.Series(smiles)
+    index_df = update_smiles_index(smiles, index_path=index_path).drop_duplicates('SMILES').set_index('SMILES')
+    mapped = index_df.reindex(smiles.astype(str).to_numpy())
+    mapped.index = smiles.index
+    mapped.loc[smiles.isna().to_numpy(), 'Canonical SMILES'] = None
+    return mapped
+
+
+def canonicalize_smiles_column(df, index_path='smiles_index.csv', smiles_column='SMILES'):
+    # 用规范SMILES替换 smiles_column, 并添加 InChIKey 列
+    df = df.copy()
+    mapped = map_smiles(df[smiles_column], index_path=index_path)
+    df[smiles_column] = mapped['Canonical SMILES']
+    df['InChIKey'] = mapped['InChIKey']
+    return df
+
+
+if __name__ == '__main__':
+    df = pd.read_excel('merged_critic_data.xlsx')
+    index_df = update_smiles_index(df['SMILES'], index_path='smiles_index.csv')
+    print(index_df)
+    print(f"{len(index_df)} 个SMILES, 对应 {index_df['Canonical SMILES'].nunique()} 个不同分子")
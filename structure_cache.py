@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import time
+
+from dataset_cache import atomic_write
+from smiles_index import canonicalize_smiles
+
+
+# 条目状态: PubChem命中 / PubChem无此化合物 / 有CID但没有3D记录 / 本地生成的结构
+PUBCHEM_HIT = 'pubchem'
+NO_CID = 'no_cid'
+NO_3D = 'no_3d'
+
+
+def structure_cache_key(smiles):
+    """
+    由SMILES计算缓存键: 优先使用InChIKey, 无法生成InChIKey时用规范SMILES的sha1
+
+    返回:
+    (str, str): (缓存键, 规范SMILES)
+    """
+    canonical_smiles, inchikey = canonicalize_smiles(smiles)
+    if inchikey:
+        return inchikey, canonical_smiles
+    return 'SMI-' + hashlib.sha1(canonical_smiles.encode()).hexdigest(), canonical_smiles
+
+
+def lookup_structure(cache_dir, key, slot, fixture_dir=None):
+    """
+    查询缓存条目
+
+    参数:
+    cache_dir (str): 缓存目录
+    key (str): structure_cache_key 返回的缓存键
+    slot (str): 'pubchem' 或本地生成方法名(如 'rdkit', 'rdkit_conformers_50')
+    fixture_dir (str): 只读的预置缓存目录(与cache_dir结构相同), 缓存未命中时查询, 可用于测试或离线运行
+
+    返回:
+    (dict, str) 或 None: (元数据, SDF文本或None)
+    """
+    for root in [cache_dir, fixture_dir]:
+        if root is None:
+            continue
+        meta_path = _entry_path(root, key, slot, 'json')
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        sdf = None
+        if meta.get('has_sdf'):
+            try:
+                with open(_entry_path(root, key, slot, 'sdf'), 'r') as f:
+                    sdf = f.read()
+            except OSError:
+                continue
+        if root == cache_dir:
+            # 记录访问时间, 供按LRU淘汰
+            os.utime(meta_path)
+        return meta, sdf
+    return None
+
+
+def store_structure(cache_dir, key, slot, meta, sdf=None):
+    meta = dict(meta, key=key, slot=slot, has_sdf=sdf is not None, created=time.time())
+    if sdf is not None:
+        atomic_write(_entry_path(cache_dir, key, slot, 'sdf'), lambda tmp_path: _write_text(tmp_path, sdf))
+    # 元数据最后写入, 读到元数据即说明SDF已完整
+    text = json.dumps(meta, ensure_ascii=False)
+    atomic_write(_entry_path(cache_dir, key, slot, 'json'), lambda tmp_path: _write_text(tmp_path, text))
+
+
+def evict_structure_cache(cache_dir, max_bytes):
+    # 缓存总大小超过 max_bytes 时, 按最近访问时间从旧到新删除条目
+    entries = {}
+    for dir_path, _, file_names in os.walk(cache_dir):
+        for file_name in file_names:
+            if file_name.endswith('.tmp'):
+                continue
+            path = os.path.join(dir_path, file_name)
+            entry = entries.setdefault(file_name.rsplit('.', 1)[0], {'paths': [], 'size': 0, 'atime': 0.0})
+            stat = os.stat(path)
+            entry['paths'].append(path)
+            entry['size'] += stat.st_size
+            if file_name.endswith('.json'):
+                entry['atime'] = stat.st_mtime
+
+    total_size = sum(entry['size'] for entry in entries.values())
+    n_evicted = 0
+    for entry in sorted(entries.values(), key=lambda e: e['atime']):
+        if total_size <= max_bytes:
+            break
+        for path in entry['paths']:
+            os.remove(path)
+        total_size -= entry['size']
+        n_evicted += 1
+    return n_evicted
+
+
+def _entry_path(root, key, slot, extension):
+    return os.path.join(root, key[:2], f'{key}.{slot}.{extension}')
+
+
+def _write_text(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
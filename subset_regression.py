@@ -0,0 +1,212 @@
+import itertools
+import math
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+SUBSET_COLUMNS = ['size', 'rank', 'features', 'indices', 'sse', 'rmse', 'r2']
+
+
+def subset_regression(X, y, max_size=4, method='exhaustive', n_keep=10, beam_width=100, feature_names=None,
+                      max_workers=None, batch_size=20000):
+    """
+    特征子集回归: 对子集大小 1 ~ max_size, 找出带截距最小二乘残差最小的特征组合
+
+    只计算一次中心化的 XᵀX 和 Xᵀy, 每个子集的回归只需从中取出小矩阵求解, 一批子集的小方程组叠在一起批量求解
+
+    参数:
+    X (pd.DataFrame | np.ndarray): 候选特征
+    y (array-like): 目标值
+    max_size (int): 最大子集大小
+    method (str): 'exhaustive' 穷举所有组合(进程池并行); 'beam' 逐步加入一个特征, 每步保留 beam_width 个最优子集
+    n_keep (int): 每个大小保留的子集数
+    feature_names (list[str]): 特征名, 默认取X的列名
+    max_workers (int): 穷举时的进程数
+    batch_size (int): 每批求解的子集数
+
+    返回:
+    pd.DataFrame: 列为 SUBSET_COLUMNS, 每个大小按残差从小到大排列
+    """
+    if feature_names is None:
+        feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else [str(i) for i in range(X.shape[1])]
+    values = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float).reshape(-1)
+    gram, xty, yy = gram_statistics(values, y)
+    max_size = min(max_size, values.shape[1])
+
+    if method == 'exhaustive':
+        results = {size: exhaustive_search(gram, xty, yy, size, n_keep=n_keep, max_workers=max_workers,
+                                           batch_size=batch_size) for size in range(1, max_size + 1)}
+    elif method == 'beam':
+        results = beam_search(gram, xty, yy, max_size, beam_width=beam_width, n_keep=n_keep, batch_size=batch_size)
+    else:
+        raise ValueError(f'未知的搜索方法: {method}')
+
+    records = []
+    for size, top in results.items():
+        for rank, (sse, combo) in enumerate(top):
+            sse = max(sse, 0.0)
+            records.append({'size': size, 'rank': rank, 'features': [feature_names[i] for i in combo],
+                            'indices': list(combo), 'sse': sse, 'rmse': np.sqrt(sse / len(y)),
+                            'r2': 1 - sse / yy if yy > 0 else np.nan})
+    return pd.DataFrame(records, columns=SUBSET_COLUMNS)
+
+
+def gram_statistics(values, y):
+    # 中心化后的 XᵀX、Xᵀy、yᵀy; 中心化相当于在每个子集回归中包含截距
+    centered = values - values.mean(axis=0)
+    y_centered = y - y.mean()
+    return centered.T @ centered, centered.T @ y_centered, float(y_centered @ y_centered)
+
+
+def exhaustive_search(gram, xty, yy, size, n_keep=10, max_workers=None, batch_size=20000):
+    """
+    穷举所有 size 个特征的组合
+
+    组合按第一个特征的下标分段, 每段由一个进程自行生成组合并只返回段内最优的 n_keep 个,
+    进程之间只传递Gram矩阵(启动时一次)和段的范围; 组合总数不超过 batch_size 时在当前进程中计算
+
+    返回:
+    list[(float, tuple)]: 前 n_keep 个 (残差平方和, 特征下标组合), 按残差从小到大
+    """
+    n_features = len(xty)
+    if size > n_features:
+        return []
+    ranges = _first_index_ranges(n_features, size, batch_size)
+    if math.comb(n_features, size) <= batch_size:
+        results = [_search_range(gram, xty, yy, size, first, n_keep, batch_size) for first in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(gram, xty, yy)) as executor:
+            results = list(executor.map(_search_range_worker, [size] * len(ranges), ranges,
+                                        [n_keep] * len(ranges), [batch_size] * len(ranges)))
+    return _merge_top(results, n_keep)
+
+
+def beam_search(gram, xty, yy, max_size, beam_width=100, n_keep=10, batch_size=20000):
+    """
+    束搜索: 从大小为1的全部子集开始, 每步给当前保留的子集各加入一个特征, 保留残差最小的 beam_width 个
+
+    返回:
+    dict: 子集大小 -> 前 n_keep 个 (残差平方和, 特征下标组合)
+    """
+    n_features = len(xty)
+    results = {}
+    beam = np.arange(n_features).reshape(-1, 1)
+    for size in range(1, max_size + 1):
+        if size > 1:
+            # 每个子集加入一个不在其中的特征, 排序后去重
+            extended = np.concatenate([np.repeat(beam, n_features, axis=0),
+                                       np.tile(np.arange(n_features), len(beam)).reshape(-1, 1)], axis=1)
+            extended = extended[~(extended[:, :-1] == extended[:, -1:]).any(axis=1)]
+            beam = np.unique(np.sort(extended, axis=1), axis=0)
+        if not len(beam):
+            break
+        sse = np.concatenate([subset_sse(gram, xty, yy, beam[start:start + batch_size])
+                              for start in range(0, len(beam), batch_size)])
+        order = np.argsort(sse, kind='stable')
+        results[size] = [(float(sse[i]), tuple(int(j) for j in beam[i])) for i in order[:n_keep]]
+        beam = beam[order[:beam_width]]
+    return results
+
+
+def subset_sse(gram, xty, yy, combos):
+    """
+    批量计算子集回归的残差平方和
+
+    每个组合解 (X_sᵀX_s) w = X_sᵀy, 残差平方和为 yᵀy - (X_sᵀy)ᵀw; 所有组合的小方程组叠成 (m, k, k) 一次求解
+
+    参数:
+    combos (np.ndarray): (m, k) 的特征下标
+
+    返回:
+    np.ndarray: (m,) 残差平方和
+    """
+    g = gram[combos[:, :, None], combos[:, None, :]]
+    b = xty[combos]
+    try:
+        w = np.linalg.solve(g, b[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # 有奇异矩阵(共线的组合)时整批改用伪逆
+        w = np.einsum('mij,mj->mi', np.linalg.pinv(g), b)
+    return yy - np.einsum('mi,mi->m', b, w)
+
+
+def _first_index_ranges(n_features, size, batch_size):
+    # 按组合的第一个下标分段, 每段的组合数约为 batch_size (第一个下标为 i 的组合有 C(n-1-i, size-1) 个)
+    ranges, start, count = [], 0, 0
+    for first in range(n_features - size + 1):
+        count += math.comb(n_features - 1 - first, size - 1)
+        if count >= batch_size:
+            ranges.append((start, first + 1))
+            start, count = first + 1, 0
+    if start < n_features - size + 1:
+        ranges.append((start, n_features - size + 1))
+    return ranges
+
+
+def _search_range(gram, xty, yy, size, first_range, n_keep, batch_size):
+    n_features = len(xty)
+    results = []
+    for first in range(*first_range):
+        rest = itertools.combinations(range(first + 1, n_features), size - 1)
+        while True:
+            batch = list(itertools.islice(rest, batch_size))
+            if not batch:
+                break
+            batch = np.array(batch, dtype=np.int64).reshape(len(batch), size - 1)
+            combos = np.concatenate([np.full((len(batch), 1), first), batch], axis=1)
+            sse = subset_sse(gram, xty, yy, combos)
+            top = np.argsort(sse, kind='stable')[:n_keep]
+            results.append((sse[top], combos[top]))
+    # 段内只返回最优的 n_keep 个
+    sse, combos = _concatenate_top(results, size)
+    top = np.argsort(sse, kind='stable')[:n_keep]
+    return sse[top], combos[top]
+
+
+def _merge_top(results, n_keep):
+    sse, combos = _concatenate_top(results, 0)
+    order = np.argsort(sse, kind='stable')[:n_keep]
+    return [(float(sse[i]), tuple(int(j) for j in combos[i])) for i in order]
+
+
+def _concatenate_top(results, size):
+    if not results:
+        return np.empty(0), np.empty((0, size), dtype=np.int64)
+    return np.concatenate([sse for sse, _ in results]), np.concatenate([combos for _, combos in results])
+
+
+_WORKER_STATE = {}
+
+
+def _init_worker(gram, xty, yy):
+    # Gram矩阵只在启动进程时传一次
+    _WORKER_STATE.update(gram=gram, xty=xty, yy=yy)
+
+
+def _search_range_worker(size, first_range, n_keep, batch_size):
+    return _search_range(_WORKER_STATE['gram'], _WORKER_STATE['xty'], _WORKER_STATE['yy'], size, first_range,
+                         n_keep, batch_size)
+
+
+if __name__ == '__main__':
+    from os.path import join
+    from feature_expr import apply_feature_expressions
+    from fit_model import FEATURE_EXPRESSIONS, FEATURE_LABELS, load_data
+
+    target_df_path = join('dataset', 'merged_critic_data.xlsx')
+    feature_df_path = join('dataset', 'surface_result.xlsx')
+    target_df_label = ['Tc/K']
+
+    X, Y = load_data(target_df_path=target_df_path, feature_df_path=feature_df_path,
+                     target_df_label=target_df_label, feature_df_label=FEATURE_LABELS)
+    X = apply_feature_expressions(X, FEATURE_EXPRESSIONS)
+
+    df = subset_regression(X, Y[target_df_label[0]], max_size=4, method='exhaustive', n_keep=10)
+    df.to_csv('subset_regression.csv', index=False)
+    for size, group in df.groupby('size'):
+        best = group.iloc[0]
+        print(f"{size} 个特征: RMSE {best['rmse']:.4f}, R2 {best['r2']:.4f}, {best['features']}")
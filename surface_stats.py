@@ -0,0 +1,220 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+
+HARTREE_TO_KCALMOL = 627.5095
+BOHR_TO_ANGSTROM = 0.529177210903
+# 与Multiwfn相同, |ESP| <= 10 kcal/mol 的表面为非极性表面
+POLAR_THRESHOLD_KCALMOL = 10.0
+# 直方图默认区间(kcal/mol), 两端的区间包括超出范围的值
+DEFAULT_HISTOGRAM_EDGES = np.arange(-50.0, 50.1, 10.0)
+
+
+def read_surface_vertices(vertex_path, facet_path, value_unit='au', length_unit='angstrom'):
+    """
+    读取Multiwfn导出的表面顶点(vtx.txt)和三角面片(facet.pdb), 返回每个顶点的函数值和所代表的面积
+
+    vtx.txt 第一行为顶点数, 之后每行 x y z 函数值, 没有面积; 每个面片的面积平均分给它的三个顶点,
+    顶点面积之和等于表面积, 面积加权平均值与Multiwfn按面片(取三个顶点的均值)统计的结果相同
+    facet.pdb 中每条 CONECT 记录为一个面片, 顶点序号从1开始, 与 vtx.txt 中的顶点顺序一致
+
+    参数:
+    vertex_path (str): 顶点文件
+    facet_path (str): 面片文件
+    value_unit (str): 函数值单位, 'au' 转换为 kcal/mol, 'kcalmol' 不转换
+    length_unit (str): 顶点坐标单位, 'angstrom' 或 'bohr'
+
+    返回:
+    (np.ndarray, np.ndarray): (函数值 kcal/mol, 面积 Angstrom^2)
+    """
+    with open(vertex_path, 'r') as f:
+        first_line = f.readline().split()
+    data = np.loadtxt(vertex_path, skiprows=1 if len(first_line) == 1 else 0, usecols=(0, 1, 2, 3), ndmin=2)
+    coords = data[:, :3] * (BOHR_TO_ANGSTROM if length_unit == 'bohr' else 1.0)
+    values = data[:, 3] * (HARTREE_TO_KCALMOL if value_unit == 'au' else 1.0)
+
+    facets = read_surface_facets(facet_path)
+    if facets.size and (facets.min() < 0 or facets.max() >= len(values)):
+        raise ValueError(f'{facet_path} 中的顶点序号超出 {vertex_path} 的顶点数 {len(values)}')
+    return values, vertex_areas(coords, facets)
+
+
+def read_surface_facets(path):
+    # facet.pdb 的 CONECT 记录 -> (n, 3) 的顶点序号数组(从0开始)
+    with open(path, 'r') as f:
+        facets = [line.split()[1:4] for line in f if line.startswith('CONECT')]
+    return np.array(facets, dtype=np.int64).reshape(-1, 3) - 1
+
+
+def vertex_areas(coords, facets):
+    # 每个顶点的面积为相邻三角面片面积之和的1/3
+    a, b, c = coords[facets[:, 0]], coords[facets[:, 1]], coords[facets[:, 2]]
+    facet_areas = 0.5 * np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    return np.bincount(facets.ravel(), weights=np.repeat(facet_areas, 3), minlength=len(coords)) / 3
+
+
+def build_surface_cache(vertex_paths, facet_paths, index_list=None, cache_path='surface_vertices.npz',
+                        max_workers=None, **read_kwargs):
+    """
+    把所有分子的顶点数据拼接为一组数组存入 .npz: values, areas, offsets(第i个分子为 offsets[i]:offsets[i+1]), index
+
+    参数:
+    vertex_paths, facet_paths (Sequence[str]): 一一对应的顶点和面片文件, 见 read_surface_vertices
+
+    返回:
+    dict: 与 load_surface_cache 相同
+    """
+    vertex_paths, facet_paths = list(vertex_paths), list(facet_paths)
+    if len(vertex_paths) != len(facet_paths):
+        raise ValueError(f'顶点文件 {len(vertex_paths)} 个, 面片文件 {len(facet_paths)} 个, 数量不一致')
+    if index_list is None:
+        index_list = [os.path.basename(path).split('.')[0] for path in vertex_paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        arrays = list(executor.map(_read_surface_vertices_kwargs, vertex_paths, facet_paths,
+                                   [read_kwargs] * len(vertex_paths)))
+
+    counts = np.array([len(values) for values, _ in arrays], dtype=np.int64)
+    cache = {
+        'index': np.asarray(list(index_list)),
+        'values': np.concatenate([values for values, _ in arrays]) if arrays else np.empty(0),
+        'areas': np.concatenate([areas for _, areas in arrays]) if arrays else np.empty(0),
+        'offsets': np.concatenate([[0], np.cumsum(counts)]),
+    }
+    np.savez(cache_path, **cache)
+    return cache
+
+
+def load_surface_cache(cache_path='surface_vertices.npz'):
+    with np.load(cache_path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def surface_descriptors(values, areas, offsets, index=None, polar_threshold=POLAR_THRESHOLD_KCALMOL,
+                        histogram_edges=DEFAULT_HISTOGRAM_EDGES):
+    """
+    由表面顶点的函数值和面积计算面积加权的表面描述符, 所有分子一次向量化计算
+
+    列名与 read_surface_data.extract_multiwfn_info 相同(静电势单位 kcal/mol, 面积 Angstrom^2),
+    另外给出总体方差、峰度和按 histogram_edges 分区间的面积分数(Hist_a_b)
+
+    参数:
+    values (np.ndarray): 所有分子顶点的函数值拼接在一起
+    areas (np.ndarray): 对应的面积
+    offsets (np.ndarray): 第i个分子为 values[offsets[i]:offsets[i+1]]
+    index (Sequence): 分子编号
+    polar_threshold (float): 极性/非极性表面的分界(kcal/mol)
+    histogram_edges (np.ndarray): 直方图区间边界, None 表示不计算
+
+    返回:
+    pd.DataFrame: 每个分子一行
+    """
+    values = np.asarray(values, dtype=float)
+    areas = np.asarray(areas, dtype=float)
+    counts = np.diff(offsets)
+    n_mol = len(counts)
+    group = np.repeat(np.arange(n_mol), counts)
+
+    def area_sum(weights):
+        return np.bincount(group, weights=weights, minlength=n_mol)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        positive = values > 0
+        negative = values < 0
+        total_area = area_sum(areas)
+        positive_area = area_sum(areas * positive)
+        negative_area = area_sum(areas * negative)
+
+        average = area_sum(areas * values) / total_area
+        average_positive = area_sum(areas * values * positive) / positive_area
+        average_negative = area_sum(areas * values * negative) / negative_area
+
+        deviation = values - average[group]
+        deviation_positive = np.where(positive, values - average_positive[group], 0.0)
+        deviation_negative = np.where(negative, values - average_negative[group], 0.0)
+        variance = area_sum(areas * deviation ** 2) / total_area
+        variance_positive = area_sum(areas * deviation_positive ** 2) / positive_area
+        variance_negative = area_sum(areas * deviation_negative ** 2) / negative_area
+        variance_total = variance_positive + variance_negative
+        nu = variance_positive * variance_negative / variance_total ** 2
+
+        nonpolar_area = area_sum(areas * (np.abs(values) <= polar_threshold))
+        polar_area = total_area - nonpolar_area
+
+        descriptors = {
+            'Min_value_kcalmol': _group_reduce(np.minimum, values, offsets),
+            'Max_value_kcalmol': _group_reduce(np.maximum, values, offsets),
+            'Total_area_Angstrom2': total_area,
+            'Positive_area_Angstrom2': positive_area,
+            'Negative_area_Angstrom2': negative_area,
+            'Average_total_kcalmol': average,
+            'Average_positive_kcalmol': average_positive,
+            'Average_negative_kcalmol': average_negative,
+            'Variance_total': variance_total,
+            'Variance_positive': variance_positive,
+            'Variance_negative': variance_negative,
+            'Balance_charges_nu': nu,
+            'Product_sigma_nu': variance_total * nu,
+            'Internal_charge_separation_kcalmol': area_sum(areas * np.abs(deviation)) / total_area,
+            'MPI_kcalmol': area_sum(areas * np.abs(values)) / total_area,
+            'Nonpolar_area_Angstrom2': nonpolar_area,
+            'Nonpolar_area_percent': 100 * nonpolar_area / total_area,
+            'Polar_area_Angstrom2': polar_area,
+            'Polar_area_percent': 100 * polar_area / total_area,
+            'Skewness_total': area_sum(areas * deviation ** 3) / total_area / variance ** 1.5,
+            'Skewness_positive': area_sum(areas * deviation_positive ** 3) / positive_area / variance_positive ** 1.5,
+            'Skewness_negative': area_sum(areas * deviation_negative ** 3) / negative_area / variance_negative ** 1.5,
+            'Variance_overall': variance,
+            'Kurtosis_total': area_sum(areas * deviation ** 4) / total_area / variance ** 2 - 3,
+        }
+
+        if histogram_edges is not None:
+            n_bins = len(histogram_edges) - 1
+            bins = np.clip(np.searchsorted(histogram_edges, values, side='right') - 1, 0, n_bins - 1)
+            histogram = np.bincount(group * n_bins + bins, weights=areas, minlength=n_mol * n_bins)
+            histogram = histogram.reshape(n_mol, n_bins) / total_area[:, None]
+            for b in range(n_bins):
+                descriptors[f'Hist_{histogram_edges[b]:g}_{histogram_edges[b + 1]:g}'] = histogram[:, b]
+
+    df = pd.DataFrame(descriptors)
+    if index is not None:
+        df.insert(0, 'index', list(index))
+    return df
+
+
+def descriptors_from_cache(cache_path='surface_vertices.npz', **kwargs):
+    cache = load_surface_cache(cache_path)
+    return surface_descriptors(cache['values'], cache['areas'], cache['offsets'], index=cache['index'], **kwargs)
+
+
+def _group_reduce(ufunc, values, offsets):
+    # 空分子(没有顶点)的结果为 NaN
+    result = np.full(len(offsets) - 1, np.nan)
+    nonempty = np.diff(offsets) > 0
+    if nonempty.any():
+        result[nonempty] = ufunc.reduceat(values, offsets[:-1][nonempty])
+    return result
+
+
+def _read_surface_vertices_kwargs(vertex_path, facet_path, read_kwargs):
+    return read_surface_vertices(vertex_path, facet_path, **read_kwargs)
+
+
+if __name__ == '__main__':
+    import glob
+    from dataset_cache import atomic_write
+    from multiwfn_driver import FACET_SUFFIX, VERTEX_SUFFIX
+
+    # 顶点文件只需读取一次, 之后修改或新增描述符只需在缓存的数组上重新计算
+    # 顶点和面片文件由 multiwfn_driver 导出到 surface_result
+    cache_path = 'surface_vertices.npz'
+    if not os.path.exists(cache_path):
+        vertex_paths = sorted(glob.glob(os.path.join('surface_result', f'*{VERTEX_SUFFIX}')),
+                              key=lambda path: int(os.path.basename(path).split('.')[0]))
+        facet_paths = [path[:-len(VERTEX_SUFFIX)] + FACET_SUFFIX for path in vertex_paths]
+        build_surface_cache(vertex_paths, facet_paths, cache_path=cache_path)
+    df = descriptors_from_cache(cache_path)
+    df['index'] = df['index'].astype(int)
+    atomic_write('surface_descriptors.parquet', lambda tmp_path: df.to_parquet(tmp_path, index=False))
+    print(df)
@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+
+
+def run_tasks(func, tasks, max_workers=None, timeout=None):
+    """
+    在子进程中逐个运行 func(*task), 超时和进程崩溃由主进程处理
+
+    RDKit/OpenBabel 的计算在C++代码中进行, 子进程内的 SIGALRM 要等到回到Python字节码才会生效, 无法按时打断;
+    这里由主进程计时, 超时的子进程直接kill并换一个新进程. 子进程崩溃(如段错误)只影响它正在运行的任务
+    进程会被复用, 不是每个任务启动一个新进程; tasks 按需读取, 同时在途的任务数等于进程数
+
+    参数:
+    func: 模块级函数(需要能被pickle)
+    tasks (Iterable[tuple]): 每项为 func 的位置参数
+    max_workers (int): 进程数, 默认为CPU核数
+    timeout (float): 单个任务的超时时间(秒), None表示不限制
+
+    返回:
+    generator: 按完成顺序给出 (task序号, status, value); status 为 'ok'(value为返回值)、'error'(value为异常的repr)、
+               'timeout' 或 'crash'(value为说明)
+    """
+    context = multiprocessing.get_context()
+    max_workers = max_workers or os.cpu_count()
+    tasks = enumerate(tasks)
+    workers = []
+    try:
+        while True:
+            # 给空闲进程分配任务, 进程数不足时启动新进程
+            for worker in workers + [None] * (max_workers - len(workers)):
+                if worker is not None and worker['task'] is not None:
+                    continue
+                item = next(tasks, None)
+                if item is None:
+                    break
+                if worker is None:
+                    worker = _start_worker(context, func)
+                    workers.append(worker)
+                worker['conn'].send(item[1])
+                worker['task'] = item[0]
+                worker['deadline'] = None if timeout is None else time.monotonic() + timeout
+
+            busy = [worker for worker in workers if worker['task'] is not None]
+            if not busy:
+                break
+            deadlines = [worker['deadline'] for worker in busy if worker['deadline'] is not None]
+            wait_seconds = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            wait([worker['conn'] for worker in busy] + [worker['process'].sentinel for worker in busy],
+                 timeout=wait_seconds)
+
+            finished = []
+            now = time.monotonic()
+            for worker in busy:
+                i = worker['task']
+                if worker['conn'].poll():
+                    try:
+                        status, value = worker['conn'].recv()
+                    except EOFError:
+                        status, value = 'crash', _exit_message(worker)
+                        _stop_worker(worker, workers)
+                    worker['task'] = None
+                    finished.append((i, status, value))
+                elif not worker['process'].is_alive():
+                    finished.append((i, 'crash', _exit_message(worker)))
+                    _stop_worker(worker, workers)
+                elif worker['deadline'] is not None and now >= worker['deadline']:
+                    finished.append((i, 'timeout', f'超过 {timeout} 秒'))
+                    _stop_worker(worker, workers)
+            yield from finished
+    finally:
+        for worker in list(workers):
+            _stop_worker(worker, workers)
+
+
+def _start_worker(context, func):
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_worker_loop, args=(child_conn, func), daemon=True)
+    process.start()
+    child_conn.close()
+    return {'process': process, 'conn': parent_conn, 'task': None, 'deadline': None}
+
+
+def _stop_worker(worker, workers):
+    if worker['process'].is_alive():
+        worker['process'].kill()
+    worker['process'].join()
+    worker['conn'].close()
+    workers.remove(worker)
+
+
+def _exit_message(worker):
+    worker['process'].join(timeout=1)
+    return f"子进程异常退出, exitcode {worker['process'].exitcode}"
+
+
+def _worker_loop(conn, func):
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = ('ok', func(*args))
+        except Exception as e:
+            result = ('error', repr(e))
+        conn.send(result)
@@ -0,0 +1,95 @@
+from gaussian_log import job_progress, parse_gaussian_log
+
+
+GJF = """%chk=methane.chk
+# opt freq b3lyp/6-31g(d)
+
+methane
+
+0 1
+C    0.000000    0.000000    0.000000
+H    0.629118    0.629118    0.629118
+H   -0.629118   -0.629118    0.629118
+H   -0.629118    0.629118   -0.629118
+H    0.629118   -0.629118   -0.629118
+
+"""
+
+ORIENTATION = """                          Standard orientation:
+ ---------------------------------------------------------------------
+ Center     Atomic      Atomic             Coordinates (Angstroms)
+ Number     Number       Type             X           Y           Z
+ ---------------------------------------------------------------------
+      1          6           0        0.000000    0.000000    0.000000
+      2          1           0        0.629118    0.629118    0.629118
+      3          1           0       -0.629118   -0.629118    0.629118
+      4          1           0       -0.629118    0.629118   -0.629118
+      5          1           0        0.629118   -0.629118   -0.629118
+ ---------------------------------------------------------------------
+"""
+
+# opt 超过最大步数时 l9999 的结尾: link_exit 和 Lnk1e 两行都是 Error termination
+OPT_FAILED_TAIL = """ SCF Done:  E(RB3LYP) =  -40.5183892493     A.U. after    7 cycles
+ Optimization stopped.
+    -- Number of steps exceeded,  NStep=   2
+    -- Flag reset to prevent archiving.
+ Error termination request processed by link_exit.
+ Error termination via Lnk1e in /opt/g16/l9999.exe at Tue Mar  5 10:12:01 2024.
+ Job cpu time:       0 days  0 hours  0 minutes 12.3 seconds.
+ Elapsed time:       0 days  0 hours  0 minutes  3.1 seconds.
+ File lengths (MBytes):  RWF=      6 Int=      0 D2E=      0 Chk=      1 Scr=      1
+"""
+
+# SCF 不收敛时 l502 的结尾
+SCF_FAILED_TAIL = """ >>>>>>>>>> Convergence criterion not met.
+ SCF Done:  E(RB3LYP) =  -40.4000000000     A.U. after  129 cycles
+ Convergence failure -- run terminated.
+ Error termination via Lnk1e in /opt/g16/l502.exe at Tue Mar  5 10:12:01 2024.
+ Job cpu time:       0 days  0 hours  1 minutes  2.0 seconds.
+"""
+
+NORMAL_TAIL = """ SCF Done:  E(RB3LYP) =  -40.5183892493     A.U. after    7 cycles
+ Normal termination of Gaussian 16 at Tue Mar  5 10:12:01 2024.
+"""
+
+
+def _write_job(tmp_path, log_text):
+    gjf_path = tmp_path / 'methane.gjf'
+    gjf_path.write_text(GJF)
+    (tmp_path / 'methane.log').write_text(log_text)
+    return str(gjf_path)
+
+
+def test_link_exit_error_counts_once(tmp_path):
+    gjf_path = _write_job(tmp_path, ORIENTATION + OPT_FAILED_TAIL)
+    segments = parse_gaussian_log(gjf_path[:-len('.gjf')] + '.log')
+    assert [segment['normal'] for segment in segments] == [False]
+    assert segments[0]['scf_energy'] == -40.5183892493
+    assert segments[0]['geometry'] is not None
+    assert job_progress(gjf_path)['status'] == 'failed'
+
+
+def test_scf_convergence_failure(tmp_path):
+    gjf_path = _write_job(tmp_path, ORIENTATION + SCF_FAILED_TAIL)
+    progress = job_progress(gjf_path)
+    assert progress['status'] == 'failed'
+    assert progress['finished_steps'] == 0
+
+
+def test_freq_failed_after_normal_opt(tmp_path):
+    gjf_path = _write_job(tmp_path, ORIENTATION + NORMAL_TAIL + ORIENTATION + SCF_FAILED_TAIL)
+    progress = job_progress(gjf_path)
+    assert progress['status'] == 'failed'
+    assert progress['partial_terminations'] == 1
+
+
+def test_interrupted_job_is_incomplete(tmp_path):
+    gjf_path = _write_job(tmp_path, ORIENTATION + NORMAL_TAIL + ORIENTATION)
+    assert job_progress(gjf_path)['status'] == 'incomplete'
+
+
+def test_opt_freq_done(tmp_path):
+    gjf_path = _write_job(tmp_path, ORIENTATION + NORMAL_TAIL + ORIENTATION + NORMAL_TAIL)
+    progress = job_progress(gjf_path)
+    assert progress['status'] == 'done'
+    assert progress['finished_steps'] == 1
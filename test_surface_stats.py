@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from multiwfn_driver import FACET_SUFFIX, VERTEX_SUFFIX, run_multiwfn_batch
+from surface_stats import build_surface_cache, read_surface_vertices, surface_descriptors
+
+
+FAKE_MULTIWFN = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_multiwfn.py')]
+
+
+def _run_fake_multiwfn(tmp_path, monkeypatch):
+    (tmp_path / 'wavefunction').mkdir()
+    (tmp_path / 'wavefunction' / '12.fchk').write_text('')
+    monkeypatch.setenv('FAKE_MULTIWFN_SECONDS', '0')
+    out_dir = str(tmp_path / 'surface_result')
+    df = run_multiwfn_batch(str(tmp_path / 'wavefunction'), out_dir=out_dir, multiwfn_command=FAKE_MULTIWFN,
+                            total_cores=1, threads_per_job=1)
+    prefix = os.path.join(out_dir, '12')
+    return df.iloc[0], prefix + VERTEX_SUFFIX, prefix + FACET_SUFFIX
+
+
+def test_vertex_areas_match_multiwfn_summary(tmp_path, monkeypatch):
+    record, vertex_path, facet_path = _run_fake_multiwfn(tmp_path, monkeypatch)
+    assert record['status'] == 'success'
+    values, areas = read_surface_vertices(vertex_path, facet_path)
+    descriptors = surface_descriptors(values, areas, np.array([0, len(values)])).iloc[0]
+
+    # 面积和面积加权平均值与按面片统计的结果相同, 只差输出的舍入
+    for key in ['Total_area_Angstrom2', 'Average_total_kcalmol', 'Min_value_kcalmol', 'Max_value_kcalmol']:
+        assert descriptors[key] == pytest.approx(record[key], rel=1e-4, abs=1e-4)
+    # 正负表面按顶点或按面片划分, 结果接近
+    assert descriptors['Positive_area_Angstrom2'] == pytest.approx(record['Positive_area_Angstrom2'], rel=0.05)
+
+
+def test_cache_requires_matching_facet_files(tmp_path, monkeypatch):
+    _, vertex_path, facet_path = _run_fake_multiwfn(tmp_path, monkeypatch)
+    cache = build_surface_cache([vertex_path], [facet_path], cache_path=str(tmp_path / 'cache.npz'), max_workers=1)
+    assert cache['areas'].sum() == pytest.approx(4 * np.pi * 3.5 ** 2, rel=0.02)
+    with pytest.raises(ValueError):
+        build_surface_cache([vertex_path], [], cache_path=str(tmp_path / 'cache.npz'))